@@ -0,0 +1,45 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import os
+import sys
+import time
+import numpy as np
+from   pathlib import Path
+
+# Makes the repository importable when run as a script
+sys.path.append(str(Path(__file__).absolute().parent.parent))
+
+# Import Classes
+from pipelines           import CubeTracking, ConeTracking, find_frame_pieces, find_pieces_batch
+from pieceScaleBenchmark import createFrames
+
+# Benchmark settings
+RESOLUTION = (1280, 720)
+NUM_REPEATS = 4
+
+# Runs the benchmark
+if (__name__ == "__main__"):
+    # Stacks the frames into one (N, H, W, 3) array
+    frames, _ = createFrames(RESOLUTION)
+    stack     = np.stack(frames * NUM_REPEATS)
+    pipelines = (CubeTracking(), ConeTracking())
+    print("{} frames at {}x{}".format(len(stack), *RESOLUTION))
+
+    # Runs the frames one after another
+    start    = time.perf_counter()
+    expected = [find_frame_pieces(frame, pipelines) for frame in stack]
+    serial   = time.perf_counter() - start
+    print("  serial      {:7.1f} FPS".format(len(stack) / serial))
+
+    # Runs the frames on thread pools of different sizes
+    workers = 1
+    while (workers <= os.cpu_count()):
+        start   = time.perf_counter()
+        results = list(find_pieces_batch(stack, pipelines, workers))
+        elapsed = time.perf_counter() - start
+
+        # Checks that the batch matches the serial results
+        matches = all(np.array_equal(a, b) for a, b in zip(results, expected))
+        print("  {:2} threads  {:7.1f} FPS  {:4.2f}x  matches {}".format(workers, len(stack) / elapsed, serial / elapsed, matches))
+        workers *= 2
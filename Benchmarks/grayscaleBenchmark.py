@@ -0,0 +1,64 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import time
+import cv2   as cv
+import numpy as np
+
+# Benchmark settings
+RESOLUTION  = (1280, 720)
+NUM_REPEATS = 100
+QUALITY     = 80
+
+def createFrame():
+    """
+    Draws a frame with smooth color, noise, and a few AprilTags, so it compresses like a camera frame.
+    @return frame
+    """
+    # Variables
+    width, height = RESOLUTION
+    rng = np.random.default_rng(2199)
+
+    # Smooth color gradients with noise
+    x, y  = np.meshgrid(np.linspace(0, 1, width), np.linspace(0, 1, height))
+    frame = np.dstack((x * 200 + 30, y * 180 + 40, (1 - x) * 150 + 60))
+    frame = np.clip(frame + rng.normal(0, 6, frame.shape), 0, 255).astype(np.uint8)
+
+    # Adds some tags
+    dictionary = cv.aruco.getPredefinedDictionary(cv.aruco.DICT_APRILTAG_16h5)
+    for i in range(4):
+        tag = cv.cvtColor(cv.aruco.generateImageMarker(dictionary, i + 1, 120, borderBits = 1), cv.COLOR_GRAY2BGR)
+        frame[100 + (i % 2) * 300:220 + (i % 2) * 300, 150 + i * 250:270 + i * 250] = tag
+
+    return frame
+
+def timeCall(function) -> float:
+    """
+    Times a function.
+    @param function: Called with no arguments
+    @return milliseconds: The mean time per call
+    """
+    start = time.perf_counter()
+    for _ in range(NUM_REPEATS):
+        function()
+
+    return (time.perf_counter() - start) / NUM_REPEATS * 1000
+
+# Runs the benchmark
+if (__name__ == "__main__"):
+    frame = createFrame()
+    slot  = np.zeros(frame.shape[:2], np.uint8)
+    print("{}x{} frames".format(*RESOLUTION))
+
+    # MJPG, as the camera sends it
+    _, jpeg = cv.imencode(".jpg", frame, (cv.IMWRITE_JPEG_QUALITY, QUALITY))
+    color   = timeCall(lambda: cv.cvtColor(cv.imdecode(jpeg, cv.IMREAD_COLOR), cv.COLOR_BGR2GRAY))
+    gray    = timeCall(lambda: np.copyto(slot, cv.imdecode(jpeg, cv.IMREAD_GRAYSCALE)))
+    error   = np.abs(cv.cvtColor(cv.imdecode(jpeg, cv.IMREAD_COLOR), cv.COLOR_BGR2GRAY).astype(int) - cv.imdecode(jpeg, cv.IMREAD_GRAYSCALE)).max()
+    print("  MJPG  color + convert {:6.2f} ms  grayscale {:6.2f} ms  {:4.1f}x  max difference {}".format(color, gray, color / gray, error))
+
+    # YUYV, where every other byte is the brightness
+    yuyv = np.dstack((cv.cvtColor(frame, cv.COLOR_BGR2GRAY), np.full(frame.shape[:2], 128, np.uint8)))
+    color = timeCall(lambda: cv.cvtColor(cv.cvtColor(yuyv, cv.COLOR_YUV2BGR_YUYV), cv.COLOR_BGR2GRAY))
+    gray  = timeCall(lambda: np.copyto(slot, yuyv[:, :, 0]))
+    print("  YUYV  color + convert {:6.2f} ms  Y plane   {:6.2f} ms  {:4.1f}x".format(color, gray, color / gray))
@@ -0,0 +1,100 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import sys
+import time
+import cv2   as cv
+import numpy as np
+from   pathlib import Path
+
+# Makes the repository importable when run as a script
+sys.path.append(str(Path(__file__).absolute().parent.parent))
+
+# Import Classes
+from pipelines import CubeTracking
+from results   import PIECE_FIELDS
+from tracking  import calculateIoU
+
+# Benchmark settings
+NUM_FRAMES  = 50
+RESOLUTIONS = ((320, 240), (1280, 720))
+SCALES      = (1.0, 0.8, 0.6, 0.5, 0.4, 0.25)
+CUBE_COLOR  = (200, 40, 120)  # BGR inside the cube HSV range
+
+def createFrames(resolution: tuple, seed: int = 0):
+    """
+    Draws frames with cubes of random sizes and positions on a noisy background.
+    @param resolution (width, height)
+    @param seed
+    @return frames, truths: truths is a list of (N, PIECE_FIELDS) piece arrays
+    """
+    # Variables
+    rng    = np.random.default_rng(seed)
+    width, height = resolution
+    frames, truths = [], []
+
+    for _ in range(NUM_FRAMES):
+        frame = rng.integers(0, 60, (height, width, 3), np.uint8)
+        truth = np.zeros((0, PIECE_FIELDS))
+
+        # Draws a few cubes between 3% and 20% of the frame width
+        for _ in range(rng.integers(1, 4)):
+            size = int(rng.uniform(0.03, 0.2) * width)
+            x, y = int(rng.integers(0, width - size)), int(rng.integers(0, height - size))
+            if (np.any(calculateIoU(truth, np.array([[x, y, size, size, 0, 0]])) > 0)):
+                continue
+            cv.rectangle(frame, (x, y), (x + size - 1, y + size - 1), CUBE_COLOR, -1)
+            truth = np.vstack((truth, [x, y, size, size, size * size, 0]))
+
+        frames.append(frame)
+        truths.append(truth)
+
+    return frames, truths
+
+def runPipeline(pipeline, frames, truths):
+    """
+    Runs a pipeline over frames and compares the boxes to the truth.
+    @param pipeline: A configured CubeTracking
+    @param frames
+    @param truths
+    @return recall, meanIoU, millisecondsPerFrame
+    """
+    # Variables
+    found, total, ious = 0, 0, []
+
+    # Times the pipeline
+    start   = time.perf_counter()
+    results = [pipeline.findCubes(frame) for frame in frames]
+    elapsed = time.perf_counter() - start
+
+    # Matches every true cube with its best detection
+    for result, truth in zip(results, truths):
+        total += len(truth)
+        if (len(result) == 0):
+            continue
+        best   = calculateIoU(truth, result).max(axis = 1)
+        found += int(np.count_nonzero(best >= 0.5))
+        ious.extend(best[best >= 0.5])
+
+    return found / max(total, 1), np.mean(ious) if (len(ious) > 0) else 0, elapsed / len(frames) * 1000
+
+# Runs the benchmark
+if (__name__ == "__main__"):
+    for resolution in RESOLUTIONS:
+        frames, truths = createFrames(resolution)
+        print("{}x{}".format(*resolution))
+
+        # Fixed scales with each interpolation
+        for scale in SCALES:
+            for name, interpolation in (("linear", cv.INTER_LINEAR), ("area", cv.INTER_AREA)):
+                pipeline = CubeTracking()
+                pipeline.cv_resize_fx = pipeline.cv_resize_fy = scale
+                pipeline.cv_resize_interpolation = interpolation
+                recall, iou, ms = runPipeline(pipeline, frames, truths)
+                print("  scale {:4} {:8} recall {:5.2f} IoU {:5.3f} {:7.3f} ms".format(scale, name, recall, iou, ms))
+
+        # The adaptive scale, which uses pyramid decimation
+        pipeline = CubeTracking()
+        pipeline.cv_resize_adaptive = True
+        recall, iou, ms = runPipeline(pipeline, frames, truths)
+        print("  adaptive   pyramid  recall {:5.2f} IoU {:5.3f} {:7.3f} ms".format(recall, iou, ms))
@@ -0,0 +1,421 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import sys
+import json
+import time
+import argparse
+import tempfile
+import cv2   as cv
+import numpy as np
+from   pathlib import Path
+
+# Makes the repository importable when run as a script
+sys.path.append(str(Path(__file__).absolute().parent.parent))
+
+# Import Classes
+from apriltags   import Detector, tagCorners, tagSize
+from calibration import CHESSBOARD, Calibrate
+from config      import DETECTION_DEFAULTS, DetectionConfig
+from pipelines   import CubeTracking, ConeTracking, find_pieces
+from results     import PIECE_FIELDS, PIECE_CUBE, PIECE_CONE, PIECE_CLASS
+from tracking    import calculateIoU
+
+# Path to the stored baseline
+BASELINE_PATH = Path(__file__).absolute().parent / "baseline.json"
+
+# Benchmark settings
+SEED          = 2199
+NUM_FRAMES    = 40
+RESOLUTION    = (1280, 720)
+CAMERA_MATRIX = np.array([[900, 0, 640], [0, 900, 360], [0, 0, 1]], np.float64)
+DISTORTION    = np.array([-0.15, 0.05, 0.0, 0.0, 0.0])  # Barrel distortion like a wide angle webcam, for the distorted AprilTag suite
+TAG_IDS       = (1, 2, 3, 4, 5, 6, 7, 8)
+TAG_DISTANCES = (1.5, 3.0, 5.0, 7.0)
+SUPERSAMPLE   = 4
+
+# The AprilTag Detector. See getTagDetector() and closeTagDetector()
+tagDetector = None
+
+# BGR colors inside the default HSV ranges
+CUBE_COLOR = (200, 40, 120)
+CONE_COLOR = (0, 200, 255)
+
+# How far a new run may fall from the baseline before it fails
+ACCURACY_MARGIN = 0.02  # Absolute, for recall and IoU
+ERROR_MARGIN    = 1.5   # Relative, for pose and calibration errors
+TIME_MARGIN     = 1.5   # Relative, for times
+
+def createDistortionMap(distortion):
+    """
+    Finds where every supersampled pixel of a distorted frame sees in the undistorted frame, for renderPlanar().
+    @param distortion: The distortion coefficients of the camera model
+    @return distortionMap: A (height, width, 2) float32 map for cv.remap
+    """
+    # Supersampled pixel centers in frame pixels
+    s = SUPERSAMPLE
+    x, y   = np.meshgrid((np.arange(RESOLUTION[0] * s) - (s - 1) / 2) / s, (np.arange(RESOLUTION[1] * s) - (s - 1) / 2) / s)
+    points = np.stack((x, y), axis = -1).reshape(-1, 1, 2)
+
+    # Removes the distortion, then goes back to supersampled pixels
+    ideal = cv.undistortPoints(points, CAMERA_MATRIX, distortion, P = CAMERA_MATRIX).reshape(y.shape + (2,))
+
+    return (ideal * s + (s - 1) / 2).astype(np.float32)
+
+def renderPlanar(image, homography, resolution: tuple, background: int = 255, distortionMap = None):
+    """
+    Renders a planar image into a frame with supersampling, so edges are anti-aliased like a real camera.
+    @param image: The grayscale image to render
+    @param homography: Maps the image's pixel centers to frame pixel centers
+    @param resolution (width, height)
+    @param background: The gray level outside the image
+    @param distortionMap: From createDistortionMap(), to render through a distorted lens. None renders through an ideal lens
+    @return frame
+    """
+    # Maps frame pixel centers to the supersampled pixel centers
+    s     = SUPERSAMPLE
+    scale = np.array([[s, 0, (s - 1) / 2], [0, s, (s - 1) / 2], [0, 0, 1]])
+    large = cv.warpPerspective(image, scale @ homography, (resolution[0] * s, resolution[1] * s), flags = cv.INTER_LINEAR, borderValue = background)
+
+    # Bends the undistorted frame through the lens
+    if (distortionMap is not None):
+        large = cv.remap(large, distortionMap, None, cv.INTER_LINEAR, borderValue = background)
+
+    return cv.resize(large, resolution, interpolation = cv.INTER_AREA)
+
+def createPieceFrames(rng):
+    """
+    Draws frames with cubes and cones of random sizes and positions on a noisy background.
+    @param rng
+    @return frames, truths: truths is a list of (N, PIECE_FIELDS) piece arrays
+    """
+    # Variables
+    width, height = RESOLUTION
+    frames, truths = [], []
+
+    for _ in range(NUM_FRAMES):
+        frame = rng.integers(0, 60, (height, width, 3), np.uint8)
+        truth = np.zeros((0, PIECE_FIELDS))
+
+        # Draws up to six pieces between 4% and 20% of the frame width
+        for _ in range(rng.integers(1, 7)):
+            size  = int(rng.uniform(0.04, 0.2) * width)
+            x, y  = int(rng.integers(0, width - size)), int(rng.integers(0, height - size))
+            piece = np.array([[x, y, size, size, 0, rng.integers(0, 2)]], np.float64)
+            if (np.any(calculateIoU(truth, piece) > 0)):
+                continue
+
+            # Cubes are squares and cones are triangles
+            if (piece[0, PIECE_CLASS] == PIECE_CUBE):
+                cv.rectangle(frame, (x, y), (x + size - 1, y + size - 1), CUBE_COLOR, -1)
+            else:
+                cv.fillConvexPoly(frame, np.array([[x + size // 2, y], [x + size - 1, y + size - 1], [x, y + size - 1]], np.int32), CONE_COLOR)
+            truth = np.vstack((truth, piece))
+
+        frames.append(cv.GaussianBlur(frame, (3, 3), 0.8))
+        truths.append(truth)
+
+    return frames, truths
+
+def benchmarkPieces(rng) -> dict:
+    """
+    Measures the piece pipelines' recall, box IoU, and time per frame.
+    @param rng
+    @return metrics
+    """
+    frames, truths = createPieceFrames(rng)
+    pipelines = {PIECE_CUBE: CubeTracking(), PIECE_CONE: ConeTracking()}
+
+    # Variables
+    found, total, ious = 0, 0, []
+    times = {PIECE_CUBE: 0.0, PIECE_CONE: 0.0}
+
+    for frame, truth in zip(frames, truths):
+        for pieceClass, pipeline in pipelines.items():
+            # Times the pipeline
+            start  = time.perf_counter()
+            result = find_pieces(frame, pipeline)
+            times[pieceClass] += time.perf_counter() - start
+
+            # Matches every true piece of this class with its best detection
+            expected = truth[truth[:, PIECE_CLASS] == pieceClass]
+            total   += len(expected)
+            if ((len(expected) == 0) or (len(result) == 0)):
+                continue
+            best   = calculateIoU(expected, result).max(axis = 1)
+            found += int(np.count_nonzero(best >= 0.5))
+            ious.extend(best[best >= 0.5])
+
+    return {
+        "recall":  found / max(total, 1),
+        "meanIoU": float(np.mean(ious)) if (len(ious) > 0) else 0.0,
+        "cubeMs":  times[PIECE_CUBE] / len(frames) * 1000,
+        "coneMs":  times[PIECE_CONE] / len(frames) * 1000
+    }
+
+def createTagImage(id: int):
+    """
+    Draws a tag16h5 tag with its white border.
+    @param id
+    @return image, corners: corners are the black square's corners in the order the detector reports them
+    """
+    # The black square is 6 cells of 12 pixels, with one white cell around it. OpenCV draws the tags upside down from pupil_apriltags
+    dictionary = cv.aruco.getPredefinedDictionary(cv.aruco.DICT_APRILTAG_16h5)
+    marker     = cv.rotate(cv.aruco.generateImageMarker(dictionary, id, 72), cv.ROTATE_180)
+    image      = cv.copyMakeBorder(marker, 12, 12, 12, 12, cv.BORDER_CONSTANT, value = 255)
+    corners    = np.array([[11.5, 83.5], [83.5, 83.5], [83.5, 11.5], [11.5, 11.5]], np.float32)
+
+    return image, corners
+
+def createTagFrames(rng, distortion = None):
+    """
+    Renders one tag per frame at a random pose for every distance.
+    @param rng
+    @param distortion: The distortion coefficients to render with. None renders through an ideal lens
+    @return frames: A list of (frame, distance, id, rVec, tVec)
+    """
+    # The tag's corners in its own frame, in the same order as createTagImage
+    half   = tagSize / 2
+    object = np.array([[-half, half, 0], [half, half, 0], [half, -half, 0], [-half, -half, 0]], np.float64)
+
+    # Variables
+    frames = []
+    distortionMap = createDistortionMap(distortion) if (distortion is not None) else None
+
+    for distance in TAG_DISTANCES:
+        for _ in range(NUM_FRAMES // len(TAG_DISTANCES)):
+            # Picks a pose facing the camera
+            id   = int(rng.choice(TAG_IDS))
+            rVec = np.array([0.3, 0.5, 0.1]) * rng.standard_normal(3)
+            tVec = np.array([rng.uniform(-0.5, 0.5), rng.uniform(-0.3, 0.3), distance])
+
+            # Renders the tag through the camera model. The homography maps it into the undistorted frame
+            image, corners = createTagImage(id)
+            projected, _   = cv.projectPoints(object, rVec, tVec, CAMERA_MATRIX, None)
+            homography     = cv.getPerspectiveTransform(corners, projected.reshape(4, 2).astype(np.float32))
+            frame = renderPlanar(image, homography, RESOLUTION, distortionMap = distortionMap)
+            frame = np.clip(frame + rng.normal(0, 2, frame.shape), 0, 255).astype(np.uint8)
+
+            frames.append((frame, distance, id, rVec, tVec))
+
+    return frames
+
+def getTagDetector():
+    """
+    Gets the benchmark's Detector, creating it the first time. It follows the default detection config, and its NetworkTables client never connects, so results are only published locally.
+    @return detector
+    """
+    global tagDetector
+
+    if (tagDetector is None):
+        # Writes the default detection config, so local edits to config.json do not change the results
+        configPath = Path(tempfile.mkdtemp()) / "config.json"
+        configPath.write_text(json.dumps({"detection": DETECTION_DEFAULTS}))
+
+        tagDetector = Detector(DetectionConfig(str(configPath)))
+
+    return tagDetector
+
+def closeTagDetector():
+    """
+    Frees the Detector's pupil_apriltags detector before its families.
+
+    pupil_apriltags frees the families first, and the detector then writes to the freed memory while it is destroyed, which corrupts the heap.
+    """
+    global tagDetector
+
+    if (tagDetector is None):
+        return
+
+    # Frees the detector, then the families
+    pupil = tagDetector.detector
+    pupil.libc.apriltag_detector_destroy(pupil.tag_detector_ptr)
+    pupil.libc.tag16h5_destroy(pupil.tag_families["tag16h5"])
+
+    # Stops pupil_apriltags from freeing them again
+    pupil.tag_detector_ptr = None
+    tagDetector.posePool.shutdown()
+    tagDetector = None
+
+def benchmarkTags(rng, distortion = None) -> dict:
+    """
+    Runs Detector.detectTags() on rendered tags and measures its recall, corner and pose error, and time per frame, with the default detection config.
+    @param rng
+    @param distortion: The lens distortion to render with, which the detector is also given. None uses an ideal lens
+    @return metrics
+    """
+    # Variables
+    found = 0
+    cornerErrors, translationErrors, rotationErrors = [], [], []
+    detectTime = 0.0
+    detector   = getTagDetector()
+    frames     = createTagFrames(rng, distortion)
+
+    for frame, distance, id, rVec, tVec in frames:
+        # Detects the tags the same way the AprilTag role does
+        start      = time.perf_counter()
+        results, _ = detector.detectTags(frame, CAMERA_MATRIX, distortion = distortion)
+        detectTime += time.perf_counter() - start
+
+        # Keeps the rendered tag. Screening and the pose error filter already ran
+        results = [result for result in results if (result.id == id)]
+        if (len(results) == 0):
+            continue
+        found += 1
+
+        # Compares the corners with the projected truth
+        projected, _ = cv.projectPoints(tagCorners, rVec, tVec, CAMERA_MATRIX, distortion)
+        cornerErrors.append(np.mean(np.linalg.norm(results[0].corners - projected.reshape(4, 2), axis = 1)))
+
+        # Compares the pose with the truth, converted to a Pose3d the same way. Pose3ds are rounded to centimeters and centiradians, so the pose errors are averaged instead of taking the median
+        rTrue, _ = cv.Rodrigues(rVec)
+        truth    = detector.getPose3D(np.concatenate([rTrue, tVec.reshape(3, 1)], axis = 1))
+        translationErrors.append(results[0].pose.translation().distance(truth.translation()) / distance)
+        rotationErrors   .append(np.degrees((results[0].pose.rotation() - truth.rotation()).angle))
+
+    return {
+        "recall":                 found / len(frames),
+        "medianCornerErrorPx":    float(np.median(cornerErrors)) if (len(cornerErrors) > 0) else 100.0,
+        "meanTranslationError":   float(np.mean(translationErrors)) if (len(translationErrors) > 0) else 1.0,
+        "meanRotationErrorDeg":   float(np.mean(rotationErrors)) if (len(rotationErrors) > 0) else 180.0,
+        "detectMs":               detectTime / len(frames) * 1000
+    }
+
+def createBoardImage(squarePixels: int):
+    """
+    Draws the calibration chessboard with a one square white margin.
+    @param squarePixels: The size of a square in pixels
+    @return image
+    """
+    # Draws the squares. The board has one more square than inner corners in each direction
+    squares = (CHESSBOARD[0] + 1, CHESSBOARD[1] + 1)
+    board   = np.kron((np.indices((squares[1], squares[0])).sum(axis = 0) % 2) * 255, np.ones((squarePixels, squarePixels))).astype(np.uint8)
+    image   = cv.copyMakeBorder(board, squarePixels, squarePixels, squarePixels, squarePixels, cv.BORDER_CONSTANT, value = 255)
+
+    return image
+
+def benchmarkCalibration(rng) -> dict:
+    """
+    Calibrates from rendered chessboard views and compares the intrinsics with the camera model.
+    @param rng
+    @return metrics
+    """
+    squarePixels = 40
+    image = createBoardImage(squarePixels)
+
+    # Maps board image pixel centers to millimeters on the board plane. The first inner corner is the origin, two squares in from the image's edges
+    scale   = 27.5 / squarePixels
+    origin  = (2 * squarePixels - 0.5) * scale
+    toBoard = np.array([[scale, 0, -origin], [0, scale, -origin], [0, 0, 1]])
+
+    with tempfile.TemporaryDirectory() as path:
+        # Renders the views
+        numImages = 15
+        for i in range(numImages):
+            rVec = np.array([0.35, 0.35, 0.1]) * rng.standard_normal(3)
+            tVec = np.array([rng.uniform(-150, 0), rng.uniform(-100, 0), rng.uniform(450, 700)])
+
+            # The homography from the board plane to the frame is K [r1 r2 t]
+            rMatrix, _ = cv.Rodrigues(rVec)
+            homography = CAMERA_MATRIX @ np.column_stack((rMatrix[:, 0], rMatrix[:, 1], tVec)) @ toBoard
+            frame = renderPlanar(image, homography / homography[2, 2], RESOLUTION, background = 128)
+            cv.imwrite("{}/{}.png".format(path, i + 1), frame)
+
+        # Calibrates with the stored images
+        calibrate = Calibrate(cv.VideoCapture(path + "/1.png"), 0, numImages)
+        calibrate.width, calibrate.height = RESOLUTION
+        calibrate.PATH = path + "/"
+
+        start = time.perf_counter()
+        ret, cameraMatrix, distortion, _, _ = calibrate.calibrateCamera()
+        elapsed = time.perf_counter() - start
+
+    return {
+        "views":            len(calibrate.imgPoints) / numImages,
+        "rmsError":         float(ret),
+        "focalError":       float(np.max(np.abs(np.diag(cameraMatrix)[:2] / np.diag(CAMERA_MATRIX)[:2] - 1))),
+        "centerErrorPx":    float(np.max(np.abs(cameraMatrix[:2, 2] - CAMERA_MATRIX[:2, 2]))),
+        "calibrateMs":      elapsed * 1000
+    }
+
+def createThresholds(metrics: dict) -> dict:
+    """
+    Creates pass/fail thresholds around a run's metrics.
+    @param metrics: {suite: {metric: value}}
+    @return thresholds: {suite: {metric: {"value", "min" or "max"}}}
+    """
+    # Variables
+    thresholds = {}
+
+    for suite, values in metrics.items():
+        thresholds[suite] = {}
+        for name, value in values.items():
+            if (name.endswith("Ms")):
+                limit = {"max": value * TIME_MARGIN}
+            elif (("Error" in name) or (name.endswith("Px"))):
+                limit = {"max": value * ERROR_MARGIN + 1e-9}
+            else:
+                limit = {"min": value - ACCURACY_MARGIN}
+            thresholds[suite][name] = dict(value = value, **limit)
+
+    return thresholds
+
+def checkThresholds(metrics: dict, thresholds: dict) -> list:
+    """
+    Compares a run's metrics with the baseline thresholds.
+    @param metrics: {suite: {metric: value}}
+    @param thresholds: The stored baseline
+    @return failures: A list of messages
+    """
+    # Variables
+    failures = []
+
+    for suite, limits in thresholds.items():
+        for name, limit in limits.items():
+            value = metrics[suite][name]
+            if (("min" in limit) and (value < limit["min"])):
+                failures.append("{}.{} = {:.6g} is below {:.6g}".format(suite, name, value, limit["min"]))
+            if (("max" in limit) and (value > limit["max"])):
+                failures.append("{}.{} = {:.6g} is above {:.6g}".format(suite, name, value, limit["max"]))
+
+    return failures
+
+# Runs the benchmark
+if (__name__ == "__main__"):
+    parser = argparse.ArgumentParser(description = "Checks the vision pipelines' accuracy and speed against a stored baseline.")
+    parser.add_argument("--update",  action = "store_true", help = "store this run as the new baseline")
+    parser.add_argument("--no-time", action = "store_true", help = "skip the time thresholds, for machines unlike the one that made the baseline")
+    args = parser.parse_args()
+
+    # Runs every stage on one thread so the times do not depend on the number of cores
+    cv.setNumThreads(1)
+
+    # Runs every suite with the same seed
+    metrics = {
+        "pieces":      benchmarkPieces(np.random.default_rng(SEED)),
+        "apriltags":   benchmarkTags(np.random.default_rng(SEED)),
+        "distorted":   benchmarkTags(np.random.default_rng(SEED), DISTORTION),
+        "calibration": benchmarkCalibration(np.random.default_rng(SEED))
+    }
+    closeTagDetector()
+
+    # Prints the metrics
+    for suite, values in metrics.items():
+        print(suite)
+        for name, value in values.items():
+            print("  {:24} {:.6g}".format(name, value))
+
+    # Stores or checks the baseline
+    if (args.update == True):
+        BASELINE_PATH.write_text(json.dumps(createThresholds(metrics), indent = 4) + "\n")
+        print("Baseline stored at {}".format(BASELINE_PATH))
+    else:
+        thresholds = json.loads(BASELINE_PATH.read_text())
+        if (args.no_time == True):
+            thresholds = {suite: {name: limit for name, limit in limits.items() if (name.endswith("Ms") == False)} for suite, limits in thresholds.items()}
+
+        failures = checkThresholds(metrics, thresholds)
+        for failure in failures:
+            print("FAIL", failure)
+        print("PASS" if (len(failures) == 0) else "{} regressions".format(len(failures)))
+        sys.exit(1 if (len(failures) > 0) else 0)
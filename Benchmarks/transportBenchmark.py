@@ -0,0 +1,107 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import sys
+import time
+import numpy           as np
+import multiprocessing as mp
+from   pathlib import Path
+
+# Makes the repository importable when run as a script
+sys.path.append(str(Path(__file__).absolute().parent.parent))
+
+# Import Classes
+from transport import FrameRing
+
+# Benchmark settings
+SHAPE      = (720, 1280, 3)
+NUM_FRAMES = 300
+
+def ringProducer(ring: FrameRing, frame):
+    """
+    Writes NUM_FRAMES frames into a FrameRing as fast as the reader takes them.
+    @param ring
+    @param frame: The frame to send
+    """
+    for _ in range(NUM_FRAMES):
+        ring.write(frame, time.monotonic())
+
+        # Waits for the reader so every frame is measured
+        while (ring.head.value - readCount.value >= ring.slots - 1):
+            time.sleep(0)
+
+def queueProducer(queue, frame):
+    """
+    Puts NUM_FRAMES frames into a multiprocessing Queue.
+    @param queue
+    @param frame: The frame to send
+    """
+    for _ in range(NUM_FRAMES):
+        queue.put((time.monotonic(), frame))
+
+def benchmarkRing(frame):
+    """
+    Measures the throughput and latency of a FrameRing.
+    @param frame: The frame to send
+    @return framesPerSecond, meanLatency
+    """
+    # Variables
+    ring      = FrameRing(SHAPE, slots = 4)
+    latencies = []
+    sequence  = 0
+
+    # Starts the writer
+    producer = mp.Process(target = ringProducer, args = (ring, frame))
+    start    = time.monotonic()
+    producer.start()
+
+    # Reads every frame and touches it like a consumer would
+    while (sequence < NUM_FRAMES):
+        sequence, info, stream = ring.latest(sequence, timeout = 5.0)
+        stream[0, 0, 0]
+        latencies.append(time.monotonic() - info.captureTime)
+        readCount.value = sequence
+
+    # Stops the writer
+    elapsed = time.monotonic() - start
+    producer.join()
+    ring.close(unlink = True)
+
+    return len(latencies) / elapsed, np.mean(latencies)
+
+def benchmarkQueue(frame):
+    """
+    Measures the throughput and latency of a multiprocessing Queue, which pickles every frame.
+    @param frame: The frame to send
+    @return framesPerSecond, meanLatency
+    """
+    # Variables
+    queue     = mp.Queue(4)
+    latencies = []
+
+    # Starts the writer
+    producer = mp.Process(target = queueProducer, args = (queue, frame))
+    start    = time.monotonic()
+    producer.start()
+
+    # Reads every frame
+    for _ in range(NUM_FRAMES):
+        timestamp, stream = queue.get()
+        latencies.append(time.monotonic() - timestamp)
+
+    # Stops the writer
+    elapsed = time.monotonic() - start
+    producer.join()
+
+    return NUM_FRAMES / elapsed, np.mean(latencies)
+
+# Counts the frames the ring reader has taken so the writer does not lap it
+readCount = mp.Value("Q", 0, lock = False)
+
+# Runs the benchmark
+if (__name__ == "__main__"):
+    frame = np.random.randint(0, 255, SHAPE, np.uint8)
+
+    for name, benchmark in (("FrameRing", benchmarkRing), ("Queue", benchmarkQueue)):
+        fps, latency = benchmark(frame)
+        print("{:10} {:8.1f} FPS {:8.3f} ms latency".format(name, fps, latency * 1000))
@@ -3,73 +3,81 @@
 # Import Libraries
 import json
 import numpy as np
+from pathlib import Path
 from wpimath.geometry import *
 
 # Import Utilities
 from enum import Enum
 from typing import Sequence
+from Utilities.Units import Units
 from Utilities.Logger import Logger
 from Utilities.AprilTag import AprilTag
 
+# Path to the bundled tag layouts
+LAYOUT_PATH = Path(__file__).absolute().parent / "TagLayout"
+
+# The size of the tag in meters
+tagSize = Units.inchesToMeters(6)
+
+# The corners of a tag in its own frame (x out of the tag, y to the viewer's right, z up).
+# Ordered bottom-left, bottom-right, top-right, top-left as seen by a camera facing the tag
+TAG_CORNERS = np.array([
+    [0, -1, -1],
+    [0,  1, -1],
+    [0,  1,  1],
+    [0, -1,  1]
+]) * 0.5 * tagSize
+
+def quaternionToMatrix(w: float, x: float, y: float, z: float):
+    """
+    Converts a unit quaternion into a rotation matrix.
+    @param w, x, y, z: The quaternion components
+    @return rMatrix: The 3x3 rotation matrix
+    """
+    return np.array([
+        [1 - 2*(y*y + z*z),     2*(x*y - z*w),     2*(x*z + y*w)],
+        [    2*(x*y + z*w), 1 - 2*(x*x + z*z),     2*(y*z - x*w)],
+        [    2*(x*z - y*w),     2*(y*z + x*w), 1 - 2*(x*x + y*y)]
+    ])
+
 # Creates the AprilTagFieldLayout class
 class AprilTagFieldLayout:
     class Origin(Enum):
         kBlueAllianceWallRightSide = "BlueWall"
         kRedAllianceWallRightSide  = "RedWall"
 
-    def __init__(self, isRed = False) -> None:
-        """
-        Generates the offical field with AprilTags for match play
-        @param isRed: If we are on the red alliance
-        """
-        # Creates the allTags array
-        self.allTags = [Pose3d()] * 9
-
-        # Loads the json file
-        self.readJson("2023-chargedup")
-
-        # Variables
-        self.m_origin = None
-
-        # Sets the origin depending on alliance
-        if (isRed == True):
-            self.setOrigin(AprilTagFieldLayout.Origin.kRedAllianceWallRightSide)
-        elif (isRed == False):
-            self.setOrigin(AprilTagFieldLayout.Origin.kBlueAllianceWallRightSide)
+    # The order origins are stored in the precomputed arrays
+    ORIGINS = (Origin.kBlueAllianceWallRightSide, Origin.kRedAllianceWallRightSide)
 
-    def __init__(self, tags: Sequence[AprilTag], fieldLength: float, fieldWidth: float, isRed = False) -> None:
+    def __init__(self, tags: Sequence[AprilTag] = None, fieldLength: float = None, fieldWidth: float = None, isRed = False) -> None:
         """
-        Generates an field with AprilTags for testing
-        @param allTags: A list of all known tags
+        Generates a field with AprilTags. Without tags, the offical field for match play is loaded from the bundled json the first time it is used.
+
+        Tag poses and corners are precomputed relative to both alliance origins, so lookups and alliance changes never build new objects.
+        @param tags: A list of all known tags for testing
         @param fieldLength: The length (y) of the field in meters
         @param fieldWidth: The width (x) of the field in meters
         @param isRed: If we are on the red alliance
         """
-        # Asserts that the array length is no greater than 8
-        assert(len(tags) <= 8)
-
-        # Localize parameters
-        self.fieldLength = fieldLength
-        self.fieldWidth = fieldWidth
-
-        # Logs the field size
-        Logger.logInfo("Field length: {}, Field width: {}".format(self.fieldLength, self.fieldWidth))
-
-        # Creates the allTags array
-        self.allTags = [Pose3d()] * 9
+        # Variables
+        self.loaded   = False
+        self.m_origin = None
+        self.originId = 0
 
-        # Sorts the data from tags into allTags
-        for tag in tags:
-            id = tag.getId()
-            pose = tag.getPose()
+        # Builds the testing field right away
+        if (tags is not None):
+            # Asserts that the array length is no greater than 8
+            assert(len(tags) <= 8)
 
-            self.allTags[id] = pose
+            # Localize parameters
+            self.fieldLength = fieldLength
+            self.fieldWidth  = fieldWidth
 
-            # Logs the tag information
-            Logger.logInfo("Tag {}. Pose: {}".format(id, pose))
+            # Logs the field size
+            Logger.logInfo("Field length: {}, Field width: {}".format(self.fieldLength, self.fieldWidth))
 
-        # Variables
-        self.m_origin = None
+            # Precomputes the tags
+            self.precompute({tag.getId(): tag.getPose() for tag in tags})
 
         # Sets the origin depending on alliance
         if (isRed == True):
@@ -80,14 +88,15 @@ class AprilTagFieldLayout:
     def readJson(self, name: str):
         """
         Extracts information from the json file about field size and tag locations
-        @param name: The name of the json file 
+        @param name: The name of the json file in Utilities/TagLayout
         """
-        # Opens the json
-        file = open("/home/robolions/Documents/2023-Jetson-Code-Test/TagLayout/" + name + ".json")
+        # Opens the json and returns JSON object as a dictionary
+        with open(LAYOUT_PATH / (name + ".json")) as file:
+            data = json.load(file)
+
+        # Variables
+        tags = {}
 
-        # Returns JSON object as a dictionary
-        data = json.load(file)
-        
         # Loops through the json data
         for tag in data["tags"]:
             # Gets the tag ID
@@ -108,13 +117,7 @@ class AprilTagFieldLayout:
             q = Quaternion(w_rot, x_rot, y_rot, z_rot)
 
             # Creates a Pose3d object
-            pose = Pose3d(x_trans, y_trans, z_trans, Rotation3d(q))
-
-            # Adds the tag to the allTags array
-            self.allTags[id] = pose
-
-            # Logs the tag's information
-            Logger.logInfo("Tag {}. Pose: {}".format(id, pose))
+            tags[id] = Pose3d(x_trans, y_trans, z_trans, Rotation3d(q))
 
         # Sets the field dimensions
         self.fieldLength = data["field"]["length"]
@@ -123,39 +126,121 @@ class AprilTagFieldLayout:
         # Logs the field size
         Logger.logInfo("Field length: {}, Field width: {}".format(self.fieldLength, self.fieldWidth))
 
-        # Closes the file
-        file.close()
+        # Precomputes the tags
+        self.precompute(tags)
 
-    def setOrigin(self, origin):
+    def load(self):
         """
-        Sets the origin depending on the alliance color. The origins are calculated from the field dimensions.
+        Loads the offical field the first time it is needed.
+        """
+        if (self.loaded == False):
+            self.readJson("2023-chargedup")
 
-        This transforms the Pose3ds returned by getTagPose() to return the correct pose relative to a predefined coordinate frame.
+    def precompute(self, tags: dict):
+        """
+        Transforms every tag into both alliance frames and stores the results by tag id.
+        @param tags: {tagId: Pose3d} in the blue alliance frame
+        """
+        # Creates the arrays. Index 0 holds the blue alliance frame and index 1 the red one
+        size = max(tags.keys(), default = 0) + 1
+        self.known   = np.zeros(size, bool)
+        self.poses   = [[Pose3d()] * size for _ in AprilTagFieldLayout.ORIGINS]
+        self.matrix  = np.tile(np.eye(4), (len(AprilTagFieldLayout.ORIGINS), size, 1, 1))
+        self.corners = np.zeros((len(AprilTagFieldLayout.ORIGINS), size, len(TAG_CORNERS), 3))
+
+        for i, origin in enumerate(AprilTagFieldLayout.ORIGINS):
+            originPose = self.getOriginPose(origin)
+
+            for id, pose in tags.items():
+                # Transforms the tag into this origin's frame
+                relative = pose.relativeTo(originPose)
+                q        = relative.rotation().getQuaternion()
+
+                # Stores the pose, its matrix, and the world coordinates of its corners
+                self.known[id]             = True
+                self.poses[i][id]          = relative
+                self.matrix[i, id, :3, :3] = quaternionToMatrix(q.W(), q.X(), q.Y(), q.Z())
+                self.matrix[i, id, :3, 3]  = (relative.X(), relative.Y(), relative.Z())
+                self.corners[i, id]        = TAG_CORNERS @ self.matrix[i, id, :3, :3].T + self.matrix[i, id, :3, 3]
+
+                # Logs the tag information
+                if (i == 0):
+                    Logger.logInfo("Tag {}. Pose: {}".format(id, pose))
+
+        # Marks the layout as loaded
+        self.loaded = True
+
+    def getOriginPose(self, origin) -> Pose3d:
+        """
+        Gets the pose of an origin relative to the blue alliance wall. The origins are calculated from the field dimensions.
         @param origin: The predefined origin
+        @return Pose3d
         """
         if (origin == AprilTagFieldLayout.Origin.kBlueAllianceWallRightSide):
-            self.m_origin = Pose3d()
+            return Pose3d()
         elif (origin == AprilTagFieldLayout.Origin.kRedAllianceWallRightSide):
-            self.m_origin = Pose3d(
+            return Pose3d(
                 Translation3d(self.fieldLength, self.fieldWidth, 0),
                 Rotation3d(0, 0, np.pi)
             )
         else:
             raise ValueError("Unsupported enumerator value.")
 
+    def setOrigin(self, origin):
+        """
+        Sets the origin depending on the alliance color.
+
+        This selects which precomputed frame getTagPose() and getTagCorners() return, so changing it is O(1).
+        @param origin: The predefined origin
+        """
+        if (origin not in AprilTagFieldLayout.ORIGINS):
+            raise ValueError("Unsupported enumerator value.")
+
+        self.m_origin = origin
+        self.originId = AprilTagFieldLayout.ORIGINS.index(origin)
+
     def getTags(self):
         """
         Returns all the created tags
-        @return allTags
+        @return allTags: Indexed by tag id
         """
-        return self.allTags
+        self.load()
+        return self.poses[self.originId]
+
+    def hasTag(self, id: int) -> bool:
+        """
+        Checks if a tag is on the field
+        @param tagId
+        @return hasTag
+        """
+        self.load()
+        return (0 <= id < len(self.known)) and bool(self.known[id])
 
     def getTagPose(self, id: int) -> Pose3d:
         """
         Returns the pose of the selected tag
-        @return Pose3d
+        @param tagId
+        @return Pose3d: A blank Pose3d if the tag is not on the field
         """
-        if (self.allTags[id] is not Pose3d()):
+        if (self.hasTag(id) == False):
             return Pose3d()
         else:
-            return self.allTags[id].relativeTo(self.m_origin)
\ No newline at end of file
+            return self.poses[self.originId][id]
+
+    def getTagMatrix(self, ids):
+        """
+        Returns the 4x4 homogeneous transforms of the selected tags
+        @param tagIds: A tag id or an array of tag ids
+        @return matrix: (4, 4) or (len(ids), 4, 4)
+        """
+        self.load()
+        return self.matrix[self.originId, ids]
+
+    def getTagCorners(self, ids):
+        """
+        Returns the field coordinates of the selected tags' corners. Works with an array of ids so a multi-tag solver can gather every corner at once
+        @param tagIds: A tag id or an array of tag ids
+        @return corners: (4, 3) or (len(ids), 4, 3) in meters
+        """
+        self.load()
+        return self.corners[self.originId, ids]
@@ -2,114 +2,222 @@
 
 # Import Libraries
 import math
+import time
 import cv2   as cv
 import numpy as np
 import pupil_apriltags
-from   wpilib import Timer
 from   wpimath.geometry import *
+from   concurrent.futures import ThreadPoolExecutor
 
 # Import Classes
-from communications import NetworkCommunications
+from config         import DetectionConfig
+from results        import TagResult
+from communications import NetworkCommunications, ClockSync
 
 # Import Utilities
-from Utilities.Units  import Units
-from Utilities.Logger import Logger
+from Utilities.Units               import Units
+from Utilities.Logger              import Logger
+from Utilities.AprilTagFieldLayout import AprilTagFieldLayout
 
 # The size of the tag in meters
 tagSize = Units.inchesToMeters(6)
 
+# The tag corners in the order pupil_apriltags returns them, which is also the order SOLVEPNP_IPPE_SQUARE expects
+tagCorners = np.array([
+    [-1,  1, 0],
+    [ 1,  1, 0],
+    [ 1, -1, 0],
+    [-1, -1, 0]
+], np.float64) * 0.5 * tagSize
+
+# The distance between samples across a tag edge in pixels
+EDGE_STEP = 0.25
+
+def refineTagCorners(gray, corners, maxSide: float, iterations: int = 2):
+    """
+    Refines the corners of a small tag to sub-pixel accuracy by fitting a line to each edge and intersecting them. Only small patches across the edges are sampled.
+
+    cv.cornerSubPix is made for chessboard saddles and pulls the corners of a solid square inward, which shrinks the tag and pushes it farther away, so the edges are used instead.
+    @param gray: The grayscale image the tag was detected in
+    @param corners: The (4, 2) corners of the tag in pixels
+    @param maxSide: Tags with a shorter side longer than this are returned as they are
+    @param iterations: The number of refinement passes
+    @return corners: The refined (4, 2) corners
+    """
+    # Skips near tags, which are already accurate
+    corners = np.asarray(corners, np.float64)
+    side    = np.min(np.linalg.norm(corners - np.roll(corners, 1, axis = 0), axis = 1))
+    if (side > maxSide):
+        return corners
+
+    # Samples across each edge, staying inside the tag's black border
+    radius  = float(np.clip(side / 12, 0.75, 2.0))
+    offsets = np.arange(-radius, radius + EDGE_STEP / 2, EDGE_STEP)
+    middles = offsets[:-1] + EDGE_STEP / 2
+    spacing = np.linspace(0.15, 0.85, int(np.clip(side / 2, 4, 16)))
+
+    for _ in range(iterations):
+        # Gets the direction of each edge and its outward normal
+        starts  = corners
+        ends    = np.roll(corners, -1, axis = 0)
+        dirs    = (ends - starts) / np.linalg.norm(ends - starts, axis = 1, keepdims = True)
+        normals = np.column_stack((dirs[:, 1], -dirs[:, 0]))
+        normals[np.sum(normals * ((starts + ends) / 2 - corners.mean(axis = 0)), axis = 1) < 0] *= -1
+
+        # Samples a profile across every edge point in one remap
+        points  = starts[:, None] + spacing[None, :, None] * (ends - starts)[:, None]
+        samples = (points[:, :, None] + offsets[None, None, :, None] * normals[:, None, None]).reshape(-1, len(offsets), 2).astype(np.float32)
+        profile = cv.remap(gray, samples[..., 0], samples[..., 1], cv.INTER_LINEAR).astype(np.float32)
+
+        # Finds where each profile rises from the black border to the white margin
+        rising = np.maximum(np.diff(profile, axis = 1), 0).reshape(4, len(spacing), -1)
+        shift  = (rising @ middles) / np.maximum(rising.sum(axis = 2), 1e-6)
+        edges  = points + shift[..., None] * normals[:, None]
+
+        # Fits a line to each edge
+        centers  = edges.mean(axis = 1)
+        spread   = edges - centers[:, None]
+        angles   = 0.5 * np.arctan2(2 * np.sum(spread[..., 0] * spread[..., 1], axis = 1), np.sum(spread[..., 0]**2 - spread[..., 1]**2, axis = 1))
+        lineDirs = np.column_stack((np.cos(angles), np.sin(angles)))
+
+        # Intersects each edge with the one before it
+        prevCenters = np.roll(centers,  1, axis = 0)
+        prevDirs    = np.roll(lineDirs, 1, axis = 0)
+        gap     = centers - prevCenters
+        cross   = prevDirs[:, 0] * lineDirs[:, 1] - prevDirs[:, 1] * lineDirs[:, 0]
+        along   = (gap[:, 0] * lineDirs[:, 1] - gap[:, 1] * lineDirs[:, 0]) / cross
+        corners = prevCenters + along[:, None] * prevDirs
+
+    return corners
+
+def solveTagPose(corners, camera_matrix, distortion = None):
+    """
+    Solves the pose of one tag from its corners with cv.solvePnP. Releases the GIL, so it can run in a thread pool.
+    @param corners: The (4, 2) corners of the tag in pixels
+    @param camera_matrix: The camera's calibration matrix
+    @param distortion: The camera's distortion coefficients. None for an ideal lens
+    @return rMatrix, tVecs, error: error is the object-space error pupil_apriltags reports as pose_err
+    """
+    # Solves the pose
+    _, rVecs, tVecs = cv.solvePnP(tagCorners, corners, camera_matrix, distortion, flags = cv.SOLVEPNP_IPPE_SQUARE)
+    rMatrix, _ = cv.Rodrigues(rVecs)
+
+    # Projects each corner's camera-frame position onto its undistorted line of sight and sums the squared misses
+    normalized = cv.undistortPoints(np.asarray(corners, np.float64).reshape(-1, 1, 2), camera_matrix, distortion).reshape(-1, 2)
+    rays   = np.column_stack((normalized, np.ones(len(normalized))))
+    points = tagCorners @ rMatrix.T + tVecs.reshape(1, 3)
+    along  = np.sum(points * rays, axis = 1) / np.sum(rays * rays, axis = 1)
+    error  = float(np.sum((points - along[:, None] * rays)**2))
+
+    return rMatrix, tVecs.reshape(3, 1), error
+
 # Creates the Detector Class
 class Detector:
-    def __init__(self) -> None:
+    def __init__(self, config: DetectionConfig = None) -> None:
         """
         Constructor for the Detector class.
+        @param config: The DetectionConfig to follow. One is created if not given
         """
         # Instance creation
-        self.timer = Timer()
-        self.comms = NetworkCommunications()
+        self.clock       = ClockSync()
+        self.comms       = NetworkCommunications()
+        self.fieldLayout = AprilTagFieldLayout()
+        self.config      = config if (config is not None) else DetectionConfig()
+        self.configVersion = -1
+
+        # Keeps the field layout in our alliance's frame
+        self.comms.addAllianceListener(self.setAlliance)
 
         # Creates a pupil apriltags detector
         self.detector = pupil_apriltags.Detector(families = "tag16h5", nthreads = 10, quad_decimate = 1.0, quad_sigma = 0.0, refine_edges = 2.0, decode_sharpening = 1.00)
 
+        # Solves the poses of the tags that pass screening in parallel
+        self.posePool = ThreadPoolExecutor(max_workers = 4)
+
+        # Applies the configured thresholds
+        self.applyConfig()
+
         # Update logs
         Logger.logInfo("Detector initialized")
 
-    def detectTags(self, stream, camera_matrix, vizualization: int = 0):
+    def detectTags(self, stream, camera_matrix, vizualization: int = 0, frameInfo = None, distortion = None):
         """
         Detects AprilTags in a stream using pupil_apriltags.
-        @param stream: An images generated by reading a VideoCapture
+        @param stream: An images generated by reading a VideoCapture. It is only read from unless vizualization is set, so a FrameRing view can be passed in directly
         @param camera_matrix: The camera's calibration matrix
         @param vizualization: 0 - Highlight, 1 - Highlight + Boxes, 2 - Highlight + Axes, 3 - Highlight + Boxes + Axes
-        @return detectionResult, image
+        @param frameInfo: The stream's FrameInfo. The detection time is the capture time when given
+        @param distortion: The camera's distortion coefficients from calibration. None for an ideal lens
+        @return detectionResults: A list of TagResults
+        @return image
         """
+        # Picks up config changes between frames
+        self.applyConfig()
+
         # If the stream is not grayscale, create a grayscale copy
         if (len(stream.shape) == 3):
             gray = cv.cvtColor(stream, cv.COLOR_BGR2GRAY)
         else:
             gray = stream
 
-        # Define the intrinsic parameters of the camera
-        intrinsic_properties = (camera_matrix[0, 0], camera_matrix[1, 1], camera_matrix[0, 2], camera_matrix[1, 2])  # fx, fy, cx, cy
-
-        # Detect the AprilTags in the image with Pupil Apriltags
-        detections = self.detector.detect(gray, estimate_tag_pose = True, camera_params = intrinsic_properties, tag_size = tagSize)
+        # Detect the AprilTags in the image with Pupil Apriltags. Poses are solved later, only for the tags that pass screening
+        detections = self.detector.detect(gray, estimate_tag_pose = False)
 
         # Variables to use in detections
         results = []
-        maxError = 5e-6
-        maxHamming = 0
-        minConfidence = 50
+        maxError = self.maxError
+        maxHamming = self.maxHamming
+        minConfidence = self.minConfidence
+
+        # Throws out tags not present on the field and noise before solving any poses
+        detections = [tag for tag in detections if (self.fieldLayout.hasTag(tag.tag_id) and (tag.hamming <= maxHamming) and (tag.decision_margin >= minConfidence))]
+
+        # Refines the corners of small, distant tags
+        detectedCorners = [tag.corners for tag in detections]
+        if (self.refineMaxSide > 0):
+            detectedCorners = list(self.posePool.map(refineTagCorners, [gray] * len(detections), detectedCorners, [self.refineMaxSide] * len(detections)))
+
+        # Solves the poses of the remaining tags
+        poses = self.posePool.map(solveTagPose, detectedCorners, [camera_matrix] * len(detections), [distortion] * len(detections))
 
         # Variables to use in sorting the data
         best = None
         minError = 1000
 
-        # Gets current time
-        time = self.timer.getFPGATimestamp()
+        # Gets the capture time in robot time
+        detectionTime = self.clock.toRobotTime(frameInfo.captureTime if (frameInfo is not None) else time.monotonic())
 
         # Access the 3D pose of all detected tag
-        for tag in detections:
+        for tag, corners, (rMatrix, tVecs, error) in zip(detections, detectedCorners, poses):
             # Gets info from the tag
             decision_margin = tag.decision_margin
-            hamming         = tag.hamming
             tag_num         = tag.tag_id
             center          = tag.center
-            error           = tag.pose_err
-
-            # Gets pose data from the tag
-            rMatrix = tag.pose_R
-            tVecs   = tag.pose_t
-
-            # Throws out tags not present on the field
-            if (1 <= tag_num <= 8):
-                # Throws out noise
-                if ((hamming <= maxHamming) and (error <= maxError) and (decision_margin >= minConfidence)):
-                    # Creates a 3d pose array from the rotation matrix and translation vectors
-                    pose = np.concatenate([rMatrix, tVecs], axis = 1)
-                else:
-                    # Detected tag is noise, move to next detection
-                    continue
-            else:
-                # Detected tag is not on field, move to next detection
+
+            # Throws out poses that did not fit
+            if (error > maxError):
                 continue
 
+            # Creates a 3d pose array from the rotation matrix and translation vectors
+            pose = np.concatenate([rMatrix, tVecs], axis = 1)
+
             # Sets detection time
-            self.comms.setDetectionTimeSec(time)
+            self.comms.setDetectionTimeSec(detectionTime)
 
             # Draws varying levels of information onto the image
             if (vizualization == 1):
-                self.draw_pose_box(stream, camera_matrix, pose)
+                self.draw_pose_box(stream, camera_matrix, pose, distortion = distortion)
             elif (vizualization == 2):
-                self.draw_pose_axes(stream, camera_matrix, pose, center)
+                self.draw_pose_axes(stream, camera_matrix, pose, center, distortion)
             elif (vizualization == 3):
-                self.draw_pose_box(stream, camera_matrix, pose)
-                self.draw_pose_axes(stream, camera_matrix, pose, center)
+                self.draw_pose_box(stream, camera_matrix, pose, distortion = distortion)
+                self.draw_pose_axes(stream, camera_matrix, pose, center, distortion)
 
             # Calculate Pose3d
             pose3d = self.getPose3D(pose)
 
             # Adds results to the arrays
-            result = [tag_num, pose3d]
+            result = TagResult(tag_num, corners, center, pose3d, error, decision_margin)
             results.append(result)
 
             # Determines if the current decision margin is larger than the last one and stores the corresponding data
@@ -120,6 +228,8 @@ class Detector:
         # Stores the best result in NetworkTables
         if (best is not None):
             self.comms.setBestResult(best)
+            self.comms.setBestTagPose(self.fieldLayout.getTagPose(best.id))
+        self.comms.setResults(results)
 
         # Determines if there are valid targets
         if (len(results) > 0):
@@ -127,8 +237,47 @@ class Detector:
         else:
             self.comms.setTargetValid(False)
 
+        # Sends how old the results are
+        if (frameInfo is not None):
+            publishTime = time.monotonic()
+            self.comms.setLatency(frameInfo.getLatency(publishTime), frameInfo.getStages(publishTime))
+
         return results, stream
 
+    def applyConfig(self):
+        """
+        Applies the latest DetectionConfig values if they changed. The pupil_apriltags settings are written into the existing detector instead of creating a new one.
+        """
+        # Checks for a new version
+        version, values = self.config.get()
+        if (version == self.configVersion):
+            return
+        self.configVersion = version
+
+        # Updates the thresholds
+        settings = values["apriltag"]
+        self.maxError      = settings["maxError"]
+        self.maxHamming    = settings["maxHamming"]
+        self.minConfidence = settings["minConfidence"]
+        self.refineMaxSide = settings["refineMaxSide"]
+
+        # Updates the detector settings
+        detector = self.detector.tag_detector_ptr.contents
+        detector.quad_decimate     = float(settings["quadDecimate"])
+        detector.quad_sigma        = float(settings["quadSigma"])
+        detector.refine_edges      = int(settings["refineEdges"])
+        detector.decode_sharpening = float(settings["decodeSharpening"])
+
+    def setAlliance(self, isRed: bool):
+        """
+        Switches the field layout to the given alliance's frame. Called by NetworkCommunications when the alliance changes.
+        @param isRed
+        """
+        if (isRed == True):
+            self.fieldLayout.setOrigin(AprilTagFieldLayout.Origin.kRedAllianceWallRightSide)
+        else:
+            self.fieldLayout.setOrigin(AprilTagFieldLayout.Origin.kBlueAllianceWallRightSide)
+
     def getPose3D(self, poseMatrix = None):
         """
         Calculates a WPILib Pose3D from the PupilApriltags matrix
@@ -185,13 +334,14 @@ class Detector:
             # Returns a blank Pose3d
             return Pose3d()
 
-    def draw_pose_box(self, img, camera_matrix, pose, z_sign = 1):
+    def draw_pose_box(self, img, camera_matrix, pose, z_sign = 1, distortion = None):
         """
         Draws the 3d pose box around the AprilTag.
         @param img: The image to write on
         @param camera_matrix: The camera's calibration matrix
         @param pose: The 3d pose of the tag
         @param z_sign: The direction of the z-axis
+        @param distortion: The camera's distortion coefficients. None for an ideal lens
         """
         # Creates object points
         opoints = np.array([
@@ -225,8 +375,8 @@ class Detector:
         rVecs, _ = cv.Rodrigues(pose[:3,:3])
         tVecs = pose[:3, 3:]
 
-        # Derivative coefficients
-        dcoeffs = np.zeros(5)
+        # Distortion coefficients
+        dcoeffs = distortion if (distortion is not None) else np.zeros(5)
 
         # Calulate image points of each AprilTag
         ipoints, _ = cv.projectPoints(opoints, rVecs, tVecs, camera_matrix, dcoeffs)
@@ -237,20 +387,21 @@ class Detector:
         for i, j in edges:
             cv.line(img, ipoints[i], ipoints[j], (0, 255, 0), 1, 16)
 
-    def draw_pose_axes(self, img, camera_matrix, pose, center):
+    def draw_pose_axes(self, img, camera_matrix, pose, center, distortion = None):
         """
         Draws the colored pose axes around the AprilTag.
         @param img: The image to write on
         @param camera_matrix: The camera's calibration matrix
         @param pose: The 3d pose of the tag
         @param center: The center of the AprilTag
+        @param distortion: The camera's distortion coefficients. None for an ideal lens
         """
         # Calulcates rotation and translation vectors for each AprilTag
         rVecs, _ = cv.Rodrigues(pose[:3,:3])
         tVecs    = pose[:3, 3:]
 
-        # Derivative coefficients
-        dcoeffs = np.zeros(5)
+        # Distortion coefficients
+        dcoeffs = distortion if (distortion is not None) else np.zeros(5)
 
         # Calculate object points of each AprilTag
         opoints = np.float32([[1, 0, 0],
@@ -3,8 +3,10 @@
 # Import Libraries
 import os
 import glob
+import time
 import cv2   as cv
 import numpy as np
+from   concurrent.futures import ProcessPoolExecutor
 
 # Import Utilities
 from Utilities.Logger import Logger
@@ -15,19 +17,148 @@ CHESSBOARD = (8, 5)  # Number of interior corners (width in squares - 1 x height
 # Default termination criteria
 criteria = (cv.TERM_CRITERIA_EPS + cv.TERM_CRITERIA_MAX_ITER, 30, 0.001)
 
+# Name of the per-image corner cache stored next to the calibration images
+CORNER_CACHE = "corners.npz"
+
+# Name of the stored calibration results, reused until the images change
+CALIBRATION_CACHE = "calibration.npz"
+
+# Automatic capture settings
+AUTO_CAPTURE_WIDTH   = 320   # Width of the frame used for the fast chessboard check
+POSITION_GRID        = 3     # The view is split into a POSITION_GRID x POSITION_GRID grid of board positions
+TILT_THRESHOLD       = 0.05  # Relative difference of opposite board edges that counts as a tilt
+AUTO_CAPTURE_TIMEOUT = 60.0  # Seconds to look for the board before falling back to the stored calibration
+
+def getPoseBin(corners, width: int, height: int) -> tuple:
+    """
+    Buckets a detected chessboard by where it sits in the view and which way it is tilted.
+    @param corners: The detected chessboard corners
+    @param width: The image width
+    @param height: The image height
+    @return (column, row, tilt): tilt is 0 for flat, 1/2 for left/right and 3/4 for up/down
+    """
+    # Gets the outer corners of the board in order around its edge
+    grid = corners.reshape(CHESSBOARD[1], CHESSBOARD[0], 2)
+    quad = np.array([grid[0, 0], grid[0, -1], grid[-1, -1], grid[-1, 0]])
+
+    # Finds which grid cell the board center falls in
+    center = grid.reshape(-1, 2).mean(axis = 0)
+    column = min(max(int(center[0] / width  * POSITION_GRID), 0), POSITION_GRID - 1)
+    row    = min(max(int(center[1] / height * POSITION_GRID), 0), POSITION_GRID - 1)
+
+    # Splits the edges into the left/right and top/bottom pairs, whichever way the board was detected
+    edges     = np.roll(quad, -1, axis = 0) - quad
+    midpoints = (np.roll(quad, -1, axis = 0) + quad) / 2
+    lengths   = np.linalg.norm(edges, axis = 1)
+    vertical  = 0 if (abs(edges[0, 1]) > abs(edges[0, 0])) else 1
+    sides     = [vertical, vertical + 2]
+    ends      = [1 - vertical, 3 - vertical]
+
+    # Compares opposite edges. A tilted board makes the far edge shorter
+    left,  right  = lengths[sorted(sides, key = lambda i: midpoints[i, 0])]
+    top,   bottom = lengths[sorted(ends,  key = lambda i: midpoints[i, 1])]
+    yaw   = (left - right) / (left + right)
+    pitch = (top - bottom) / (top + bottom)
+
+    # Picks the strongest tilt
+    if (max(abs(yaw), abs(pitch)) < TILT_THRESHOLD):
+        tilt = 0
+    elif (abs(yaw) >= abs(pitch)):
+        tilt = 1 if (yaw > 0) else 2
+    else:
+        tilt = 3 if (pitch > 0) else 4
+
+    return (column, row, tilt)
+
+def coverageComplete(coverage: set) -> bool:
+    """
+    Checks if the captured poses cover every grid cell and every tilt direction.
+    @param coverage: A set of pose bins from getPoseBin()
+    @return coverageComplete
+    """
+    positions = {(column, row) for column, row, _ in coverage}
+    tilts     = {tilt for _, _, tilt in coverage}
+
+    return (len(positions) == POSITION_GRID**2) and (len(tilts) == 5)
+
+def findCorners(imagePath: str):
+    """
+    Finds and refines the chessboard corners of one calibration image. Runs inside a worker process.
+    @param imagePath
+    @return corners: None if the desired number of corners was not found
+    """
+    # Reads the image straight into grayscale
+    gray = cv.imread(imagePath, cv.IMREAD_GRAYSCALE)
+    if (gray is None):
+        return None
+
+    # Finds chessboard corners. ret is true only if the desired number of corners are found
+    ret, corners = cv.findChessboardCorners(gray, CHESSBOARD, cv.CALIB_CB_ADAPTIVE_THRESH + cv.CALIB_CB_FAST_CHECK + cv.CALIB_CB_NORMALIZE_IMAGE)
+    if (ret == False):
+        return None
+
+    # Refining pixel coordinates for given 2d points.
+    return cv.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+
+def calculateResiduals(objPoints, imgPoints, rVecs, tVecs, cameraMatrix, distortion):
+    """
+    Projects the object points of every view at once and measures how far they land from the detected corners.
+    @param objPoints: (views, points, 3) object points
+    @param imgPoints: (views, points, 2) detected image points
+    @param rVecs: The rotation vectors of each view
+    @param tVecs: The translation vectors of each view
+    @param cameraMatrix
+    @param distortion: Up to 8 coefficients (k1, k2, p1, p2, k3, k4, k5, k6)
+    @return residuals: (views, points) distance in pixels between each projected and detected point
+    """
+    # Packs the pose of every view into arrays
+    rVecs = np.asarray(rVecs, np.float64).reshape(-1, 3)
+    tVecs = np.asarray(tVecs, np.float64).reshape(-1, 1, 3)
+
+    # Creates the rotation matrices of every view using the Rodrigues formula
+    theta = np.linalg.norm(rVecs, axis = 1)
+    k     = rVecs / np.where(theta > 0, theta, 1)[:, None]
+    K     = np.zeros((len(rVecs), 3, 3))
+    K[:, 0, 1], K[:, 0, 2], K[:, 1, 2] = -k[:, 2],  k[:, 1], -k[:, 0]
+    K[:, 1, 0], K[:, 2, 0], K[:, 2, 1] =  k[:, 2], -k[:, 1],  k[:, 0]
+    R = np.eye(3) + np.sin(theta)[:, None, None] * K + (1 - np.cos(theta))[:, None, None] * (K @ K)
+
+    # Moves the object points into each camera frame and normalizes them
+    camPoints = np.asarray(objPoints, np.float64) @ R.transpose(0, 2, 1) + tVecs
+    x = camPoints[..., 0] / camPoints[..., 2]
+    y = camPoints[..., 1] / camPoints[..., 2]
+
+    # Applies the lens distortion
+    d = np.zeros(8)
+    d[:min(8, np.size(distortion))] = np.ravel(distortion)[:8]
+    r2 = x*x + y*y
+    radial = (1 + r2*(d[0] + r2*(d[1] + r2*d[4]))) / (1 + r2*(d[5] + r2*(d[6] + r2*d[7])))
+    xd = x*radial + 2*d[2]*x*y + d[3]*(r2 + 2*x*x)
+    yd = y*radial + d[2]*(r2 + 2*y*y) + 2*d[3]*x*y
+
+    # Converts the points into pixels
+    u = cameraMatrix[0, 0]*xd + cameraMatrix[0, 1]*yd + cameraMatrix[0, 2]
+    v = cameraMatrix[1, 1]*yd + cameraMatrix[1, 2]
+
+    # Calculates the distance to every detected point
+    imgPoints = np.asarray(imgPoints, np.float64).reshape(u.shape + (2,))
+    return np.hypot(imgPoints[..., 0] - u, imgPoints[..., 1] - v)
+
 # Creates the Calibrate class
 class Calibrate:
-    def __init__(self, cap, camNum: int, numImages: int = 15) -> None:
+    def __init__(self, cap, camNum: int, numImages: int = 15, autoCapture: bool = False) -> None:
         """
         Constructor for the Calibrate class.
         @param VideoCapture
         @param Camera Number
         @param Number of Calibration Images
+        @param autoCapture: Take the calibration images without an operator
         """
         # Localizes parameters
         self.cap               = cap
         self.camNum            = camNum
         self.calibrationImages = numImages
+        self.autoCapture       = autoCapture
 
         # Get height and width
         self.width  = int(self.cap.get(cv.CAP_PROP_FRAME_WIDTH))
@@ -48,103 +179,220 @@ class Calibrate:
         # File extension
         self.EXTENSION = ".png"
 
-        # Variables
-        self.doOver = False
+        # Number of processes used to find corners
+        self.numWorkers = os.cpu_count()
 
         # Updates log
         Logger.logInfo("Calibration initialized")
 
-    def calibrateCamera(self):
+    def calibrateCamera(self, targetError: float = None, source = None):
         """
-        Calibrates the given camera at a certain resolution
-        @return calibrationSuccessful
+        Calibrates the given camera at a certain resolution.
+
+        If a target error is given, the views with the worst reprojection error are dropped and the camera is recalibrated until the RMS error reaches the target or too few views are left.
+        If automatic capture cannot take enough images in time, the last stored calibration is used instead.
+        @param targetError: The desired RMS reprojection error in pixels
+        @param source: A VideoCapture or the path to a recorded video to take new images from automatically. Defaults to the stored images, then this camera's capture
+        @return calibrationSuccessful: False if no images could be taken and nothing was stored
         @return cameraMatrix
         @return cameraDistortion
         @return rotationVectors
         @return translationVectors
         """
-        # Variable to see how many images were used in the calibration
-        imagesUsed = 0
-        self.doOver == False
-
         # Checks if reference images exist
         refExists = self.getPathExistance()
 
-        # Creates reference images for this resolution if they do not exist or do not contain sufficient data
-        if ((refExists == False) or (self.doOver == True)):
-            self.createCalibrationImages()
-        else:
-            pass
+        # Creates reference images for this resolution if they do not exist, or from the given source
+        if (((refExists == False) or (source is not None)) and (self.takeCalibrationImages(source) == False)):
+            return self.loadFallbackCalibration()
 
-        # Gets the path for all the images saved for this camera at a certain resolution
-        images = glob.glob(self.PATH + "*" + self.EXTENSION)
+        # Reuses the last calibration if the images have not changed, so a reboot does not have to calibrate again
+        cached = self.loadCalibration(targetError)
+        if (cached is not None):
+            Logger.logInfo("Camera {} calibration loaded from {}".format(self.camNum, self.PATH + CALIBRATION_CACHE))
+            return cached
 
-        # Loops through stored images
-        for image in images:
-            # Reads the created images
-            img = cv.imread(image)
+        # Extracts the corners from every stored image
+        imageSize = self.extractCorners()
 
-            # Converts images to grayscale
-            gray = cv.cvtColor(img, cv.COLOR_BGR2GRAY)
+        # Retakes the images if 1/2 of them cannot be used for calibration
+        while (len(self.imgPoints) < (self.calibrationImages * 1/2)):
+            # Updates log
+            Logger.logWarning("Calibration restarted")
+            Logger.logInfo("Images found: {}".format(len(self.imgPoints)))
 
-            # Finds chessboard corners. ret is true only if the desired number of corners are found
-            ret, corners = cv.findChessboardCorners(gray, CHESSBOARD, cv.CALIB_CB_ADAPTIVE_THRESH + cv.CALIB_CB_FAST_CHECK + cv.CALIB_CB_NORMALIZE_IMAGE)
+            # Retakes the images and extracts their corners again
+            if (self.takeCalibrationImages(source) == False):
+                return self.loadFallbackCalibration()
+            imageSize = self.extractCorners()
 
-            # Desired number of corners found, add object and image points after refining them
-            if (ret == True):
-                # Adds the objectpoint
-                self.objPoints.append(self.objp)
+        # Updates log
+        Logger.logInfo("Images found: {}".format(len(self.imgPoints)))
 
-                # Refining pixel coordinates for given 2d points.
-                corners2 = cv.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+        # Calibrate the camera by passing the value of known 3D points (objPoints) and corresponding pixel coordinates of the detected corners (imgPoints)
+        ret, self.cameraMatrix, self.distortion, self.rVecs, self.tVecs = cv.calibrateCamera(self.objPoints, self.imgPoints, imageSize, None, None)
 
-                # Adds image point
-                self.imgPoints.append(corners2)
+        # Calculates the reprediction error
+        repredictError = self.calculateRepredictionError()
 
-                # Draw the corners onto the image
-                img = cv.drawChessboardCorners(img, CHESSBOARD, corners2, ret)
+        # Drops the worst views until the target error is reached
+        if (targetError is not None):
+            ret = self.refineCalibration(targetError, imageSize, ret)
+            repredictError = self.calculateRepredictionError()
 
-                # Increments the imagesUsed count
-                imagesUsed += 1
+        # Stores the per-view statistics with the corner cache, and the results for the next start
+        self.saveCornerCache(self.cache)
+        self.saveCalibration(targetError, ret)
 
-            # Display the image and wait for half a second
-            if ((ret == True) & (refExists == False)):
-                # Flips the image for easier viewing
-                img = cv.flip(img, 1)
+        # Updates log
+        Logger.logInfo("Camera {} Calibrated".format(self.camNum))
+        Logger.logInfo("Camera Properties: \nCamera Matrix: \n{}, \nDistortion Matrix: \n{}, \nRotation Vectors: \n{}, \nTranslation Vectors: \n{}, \nAverage Reprediction Value: {}".format(self.cameraMatrix, self.distortion, self.rVecs, self.tVecs, repredictError))
 
-                # Displays image
-                cv.imshow("img", img)
-                cv.waitKey(500)
+        # Return calibration results
+        return ret, self.cameraMatrix, self.distortion, self.rVecs, self.tVecs
 
-        # Destroys all cached windows
-        cv.destroyAllWindows()
+    def getImageKey(self, targetError: float) -> str:
+        """
+        Describes the stored images and calibration settings, so stored results can be matched to them.
+        @param targetError
+        @return key
+        """
+        images = sorted(glob.glob(self.PATH + "*" + self.EXTENSION))
+        return repr([(os.path.basename(image), os.path.getmtime(image)) for image in images] + [targetError])
 
-        # Restarts the calibration if 1/2 of the images cannot be used for calibration
-        if (imagesUsed < (self.calibrationImages * 1/2)):
-            # Updates log
-            Logger.logWarning("Calibration restarted")
-            Logger.logInfo("Images found: {}".format(imagesUsed))
+    def loadCalibration(self, targetError: float, matchImages: bool = True):
+        """
+        Loads the stored calibration results if they were made from the current images.
+        @param targetError
+        @param matchImages: Only loads results made from the current images and target error
+        @return results: The same tuple as calibrateCamera(), or None if there are no matching results
+        """
+        # Checks for stored results
+        if (os.path.exists(self.PATH + CALIBRATION_CACHE) == False):
+            return None
 
-            # Sets up for a do over
-            self.doOver = True
+        with np.load(self.PATH + CALIBRATION_CACHE) as data:
+            # Checks that the images have not changed
+            if ((matchImages == True) and (str(data["key"]) != self.getImageKey(targetError))):
+                return None
 
-            self.calibrateCamera()
-        else:
-            Logger.logInfo("Images found: {}".format(imagesUsed))
-            self.doOver = False
+            # Unpacks the results
+            self.cameraMatrix = data["cameraMatrix"]
+            self.distortion   = data["distortion"]
+            self.rVecs        = tuple(data["rVecs"])
+            self.tVecs        = tuple(data["tVecs"])
 
-        # Calibrate the camera by passing the value of known 3D points (objPoints) and corresponding pixel coordinates of the detected corners (imgPoints)
-        ret, self.cameraMatrix, self.distortion, self.rVecs, self.tVecs = cv.calibrateCamera(self.objPoints, self.imgPoints, gray.shape[::-1], None, None)
+            return float(data["error"]), self.cameraMatrix, self.distortion, self.rVecs, self.tVecs
 
-        # Calculates the reprediction error
-        repredictError = self.calculateRepredictionError()
+    def saveCalibration(self, targetError: float, error: float):
+        """
+        Stores the calibration results with the images they were made from.
+        @param targetError
+        @param error: The RMS reprojection error
+        """
+        np.savez(self.PATH + CALIBRATION_CACHE, key = self.getImageKey(targetError), error = error, cameraMatrix = self.cameraMatrix, distortion = self.distortion, rVecs = np.array(self.rVecs), tVecs = np.array(self.tVecs))
+
+    def loadFallbackCalibration(self):
+        """
+        Loads the last stored calibration for this camera and resolution, even if it was made from other images. Used when new images could not be taken.
+        @return results: The same tuple as calibrateCamera(). calibrationSuccessful is False if nothing was stored
+        """
+        cached = self.loadCalibration(None, matchImages = False)
+        if (cached is None):
+            Logger.logWarning("Camera {} could not be calibrated and has no stored calibration".format(self.camNum))
+            return False, None, None, None, None
 
         # Updates log
-        Logger.logInfo("Camera {} Calibrated".format(self.camNum))
-        Logger.logInfo("Camera Properties: \nCamera Matrix: \n{}, \nDistortion Matrix: \n{}, \nRotation Vectors: \n{}, \nTranslation Vectors: \n{}, \nAverage Reprediction Value: {}".format(self.cameraMatrix, self.distortion, self.rVecs, self.tVecs, repredictError))
+        Logger.logWarning("Camera {} could not take calibration images. Using the calibration stored at {}".format(self.camNum, self.PATH + CALIBRATION_CACHE))
 
-        # Return calibration results
-        return ret, self.cameraMatrix, self.distortion, self.rVecs, self.tVecs
+        return cached
+
+    def takeCalibrationImages(self, source = None) -> bool:
+        """
+        Takes the calibration images automatically or with an operator. Images from a source are always taken automatically.
+        @param source: A VideoCapture or the path to a recorded video. Defaults to this camera's capture
+        @return imagesTaken: False if automatic capture gave up and the stored images were kept
+        """
+        if ((self.autoCapture == True) or (source is not None)):
+            return self.autoCaptureCalibrationImages(source)
+
+        self.createCalibrationImages()
+
+        return True
+
+    def extractCorners(self):
+        """
+        Extracts the chessboard corners from every stored calibration image. Images that are already in the corner cache are not processed again, the rest are spread across a process pool.
+        @return imageSize (width, height)
+        """
+        # Clears the points from any earlier run
+        self.objPoints  = []
+        self.imgPoints  = []
+        self.imgNames   = []
+        self.viewErrors = {}
+
+        # Gets the path for all the images saved for this camera at a certain resolution
+        images = sorted(glob.glob(self.PATH + "*" + self.EXTENSION))
+
+        # Loads the cached corners and finds the images that still need processing
+        self.cache = cache = self.loadCornerCache()
+        missing = [image for image in images if (cache.get(os.path.basename(image), (None, None))[0] != os.path.getmtime(image))]
+
+        # Finds the corners of the missing images in parallel
+        if (len(missing) > 0):
+            with ProcessPoolExecutor(max_workers = self.numWorkers, initializer = cv.setNumThreads, initargs = (1,)) as pool:
+                for image, corners in zip(missing, pool.map(findCorners, missing)):
+                    cache[os.path.basename(image)] = (os.path.getmtime(image), corners)
+
+            # Stores the updated cache
+            self.saveCornerCache(cache)
+
+        # Adds the object and image points of every usable image
+        for image in images:
+            corners = cache[os.path.basename(image)][1]
+            if (corners is not None):
+                self.objPoints.append(self.objp)
+                self.imgPoints.append(corners)
+                self.imgNames .append(os.path.basename(image))
+
+        return (self.width, self.height)
+
+    def loadCornerCache(self) -> dict:
+        """
+        Loads the cached corners of this camera's calibration images.
+        @return cache: {imageName: (modifiedTime, corners or None)}
+        """
+        # Variables
+        cache = {}
+
+        # Returns an empty cache if there is nothing stored yet
+        if (os.path.exists(self.PATH + CORNER_CACHE) == False):
+            return cache
+
+        # Unpacks the stored arrays
+        with np.load(self.PATH + CORNER_CACHE) as data:
+            for name, mtime in zip(data["names"], data["mtimes"]):
+                corners = data["corners_" + name]
+                cache[str(name)] = (float(mtime), corners if (corners.size > 0) else None)
+
+        return cache
+
+    def saveCornerCache(self, cache: dict):
+        """
+        Stores the corners of this camera's calibration images.
+        @param cache: {imageName: (modifiedTime, corners or None)}
+        """
+        # Packs the cache into named arrays. Views that were not used in the last calibration have an error of NaN
+        arrays = {
+            "names":  np.array(list(cache.keys())),
+            "mtimes": np.array([mtime for mtime, _ in cache.values()], dtype = np.float64),
+            "errors": np.array([self.viewErrors.get(name, np.nan) for name in cache.keys()], dtype = np.float64)
+        }
+        for name, (_, corners) in cache.items():
+            arrays["corners_" + name] = corners if (corners is not None) else np.zeros((0, 1, 2), np.float32)
+
+        # Writes the cache
+        np.savez(self.PATH + CORNER_CACHE, **arrays)
 
     def createCalibrationImages(self):
         """
@@ -169,8 +417,11 @@ class Calibrate:
                 # Read the capture
                 sucess, stream = self.cap.read()
 
-                # Stores a totally seperate copy of stream
-                tempStream = cv.cvtColor(stream, cv.COLOR_BGR2RGB)
+                # Waits for the camera if the read failed
+                if (sucess == False):
+                    Logger.logWarning("Failed to read camera {} for calibration".format(self.camNum))
+                    cv.waitKey(100)
+                    continue
 
                 # Converts images to grayscale
                 gray = cv.cvtColor(stream, cv.COLOR_BGR2GRAY)
@@ -178,27 +429,25 @@ class Calibrate:
                 # Finds chess board corners. ret is true if the desired number of corners are found
                 ret, corners = cv.findChessboardCorners(gray, CHESSBOARD, cv.CALIB_CB_ADAPTIVE_THRESH + cv.CALIB_CB_FAST_CHECK + cv.CALIB_CB_NORMALIZE_IMAGE)
 
-                # Draws the chessboard pattern onto the stream
+                # Draws the chessboard pattern onto a copy of the stream so the stored image stays clean
+                display = stream
                 if (ret == True):
                     # Refining pixel coordinates for given 2d points.
                     corners2 = cv.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
 
-                    # Draw the corners onto the stream
-                    cv.drawChessboardCorners(stream, CHESSBOARD, corners2, ret)
+                    # Draw the corners onto the copy
+                    display = cv.drawChessboardCorners(stream.copy(), CHESSBOARD, corners2, ret)
 
                 # Flips the capture for display purposes
-                flippedStream = cv.flip(stream, 1)
+                flippedStream = cv.flip(display, 1)
 
                 # Display the capture
                 cv.imshow("Callibration", flippedStream)
 
                 # Press p to take a calibration image
                 if ( cv.waitKey(1) == ord("p") ):
-                    # Converts the copy back into BGR
-                    tempStream = cv.cvtColor(tempStream, cv.COLOR_RGB2BGR)
-
                     # Writes the image
-                    cv.imwrite(self.PATH + "{}".format(j) + self.EXTENSION, tempStream)
+                    cv.imwrite(self.PATH + "{}".format(j) + self.EXTENSION, stream)
 
                     # Prints the status
                     print("Calibration image {} taken".format(j))
@@ -217,13 +466,89 @@ class Calibrate:
         Logger.logInfo("Calibration images generated")
         Logger.logInfo("Images stored at " +  self.PATH)
 
+    def autoCaptureCalibrationImages(self, source = None, timeout: float = AUTO_CAPTURE_TIMEOUT) -> bool:
+        """
+        Creates calibration images without an operator. A frame is only kept when it adds a new board position or tilt, and capturing stops once the whole view is covered.
+
+        The stored images are only replaced if at least half of the desired number were taken before the source ended or the timeout passed.
+        @param source: A VideoCapture or the path to a recorded video. Defaults to this camera's capture
+        @param timeout: Seconds to look for the board. None looks until the source ends
+        @return imagesTaken
+        """
+        # Opens the source. Captures opened here are released when done
+        opened = isinstance(source, str)
+        if (source is None):
+            source = self.cap
+        elif (opened == True):
+            source = cv.VideoCapture(source)
+
+        # Variables
+        coverage = set()
+        images   = []
+        start    = time.monotonic()
+
+        try:
+            while ((len(images) < self.calibrationImages) or (coverageComplete(coverage) == False)):
+                # Gives up once the timeout passes
+                if ((timeout is not None) and (time.monotonic() - start > timeout)):
+                    Logger.logWarning("Camera {} calibration capture timed out after {:.0f}s".format(self.camNum, timeout))
+                    break
+
+                # Read the capture
+                sucess, stream = source.read()
+                if (sucess == False):
+                    break
+
+                # Runs the fast check on a downscaled copy first
+                gray  = cv.cvtColor(stream, cv.COLOR_BGR2GRAY)
+                scale = AUTO_CAPTURE_WIDTH / gray.shape[1]
+                small = cv.resize(gray, None, fx = scale, fy = scale, interpolation = cv.INTER_AREA)
+                found, _ = cv.findChessboardCorners(small, CHESSBOARD, cv.CALIB_CB_FAST_CHECK)
+                if (found == False):
+                    continue
+
+                # Runs the full detection on candidates
+                ret, corners = cv.findChessboardCorners(gray, CHESSBOARD, cv.CALIB_CB_ADAPTIVE_THRESH + cv.CALIB_CB_NORMALIZE_IMAGE)
+                if (ret == False):
+                    continue
+
+                # Keeps the frame only if it adds a new pose
+                poseBin = getPoseBin(corners, gray.shape[1], gray.shape[0])
+                if (poseBin in coverage):
+                    continue
+                coverage.add(poseBin)
+                images.append(stream)
+
+                # Updates log
+                Logger.logInfo("Calibration image {} taken. Pose: {}".format(len(images), poseBin))
+        finally:
+            if (opened == True):
+                source.release()
+
+        # Keeps the stored images if too few were taken
+        if (len(images) < self.calibrationImages * 1/2):
+            Logger.logWarning("Camera {} only took {} calibration images. Keeping the stored images".format(self.camNum, len(images)))
+            return False
+
+        # Replaces the old images so stale frames are not mixed in
+        for image in glob.glob(self.PATH + "*" + self.EXTENSION):
+            os.remove(image)
+        for i, image in enumerate(images):
+            cv.imwrite(self.PATH + "{}".format(i + 1) + self.EXTENSION, image)
+
+        # Updates log
+        Logger.logInfo("Calibration images generated. Coverage complete: {}".format(coverageComplete(coverage)))
+        Logger.logInfo("Images stored at " +  self.PATH)
+
+        return True
+
     def getPathExistance(self) -> bool:
         """
-        Gets the existance of a directory at self.PATH
+        Gets the existance of enough calibration images at self.PATH. Automatic capture stores as few as half of the images, which is also the least calibration accepts
         @return isDirectoryThere
         """
         # Variables
-        img = None
+        numImages = 0
         pathExists = False
 
         # Attempts to make a directory at self.PATH
@@ -232,11 +557,11 @@ class Calibrate:
         except Exception as e:
             Logger.logError("{}".format(e))
 
-        # Attempts to read the last callibration image and updates variables accordingly
-        img = cv.imread(self.PATH + str(self.calibrationImages) + self.EXTENSION)
+        # Counts the stored calibration images
+        numImages = len(glob.glob(self.PATH + "*" + self.EXTENSION))
 
         # Determines if the calibration imgaes exist
-        if img is not None:
+        if (numImages >= self.calibrationImages * 1/2):
             pathExists = True
             Logger.logInfo("PATH already exists")
             print("PATH already exists")
@@ -247,21 +572,52 @@ class Calibrate:
 
         return pathExists
 
-    def calculateRepredictionError(self):
+    def refineCalibration(self, targetError: float, imageSize: tuple, rmsError: float) -> float:
         """
-        Calulates the reprediction error
+        Drops the views with the largest reprojection error and recalibrates until the target error is reached.
+        Every view above the target is dropped at once, so only a few recalibrations are needed.
+        @param targetError: The desired RMS reprojection error in pixels
+        @param imageSize (width, height)
+        @param rmsError: The RMS error of the current calibration
+        @return rmsError
         """
-        # Reprediction error
-        total_error = 0
+        # Never calibrate with fewer than half of the images
+        minViews = max(int(np.ceil(self.calibrationImages * 1/2)), 3)
+
+        while ((rmsError > targetError) and (len(self.imgPoints) > minViews)):
+            # Finds the views above the target, worst first
+            errors = np.array([self.viewErrors[name] for name in self.imgNames])
+            order  = np.argsort(errors)[::-1]
+            numDropped = min(int(np.count_nonzero(errors > targetError)), len(self.imgPoints) - minViews)
+            if (numDropped <= 0):
+                break
+
+            # Removes the views
+            keep = np.sort(order[numDropped:])
+            Logger.logInfo("Dropped views: {}".format([self.imgNames[i] for i in order[:numDropped]]))
+            self.objPoints = [self.objPoints[i] for i in keep]
+            self.imgPoints = [self.imgPoints[i] for i in keep]
+            self.imgNames  = [self.imgNames[i]  for i in keep]
+
+            # Recalibrates starting from the last result
+            rmsError, self.cameraMatrix, self.distortion, self.rVecs, self.tVecs = cv.calibrateCamera(self.objPoints, self.imgPoints, imageSize, self.cameraMatrix, self.distortion, flags = cv.CALIB_USE_INTRINSIC_GUESS)
+            self.calculateRepredictionError()
 
-        # Loops through object points
-        for i in range(len(self.objPoints)):
-            imgPoints2, _ = cv.projectPoints(self.objPoints[i], self.rVecs[i], self.tVecs[i], self.cameraMatrix, self.distortion)
-            error = cv.norm(self.imgPoints[i], imgPoints2, cv.NORM_L2) / len(imgPoints2)
-            total_error += error
+        # Updates log
+        Logger.logInfo("Refined RMS error: {} with {} views".format(rmsError, len(self.imgPoints)))
+
+        return rmsError
+
+    def calculateRepredictionError(self):
+        """
+        Calulates the reprediction error of every view and stores the RMS error of each one in self.viewErrors
+        @return meanError
+        """
+        # Calculates the residuals of every view at once
+        residuals = calculateResiduals(np.concatenate(self.objPoints), np.stack(self.imgPoints), self.rVecs, self.tVecs, self.cameraMatrix, self.distortion)
 
-        # Calculates mean error from the total
-        mean_error = total_error / len(self.objPoints)
+        # Stores the RMS error of each view
+        self.viewErrors = dict(zip(self.imgNames, np.sqrt(np.mean(residuals**2, axis = 1)).tolist()))
 
-        # Returns the mean error
-        return mean_error
\ No newline at end of file
+        # Calculates mean error from the L2 norm of each view
+        return float(np.mean(np.linalg.norm(residuals, axis = 1) / residuals.shape[1]))
@@ -1,7 +1,9 @@
 # Created by Alex Pereira
 
 # Import Libraries
-import cv2 as cv
+import time
+import cv2   as cv
+import numpy as np
 
 # Import Classes
 from calibration import Calibrate
@@ -9,64 +11,207 @@ from calibration import Calibrate
 # Import Utilities
 from Utilities.Logger import Logger
 
+# How long opening the camera and reading a frame can block, in milliseconds
+OPEN_TIMEOUT = 2000
+READ_TIMEOUT = 1000
+
 # Creates the USBCamera class
 class USBCamera:
     def __init__(self, camNum: int, path: str = None) -> None:
         """
         Constructor for the USBCamera class.
         @param camNumber
-        @param path: It can be found on Linux by running "find /dev/v4l"
+        @param path: It can be found on Linux by running "find /dev/v4l". The by-path name stays the same when the camera is plugged back in
         """
         # Set camera properties
         self.camNum = camNum
+        self.path   = path
 
         # Init variables
-        self.width  = -1
-        self.height = -1
-        self.fps    = -1
+        self.width     = -1
+        self.height    = -1
+        self.fps       = -1
+        self.grayscale = False
+        self.mode      = None
+        self.frameInterval = 0.0  # Seconds between the frames readInto() keeps. See setFps()
+        self.nextFrame     = 0.0
 
         # Creates a capture
-        if (path is not None):
+        self.open()
+
+        # Updates log
+        Logger.logInfo("USBCamera initialized")
+
+    def open(self) -> bool:
+        """
+        Opens the capture with the open and read timeouts, so a missing camera cannot block forever.
+        @return isOpened
+        """
+        # Sets the timeouts
+        params = [cv.CAP_PROP_OPEN_TIMEOUT_MSEC, OPEN_TIMEOUT, cv.CAP_PROP_READ_TIMEOUT_MSEC, READ_TIMEOUT]
+
+        if (self.path is not None):
             # If path is known, use the path
-            self.cap = cv.VideoCapture(path)
+            self.cap = cv.VideoCapture(self.path, cv.CAP_ANY, params)
         else:
             # Path is unknown, use the camera number
-            self.cap = cv.VideoCapture(self.camNum)
+            self.cap = cv.VideoCapture(self.camNum, cv.CAP_ANY, params)
 
-        # Updates log
-        Logger.logInfo("USBCamera initialized")
+        return self.cap.isOpened()
 
-    def resize(self, cameraRes: tuple):
+    def reopen(self, cameraRes: tuple, fps: int = 0) -> bool:
+        """
+        Releases and reopens the capture once, for a camera that stopped sending frames.
+        @param Camera Resolution
+        @param fps: The desired FPS
+        @return reopenSuccessful: True if a frame could be read afterwards
+        """
+        # Reopens the capture
+        self.cap.release()
+        if (self.open() == False):
+            return False
+
+        # Restores the capture settings
+        self.resize(cameraRes, fps)
+        self.setGrayscale(self.grayscale)
+
+        return self.cap.grab()
+
+    def resize(self, cameraRes: tuple, fps: int = 0, mode: dict = None):
         """
         Resizes the capture to a given resolution. If the specified resolution is too high, resizes to the highest resolution possible.
         @param Camera Resolution
+        @param fps: The desired FPS. 0 runs as fast as the camera can
+        @param mode: A mode from cameramodes.selectMode() to capture in. It is kept for later calls, such as reopen(). Without one, MJPG is used
         @return resizedCapture
         """
         # CONSTANTS
         HIGH_VALUE = 10000
 
+        # Remembers the mode
+        if (mode is not None):
+            self.mode = mode
+
+        # Gets the format, resolution, and FPS to ask for
+        if (self.mode is not None):
+            fourcc    = self.mode["format"]
+            cameraRes = (self.mode["width"], self.mode["height"])
+            fps       = fps if (fps > 0) else self.mode["fps"]
+        else:
+            fourcc = "MJPG"
+
+        # Sets the format first, since changing it makes the driver pick the resolution and FPS again
+        self.cap.set(cv.CAP_PROP_FOURCC, cv.VideoWriter_fourcc(*fourcc))
+
         # Set the values
         self.cap.set(cv.CAP_PROP_FRAME_WIDTH, cameraRes[0])
         self.cap.set(cv.CAP_PROP_FRAME_HEIGHT, cameraRes[1])
-        self.cap.set(cv.CAP_PROP_FPS, HIGH_VALUE)
+        self.cap.set(cv.CAP_PROP_FPS, fps if (fps > 0) else HIGH_VALUE)
 
         # Gets the highest value they go to
         self.width  = int(self.cap.get(cv.CAP_PROP_FRAME_WIDTH))
         self.height = int(self.cap.get(cv.CAP_PROP_FRAME_HEIGHT))
         self.fps    = int(self.cap.get(cv.CAP_PROP_FPS))
 
-        # Set the capture to be MJPG format
-        self.cap.set(cv.CAP_PROP_FOURCC, cv.VideoWriter_fourcc(*'MJPG'))
-
         # Prints telemetry
         print("Max Resolution:", str(self.width) + "x" + str(self.height))
         print("Max FPS:", self.fps)
 
         # Updates log
-        Logger.logInfo("Capture resized")
+        Logger.logInfo("Capture resized to {} {}x{} at {} FPS".format(fourcc, self.width, self.height, self.fps))
 
         return self.cap
 
+    def setFps(self, fps: int):
+        """
+        Limits the frames readInto() keeps to a rate. The others are grabbed and dropped without being decoded.
+
+        The capture keeps streaming in its mode, since setting the driver's FPS restarts the stream, and UVC cameras refuse it while streaming.
+        @param fps: The desired FPS. 0 keeps every frame
+        """
+        self.frameInterval = (1 / fps) if (fps > 0) else 0.0
+        self.nextFrame     = 0.0
+
+    def setGrayscale(self, grayscale: bool):
+        """
+        Switches the capture between color frames and grayscale frames. In grayscale the capture hands over its raw frames and only their brightness is decoded.
+
+        Reads with self.cap return raw frames while this is on, so calibrate before turning it on.
+        @param grayscale
+        """
+        self.grayscale = grayscale
+        self.cap.set(cv.CAP_PROP_CONVERT_RGB, 0 if (grayscale == True) else 1)
+
+    def retrieveGray(self, slot) -> bool:
+        """
+        Decodes the grabbed frame's brightness into a grayscale slot. MJPG frames are decoded straight to grayscale, which skips the color decode and the conversion, and YUYV frames give up their Y plane as a view.
+        @param slot: A (height, width) FrameRing slot
+        @return retrieveSuccessful
+        """
+        # Gets the raw frame
+        sucess, raw = self.cap.retrieve()
+        if ((sucess == False) or (raw is None)):
+            return False
+
+        if ((raw.ndim == 3) and (raw.shape[2] == 2)):
+            # YUYV, where every other byte is the brightness
+            gray = raw[:, :, 0]
+        elif ((raw.ndim == 3) and (raw.shape[2] == 3)):
+            # The backend decoded to color anyway
+            gray = cv.cvtColor(raw, cv.COLOR_BGR2GRAY)
+        elif ((raw.ndim == 2) and (raw.shape[0] > 1)):
+            # The camera sends grayscale, possibly at a smaller resolution than the slot
+            gray = raw
+        else:
+            # A compressed MJPG frame, which arrives as a single row of bytes
+            gray = cv.imdecode(raw, cv.IMREAD_GRAYSCALE)
+            if (gray is None):
+                return False
+
+        # Copies the frame into the slot, fitting it if the camera picked another resolution
+        if (gray.shape != slot.shape):
+            cv.resize(gray, (slot.shape[1], slot.shape[0]), dst = slot, interpolation = cv.INTER_AREA)
+        else:
+            np.copyto(slot, gray)
+
+        return True
+
+    def readInto(self, ring) -> bool:
+        """
+        Reads a frame straight into the next slot of a FrameRing, so a color frame is never copied. Grayscale frames are decoded with retrieveGray(). Frames dropped by setFps() count as read.
+        @param ring: The FrameRing to write into
+        @return readSuccessful
+        """
+        # Waits for the next frame and timestamps it as soon as it arrives
+        if (self.cap.grab() == False):
+            return False
+        timestamp = time.monotonic()
+
+        # Drops frames that arrive before the next one is due. A quarter of an interval of slack keeps camera jitter from dropping frames that are on time
+        slack = self.frameInterval / 4
+        if (timestamp < self.nextFrame - slack):
+            return True
+        self.nextFrame = max(self.nextFrame, timestamp - slack) + self.frameInterval
+
+        # Decodes the frame into the slot
+        slot = ring.acquire()
+        if (self.grayscale == True):
+            if (self.retrieveGray(slot) == False):
+                return False
+        else:
+            sucess, stream = self.cap.retrieve(slot)
+            if (sucess == False):
+                return False
+
+            # Fits the frame into the slot if the camera picked another resolution
+            if (stream is not slot):
+                cv.resize(stream, (slot.shape[1], slot.shape[0]), dst = slot, interpolation = cv.INTER_AREA)
+
+        # Publishes the frame
+        ring.commit(timestamp, time.monotonic())
+
+        return True
+
     def undistort(self, stream, cameraMatrix, distortion, resolution: tuple):
         """
         Undistorts an image using cv.undistort()
@@ -112,9 +257,11 @@ class USBCamera:
 
         return undistortedStream
 
-    def calibrateCamera(self):
+    def calibrateCamera(self, autoCapture: bool = False, source = None):
         """
         Calibrates the camera and returns the calibration parameters
+        @param autoCapture: Take the calibration images without an operator
+        @param source: A VideoCapture or the path to a recorded video to take new calibration images from. Defaults to the stored images, then this capture
         @return calibrationSuccessful
         @return cameraMatrix
         @return cameraDistortion
@@ -122,10 +269,10 @@ class USBCamera:
         @return translationVectors
         """
         # Instance creation
-        self.calibrate = Calibrate(self.cap, self.camNum, 15)
+        self.calibrate = Calibrate(self.cap, self.camNum, 15, autoCapture)
 
         # Return results
-        return self.calibrate.calibrateCamera()
+        return self.calibrate.calibrateCamera(source = source)
 
     def getResolution(self):
         """
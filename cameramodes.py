@@ -0,0 +1,204 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import os
+import sys
+import json
+import ctypes
+from   pathlib import Path
+
+# Import Classes
+from config import loadCameraConfigs
+
+# Import Utilities
+from Utilities.Logger import Logger
+
+# Where the probed modes are stored
+MODES_PATH = str(Path(__file__).absolute().parent / "camera_modes.json")
+
+# Formats in order of preference when two modes run at the same FPS. Compressed MJPG leaves USB bandwidth for the other cameras, while grayscale cameras take YUYV's Y plane without decoding
+COLOR_FORMATS     = ("MJPG", "YUYV")
+GRAYSCALE_FORMATS = ("GREY", "YUYV", "MJPG")
+
+# V4L2 ioctl requests and constants, from linux/videodev2.h
+VIDIOC_QUERYCAP            = 0x80685600
+VIDIOC_ENUM_FMT            = 0xC0405602
+VIDIOC_ENUM_FRAMESIZES     = 0xC02C564A
+VIDIOC_ENUM_FRAMEINTERVALS = 0xC034564B
+BUF_TYPE_VIDEO_CAPTURE     = 1
+FRMSIZE_TYPE_DISCRETE      = 1
+
+# V4L2 structures
+class Capability(ctypes.Structure):
+    _fields_ = [("driver", ctypes.c_char * 16), ("card", ctypes.c_char * 32), ("bus_info", ctypes.c_char * 32), ("version", ctypes.c_uint32), ("capabilities", ctypes.c_uint32), ("device_caps", ctypes.c_uint32), ("reserved", ctypes.c_uint32 * 3)]
+
+class FormatDescription(ctypes.Structure):
+    _fields_ = [("index", ctypes.c_uint32), ("type", ctypes.c_uint32), ("flags", ctypes.c_uint32), ("description", ctypes.c_char * 32), ("pixelformat", ctypes.c_uint32), ("mbus_code", ctypes.c_uint32), ("reserved", ctypes.c_uint32 * 3)]
+
+class FrameSize(ctypes.Structure):
+    # For stepwise sizes, the six values are [min_width, max_width, step_width, min_height, max_height, step_height]
+    _fields_ = [("index", ctypes.c_uint32), ("pixel_format", ctypes.c_uint32), ("type", ctypes.c_uint32), ("values", ctypes.c_uint32 * 6), ("reserved", ctypes.c_uint32 * 2)]
+
+class FrameInterval(ctypes.Structure):
+    # For stepwise intervals, the six values are the [numerator, denominator] of the min, max, and step intervals
+    _fields_ = [("index", ctypes.c_uint32), ("pixel_format", ctypes.c_uint32), ("width", ctypes.c_uint32), ("height", ctypes.c_uint32), ("type", ctypes.c_uint32), ("values", ctypes.c_uint32 * 6), ("reserved", ctypes.c_uint32 * 2)]
+
+def enumerateEntries(fd: int, request: int, struct):
+    """
+    Calls a V4L2 enumeration ioctl with increasing indices until the driver runs out of entries.
+    @param fd: The open device
+    @param request: The ioctl request
+    @param struct: A filled in structure. Its index is set for every call
+    @return entries: Copies of the structure for every entry
+    """
+    # Import Libraries
+    import fcntl
+
+    # Variables
+    entries = []
+
+    while (True):
+        struct.index = len(entries)
+        try:
+            fcntl.ioctl(fd, request, struct)
+        except OSError:
+            return entries
+        entries.append(type(struct).from_buffer_copy(struct))
+
+def getCardName(fd: int) -> str:
+    """
+    Gets the name a camera reports, so a different camera plugged into the same port is probed again.
+    @param fd: The open device
+    @return name
+    """
+    # Import Libraries
+    import fcntl
+
+    capability = Capability()
+    fcntl.ioctl(fd, VIDIOC_QUERYCAP, capability)
+
+    return capability.card.decode(errors = "replace")
+
+def probeModes(path: str) -> list:
+    """
+    Lists every (format, resolution, FPS) a camera supports by asking its V4L2 driver.
+    @param path: The camera's device path
+    @return modes: A list of {"format", "width", "height", "fps"}
+    """
+    # Variables
+    modes = []
+
+    fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    try:
+        for description in enumerateEntries(fd, VIDIOC_ENUM_FMT, FormatDescription(type = BUF_TYPE_VIDEO_CAPTURE)):
+            pixelFormat = description.pixelformat
+            fourcc      = pixelFormat.to_bytes(4, "little").decode(errors = "replace")
+
+            for size in enumerateEntries(fd, VIDIOC_ENUM_FRAMESIZES, FrameSize(pixel_format = pixelFormat)):
+                # Stepwise sizes are listed by their smallest and largest size
+                if (size.type == FRMSIZE_TYPE_DISCRETE):
+                    sizes = [(size.values[0], size.values[1])]
+                else:
+                    sizes = [(size.values[0], size.values[3]), (size.values[1], size.values[4])]
+
+                for width, height in sizes:
+                    for interval in enumerateEntries(fd, VIDIOC_ENUM_FRAMEINTERVALS, FrameInterval(pixel_format = pixelFormat, width = width, height = height)):
+                        # A stepwise interval is listed by its fastest rate. Intervals are in seconds per frame
+                        numerator, denominator = interval.values[0], interval.values[1]
+                        if (numerator > 0):
+                            modes.append({"format": fourcc, "width": width, "height": height, "fps": denominator / numerator})
+    finally:
+        os.close(fd)
+
+    return modes
+
+def loadModes(path: str, modesPath: str = MODES_PATH) -> list:
+    """
+    Gets a camera's modes from the cache, probing the camera the first time it is seen on its port. Only one process may call it at a time, because it rewrites the whole cache.
+    @param path: The camera's device path
+    @param modesPath: The cache file
+    @return modes: A list of {"format", "width", "height", "fps"}. Empty if the camera cannot be probed
+    """
+    # Reads the cache. A damaged cache is probed again
+    cache = {}
+    if (os.path.exists(modesPath) == True):
+        try:
+            with open(modesPath) as file:
+                cache = json.load(file)
+        except ValueError:
+            Logger.logWarning("{} is damaged and will be replaced".format(modesPath))
+
+    try:
+        # Reuses the cached modes if the same camera is still on the port
+        fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+        try:
+            card = getCardName(fd)
+        finally:
+            os.close(fd)
+
+        cached = cache.get(path)
+        if ((cached is not None) and (cached["card"] == card)):
+            return cached["modes"]
+
+        # Probes the camera
+        modes = probeModes(path)
+    except (ImportError, OSError) as error:
+        # The camera is missing or this is not Linux
+        Logger.logWarning("Could not probe {}: {}".format(path, error))
+        return []
+
+    # Stores the modes. The file is replaced in one step, so a crash cannot leave half a cache
+    cache[path] = {"card": card, "modes": modes}
+    with open(modesPath + ".tmp", "w") as file:
+        json.dump(cache, file, indent = 4)
+    os.replace(modesPath + ".tmp", modesPath)
+
+    # Updates log
+    Logger.logInfo("Probed {} modes of {} on {}".format(len(modes), card, path))
+
+    return modes
+
+def selectMode(modes: list, resolution: tuple, grayscale: bool = False):
+    """
+    Picks the mode with the best throughput at a resolution.
+
+    The requested resolution is used if the camera has it, otherwise the largest one that fits inside it. The fastest mode at that resolution wins, and ties go to the preferred format.
+    @param modes: From loadModes()
+    @param resolution: The requested (width, height)
+    @param grayscale: Picks the formats that are cheapest to turn into grayscale
+    @return mode: A {"format", "width", "height", "fps"}, or None if no mode has a known format
+    """
+    # Keeps the formats that can be captured
+    preference = GRAYSCALE_FORMATS if (grayscale == True) else COLOR_FORMATS
+    modes = [mode for mode in modes if (mode["format"] in preference)]
+    if (len(modes) == 0):
+        return None
+
+    # Finds the resolution to use. If nothing fits, the smallest one is used
+    width, height = resolution
+    sizes = {(mode["width"], mode["height"]) for mode in modes}
+    if ((width, height) not in sizes):
+        fitting = [size for size in sizes if ((size[0] <= width) and (size[1] <= height))]
+        width, height = max(fitting, key = lambda size: size[0] * size[1]) if (len(fitting) > 0) else min(sizes, key = lambda size: size[0] * size[1])
+
+    # Picks the fastest mode, then the preferred format
+    candidates = [mode for mode in modes if ((mode["width"] == width) and (mode["height"] == height))]
+
+    return max(candidates, key = lambda mode: (mode["fps"], -preference.index(mode["format"])))
+
+# Probes every configured camera and prints the mode it will use
+if (__name__ == "__main__"):
+    # Probes again instead of trusting the cache
+    if ((len(sys.argv) > 1) and (sys.argv[1] == "--refresh") and (os.path.exists(MODES_PATH) == True)):
+        os.remove(MODES_PATH)
+
+    for camera in loadCameraConfigs():
+        if (camera.path is None):
+            continue
+
+        # Prints the modes
+        modes = loadModes(camera.path)
+        print("{} ({})".format(camera.name, camera.path))
+        for mode in modes:
+            print("  {format} {width}x{height} at {fps:g} FPS".format(**mode))
+        print("  Selected: {}".format(selectMode(modes, camera.resolution, camera.grayscale)))
@@ -1,7 +1,12 @@
 # Created by Alex Pereira
 
 # Import Libraries
-from networktables import *
+import time
+import ntcore
+
+# Import Classes
+from network import NetworkManager
+from results import packTagResults
 
 # Import Utilities
 from Utilities.Logger import Logger
@@ -9,28 +14,64 @@ from Utilities.Logger import Logger
 # Variables
 firstTime = True
 
+# Creates the ClockSync Class
+class ClockSync:
+    def __init__(self) -> None:
+        """
+        Constructor for the ClockSync class. Converts time.monotonic() to the robot's FPGA clock.
+
+        The NetworkTables 4 client keeps its own clock synced with the server's, which runs on the robot's FPGA time. Both local clocks are steady, so the offset between them is measured once.
+        """
+        # Variables
+        self.ntinst      = NetworkManager.getDefault().ntinst
+        self.localOffset = ntcore._now() / 1e6 - time.monotonic()
+
+    def isSynced(self) -> bool:
+        """
+        Checks if the client has synced its clock with the robot.
+        @return isSynced
+        """
+        return (self.ntinst.getServerTimeOffset() is not None)
+
+    def toRobotTime(self, localTime: float) -> float:
+        """
+        Converts a time.monotonic() time to the robot's FPGA time.
+        @param localTime
+        @return robotTime: -1 if the clocks are not synced yet
+        """
+        # The server offset is in microseconds
+        serverOffset = self.ntinst.getServerTimeOffset()
+        if (serverOffset is None):
+            return -1
+
+        return localTime + self.localOffset + serverOffset / 1e6
+
 # Creates the NetworkCommunications Class
 class NetworkCommunications:
     def __init__(self) -> None:
         """
         Constructor for the NetworkCommunications class.
         """
-        # Start a NetworkTables client
-        NetworkTables.startClientTeam(2199)
-
-        # Get a NetworkTables Instance
-        ntinst = NetworkTablesInstance.getDefault()
+        # Shares the process's NetworkTables client
+        network = NetworkManager.getDefault()
+        network.start()
 
         # FMSInfo Table
-        FMSInfo = ntinst.getTable("FMSInfo")
-        self.isRedAlliance = FMSInfo.getEntry("IsRedAlliance")  # Boolean
-
-        # Create a TagInfo Table and its Entries
-        TagInfo = ntinst.getTable("TagInfo")
-        self.targetValid   = TagInfo.getEntry("tv")            # Boolean
-        self.bestResult    = TagInfo.getEntry("BestResult")    # Double[]
-        self.bestResultId  = TagInfo.getEntry("BestResultId")  # Double
-        self.detectionTime = TagInfo.getEntry("DetectionTime") # Double
+        self.isRedAlliance = network.getEntry("FMSInfo", "IsRedAlliance")  # Boolean
+
+        # Calls the alliance listeners whenever the alliance changes instead of polling it every frame
+        self.allianceListeners = []
+        network.addListener(self.isRedAlliance, self.allianceChanged)
+
+        # TagInfo Entries
+        self.targetValid   = network.getEntry("TagInfo", "tv")            # Boolean
+        self.bestResult    = network.getEntry("TagInfo", "BestResult")    # Double[]
+        self.bestResultId  = network.getEntry("TagInfo", "BestResultId")  # Double
+        self.bestTagPose   = network.getEntry("TagInfo", "BestTagPose")   # Double[]
+        self.results       = network.getEntry("TagInfo", "Results")       # Double[]
+        self.detectionTime = network.getEntry("TagInfo", "DetectionTime") # Double
+        self.latency       = network.getEntry("TagInfo", "Latency")       # Double
+        self.latencyStages = network.getEntry("TagInfo", "LatencyStages") # Double[] of [decode, wait, process]
 
         # Updates log
         Logger.logInfo("NetworkCommunications initialized")
@@ -62,6 +103,39 @@ class NetworkCommunications:
     #     x.set(1.0)
     #     y.set(2.0)
 
+    def addAllianceListener(self, listener):
+        """
+        Adds a function that is called with isRed whenever the alliance changes. It is also called right away if the alliance is already known.
+        @param listener
+        """
+        self.allianceListeners.append(listener)
+
+        # Catches the listener up
+        if (self.isRedAlliance.exists()):
+            listener(self.isRedAlliance.getBoolean(False))
+
+    def allianceChanged(self, entry, key, value, isNew):
+        """
+        Passes a new alliance value to the alliance listeners. Runs on the NetworkTables thread.
+        @param entry, key, value, isNew: Provided by NetworkTables
+        """
+        # Updates log
+        Logger.logInfo("Alliance changed. IsRedAlliance: {}".format(value))
+
+        for listener in self.allianceListeners:
+            listener(bool(value))
+
+    def setBestTagPose(self, pose):
+        """
+        Sends the field pose of the best result's tag in the current alliance frame.
+
+        This method will send [xTranslate, yTranslate, zTranslate, roll, pitch, yaw].
+        All translation data is in meters. All rotation data is in radians.
+        @param Pose3d
+        """
+        rotation = pose.rotation()
+        self.bestTagPose.setDoubleArray((pose.X(), pose.Y(), pose.Z(), rotation.X(), rotation.Y(), rotation.Z()))
+
     def setBestResultId(self, id: int):
         """
         Sets the tag id of the best result.
@@ -73,28 +147,24 @@ class NetworkCommunications:
         """
         Sends the best result.
 
-        This method will send [tagId, xTranslate, yTranslate, zTranslate, yaw, pitch, roll].
+        This method will send [tagId, xTranslate, yTranslate, zTranslate, roll, pitch, yaw].
         All translation data is in meters. All rotation data is in radians.
-        @param result
+        @param TagResult
         """
-        # Gets variables from result
-        tagId = result[0]
-        pose  = result[1]
-
         # Sets the tag value
-        self.setBestResultId(tagId)
+        self.setBestResultId(result.id)
 
-        # Extracts the x, y, and z translations relative to the field's WCS
-        x, y, z = pose.X(), pose.Y(), pose.Z()
+        # Packs all the data and sends it
+        self.bestResult.setDoubleArray(packTagResults([result]))
 
-        # Extracts the tag's roll, yaw, and pitch relative to the field's WCS
-        roll, pitch, yaw = pose.rotation().X(), pose.rotation().Y(), pose.rotation().Z()
-
-        # Packs all the data
-        data = (tagId, x, y, z, roll, pitch, yaw)
+    def setResults(self, results):
+        """
+        Sends every result.
 
-        # Sends the data
-        self.bestResult.setDoubleArray(data)
+        This method will send [tagId, xTranslate, yTranslate, zTranslate, roll, pitch, yaw] for each result.
+        @param results: A list of TagResults
+        """
+        self.results.setDoubleArray(packTagResults(results))
 
     def setTargetValid(self, tv: bool):
         """
@@ -109,3 +179,12 @@ class NetworkCommunications:
         @param timeSec
         """
         self.detectionTime.setDouble(timeSec)
+
+    def setLatency(self, latency: float, stages):
+        """
+        Sets the time from capture to publishing of the last results.
+        @param latency: In seconds
+        @param stages: (decode, wait, process) in seconds
+        """
+        self.latency.setDouble(latency)
+        self.latencyStages.setDoubleArray(stages)
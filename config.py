@@ -0,0 +1,254 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import os
+import json
+import time
+import threading
+from   pathlib import Path
+
+# Import Classes
+from network import NetworkManager
+
+# Import Utilities
+from Utilities.Logger import Logger
+
+# Path to the default configuration file
+CONFIG_PATH = str(Path(__file__).absolute().parent / "config.json")
+
+# Camera roles
+ROLE_STREAM   = "stream"    # Driver stream
+ROLE_PIECES   = "pieces"    # Cone and cube tracking
+ROLE_APRILTAG = "apriltag"  # AprilTag detection
+
+# Creates the CameraConfig class
+class CameraConfig:
+    def __init__(self, data: dict) -> None:
+        """
+        Constructor for the CameraConfig class.
+        @param data: One entry of the "cameras" list in the configuration file
+        """
+        # Localizes the configuration
+        self.name       = data["name"]
+        self.camNum     = data["camNum"]
+        self.path       = data.get("path")
+        self.roles      = data.get("roles", [])
+        self.resolution = tuple(data["resolution"])
+        self.enabled    = data.get("enabled", True)
+        self.slots      = data.get("slots", 4)  # Frames held in the camera's FrameRing
+        self.record     = data.get("record", False)  # Records the frames and results of the camera's roles
+        self.logResults = data.get("logResults", False)  # Logs the results of the camera's roles to a binary result log
+        self.grayscale  = data.get("grayscale", False)  # Captures grayscale frames, which only AprilTag detection can use
+
+        # Calibration results, filled in once the camera is calibrated
+        self.cameraMatrix = None
+        self.distortion   = None
+
+        # Checks the roles
+        for role in self.roles:
+            if (role not in (ROLE_STREAM, ROLE_PIECES, ROLE_APRILTAG)):
+                raise ValueError("Unsupported camera role: {}".format(role))
+
+        # The other roles need color
+        if ((self.grayscale == True) and (self.roles != [ROLE_APRILTAG])):
+            raise ValueError("{} captures grayscale, which only supports the {} role".format(self.name, ROLE_APRILTAG))
+
+def loadCameraConfigs(path: str = CONFIG_PATH) -> list:
+    """
+    Loads the cameras listed in a configuration file.
+    @param path: The path to the configuration file
+    @return cameras: A list of CameraConfigs for the enabled cameras
+    """
+    # Reads the configuration
+    with open(path) as file:
+        data = json.load(file)
+
+    # Creates the camera configs
+    cameras = [CameraConfig(camera) for camera in data["cameras"]]
+    cameras = [camera for camera in cameras if (camera.enabled == True)]
+
+    # Updates log
+    Logger.logInfo("Loaded {} cameras from {}".format(len(cameras), path))
+
+    return cameras
+
+# The detection parameters that can be changed while running, with their defaults
+DETECTION_DEFAULTS = {
+    "cube": {
+        "hue":        [120, 155],
+        "saturation": [100, 255.0],
+        "value":      [110, 255.0]
+    },
+    "cone": {
+        "hue":        [15, 65],
+        "saturation": [135, 255.0],
+        "value":      [135, 255.0]
+    },
+    "apriltag": {
+        "quadDecimate":     1.0,
+        "quadSigma":        0.0,
+        "refineEdges":      2,
+        "decodeSharpening": 1.0,
+        "maxError":         5e-6,
+        "maxHamming":       0,
+        "minConfidence":    50,
+        "refineMaxSide":    48
+    },
+    "tracker": {
+        "areaWeight":   1.0,
+        "centerWeight": 0.5,
+        "classWeights": [0.0, 0.0],
+        "minIoU":       0.3,
+        "maxMissed":    5,
+        "switchMargin": 0.2
+    },
+    "motion": {
+        "threshold":  3.0,
+        "maxSkipped": 15
+    }
+}
+
+def mergeDetection(values: dict, base: dict, path: str = "detection") -> dict:
+    """
+    Checks detection values against the schema and fills in everything they leave out from base.
+    @param values: The values to check, possibly partial
+    @param base: The complete values to fill in from
+    @param path: The name of the section being checked, for error messages
+    @return merged: A new, complete dictionary
+    """
+    # Variables
+    merged = {}
+
+    # Catches keys the schema does not know
+    for key in values:
+        if (key not in base):
+            raise ValueError("Unknown config key: {}.{}".format(path, key))
+
+    for key, default in base.items():
+        name = "{}.{}".format(path, key)
+
+        # Uses the base value if nothing was given
+        if (key not in values):
+            merged[key] = default
+            continue
+
+        value = values[key]
+
+        # Checks sections, lists, and numbers
+        if (isinstance(default, dict)):
+            if (isinstance(value, dict) == False):
+                raise ValueError("{} must be a section".format(name))
+            merged[key] = mergeDetection(value, default, name)
+        elif (isinstance(default, list)):
+            if ((isinstance(value, list) == False) or (len(value) != len(default)) or (all(isNumber(item) for item in value) == False)):
+                raise ValueError("{} must be a list of {} numbers".format(name, len(default)))
+            merged[key] = list(value)
+        else:
+            if (isNumber(value) == False):
+                raise ValueError("{} must be a number".format(name))
+            merged[key] = value
+
+    return merged
+
+def isNumber(value) -> bool:
+    """
+    Checks if a value is an int or float, but not a bool.
+    @param value
+    @return isNumber
+    """
+    return isinstance(value, (int, float)) and (isinstance(value, bool) == False)
+
+# Creates the DetectionConfig class
+class DetectionConfig:
+    def __init__(self, path: str = CONFIG_PATH, pollPeriod: float = 1.0) -> None:
+        """
+        Constructor for the DetectionConfig class. Loads the "detection" section of the configuration file and keeps it up to date while running.
+
+        Changes come from edits to the file or from JSON written to JetsonControl/Config. Each change swaps in a new, complete set of values at once, so a frame never sees half of an update.
+        @param path: The path to the configuration file
+        @param pollPeriod: How often the file is checked for changes in seconds
+        """
+        # Localizes parameters
+        self.path       = path
+        self.pollPeriod = pollPeriod
+
+        # Variables
+        self.fileValues = DETECTION_DEFAULTS
+        self.overrides  = {}
+        self.modified   = None
+        self.snapshot   = (0, DETECTION_DEFAULTS)
+        self.lock       = threading.Lock()  # Held while the file values or overrides are replaced, so the file thread and NetworkTables thread cannot publish over each other
+
+        # Loads the file
+        self.reloadFile()
+
+        # Watches the file in the background
+        threading.Thread(target = self.watchFile, name = "DetectionConfig", daemon = True).start()
+
+        # Watches the NetworkTables override
+        network = NetworkManager.getDefault()
+        self.overrideEntry = network.getEntry("JetsonControl", "Config")  # String
+        network.addListener(self.overrideEntry, self.overrideChanged)
+
+    def get(self):
+        """
+        Gets the current values. Compare the version with the last one seen to know when to apply them.
+        @return version, values
+        """
+        return self.snapshot
+
+    def publish(self):
+        """
+        Combines the file values and overrides and swaps them in. Call it with self.lock held.
+        """
+        values = mergeDetection(self.overrides, self.fileValues)
+        self.snapshot = (self.snapshot[0] + 1, values)
+
+        # Updates log
+        Logger.logInfo("Detection config updated to version {}".format(self.snapshot[0]))
+
+    def reloadFile(self):
+        """
+        Reloads the file if it changed. A bad file is logged and the last good values are kept.
+        """
+        try:
+            # Checks if the file changed
+            modified = os.path.getmtime(self.path)
+            if (modified == self.modified):
+                return
+            self.modified = modified
+
+            # Reads the detection section
+            with open(self.path) as file:
+                data = json.load(file)
+            fileValues = mergeDetection(data.get("detection", {}), DETECTION_DEFAULTS)
+
+            with self.lock:
+                self.fileValues = fileValues
+                self.publish()
+        except (OSError, ValueError) as e:
+            Logger.logError("Detection config not loaded: {}".format(e))
+
+    def watchFile(self):
+        """
+        Checks the file for changes. Runs on a background thread.
+        """
+        while (True):
+            time.sleep(self.pollPeriod)
+            self.reloadFile()
+
+    def overrideChanged(self, entry, key, value, isNew):
+        """
+        Applies JSON written to JetsonControl/Config on top of the file. Runs on the NetworkTables thread.
+        @param entry, key, value, isNew: Provided by NetworkTables
+        """
+        try:
+            overrides = json.loads(value) if (value != "") else {}
+
+            # Checks the overrides against the file values they will be merged with
+            with self.lock:
+                mergeDetection(overrides, self.fileValues)
+                self.overrides = overrides
+                self.publish()
+        except (TypeError, ValueError) as e:
+            Logger.logError("Detection config override rejected: {}".format(e))
@@ -1,137 +1,283 @@
 # Created by Alex Pereira
 
 # Import Libraries
-import cv2 as cv
-from   pathlib import Path
-from   networktables import *
-from   frc_apriltags import Detector, USBCamera, Streaming
-from   frc_apriltags.Utilities import Logger
+import time
+
+# Startup is timed from here
+BOOT_TIME = time.monotonic()
+
+import cv2   as cv
+import numpy as np
 
 # Import Classes
-from pipelines import ConeTracking, CubeTracking
+from manager   import CameraManager, addExitCallback
+from network   import NetworkManager
+from results   import PIECE_X, PIECE_Y, PIECE_W, PIECE_H, PIECE_CLASS, PIECE_CUBE, PIECE_CONE, packPieces
+
+# Import Constants
+from config import ROLE_STREAM, ROLE_PIECES, ROLE_APRILTAG
+
+def createDriverStream(camera):
+    """
+    Creates the driver stream role. Runs inside the camera's processing process.
+
+    :param camera: The camera's config.
+    :return: A function that streams a frame.
+    """
+    # Import Classes
+    from stream import Streaming
+
+    # Creates the output stream
+    streaming = Streaming(camNum = camera.camNum, resolution = camera.resolution, capture = False)
+
+    def streamImage(stream, frameInfo):
+        return streaming.streamImage(stream)
+
+    return streamImage
+
+def createPieceTracking(camera):
+    """
+    Creates the piece tracking role. Runs inside the camera's processing process.
+
+    :param camera: The camera's config.
+    :return: A function that tracks pieces in a frame.
+    """
+    # Import Classes
+    from config         import DetectionConfig
+    from communications import ClockSync
+    from motion         import MotionGate
+    from pipelines      import ConeTracking, CubeTracking
+    from tracking       import PieceTracker, getCenters
+
+    # Instance creation
+    cone    = ConeTracking()
+    cube    = CubeTracking()
+    tracker = PieceTracker()
+    gate    = MotionGate()
+    config  = DetectionConfig()
+    clock   = ClockSync()
+
+    # Records the frames and logs the results if the camera asks for it
+    recorder  = createRecorder(camera, ROLE_PIECES)
+    resultLog = createResultLog(camera, ROLE_PIECES)
+
+    # The last applied config version, and the last processed (cubes, cones, pieces, ids, target), reused while nothing moves
+    configVersion = -1
+    lastResult    = None
+
+    # Get the NetworkManager
+    network = NetworkManager.getDefault()
+
+    # PieceData Table
+    width       = network.getEntry("PieceData", "Width")       # Double
+    centerX     = network.getEntry("PieceData", "CenterX")     # Double
+    numCones    = network.getEntry("PieceData", "NumCones")    # Double
+    numCubes    = network.getEntry("PieceData", "NumCubes")    # Double
+    pieceArray  = network.getEntry("PieceData", "Pieces")      # Double[] of [x, y, width, height, area, class] per piece. Area is in square stream pixels
+    pieceIds    = network.getEntry("PieceData", "PieceIds")    # Double[] with the stable id of each piece
+    targetId    = network.getEntry("PieceData", "TargetId")    # Double, -1 if there is no target
+    captureTime = network.getEntry("PieceData", "CaptureTime") # Double, robot time the frame was captured. -1 if the clocks are not synced
+    latency     = network.getEntry("PieceData", "Latency")     # Double, seconds from capture to publishing
+
+    def applyPieceConfig():
+        """
+        Applies the latest DetectionConfig values to the piece tracking if they changed.
+        """
+        nonlocal configVersion
+
+        # Checks for a new version
+        version, values = config.get()
+        if (version == configVersion):
+            return
+        configVersion = version
+
+        # Updates the HSV ranges
+        for pipeline, settings in ((cube, values["cube"]), (cone, values["cone"])):
+            pipeline.hsv_threshold_hue        = settings["hue"]
+            pipeline.hsv_threshold_saturation = settings["saturation"]
+            pipeline.hsv_threshold_value      = settings["value"]
+
+        # Updates the tracker
+        settings = values["tracker"]
+        tracker.areaWeight   = settings["areaWeight"]
+        tracker.centerWeight = settings["centerWeight"]
+        tracker.classWeights = np.asarray(settings["classWeights"], np.float64)
+        tracker.minIoU       = settings["minIoU"]
+        tracker.maxMissed    = settings["maxMissed"]
+        tracker.switchMargin = settings["switchMargin"]
+
+        # Updates the motion gate
+        gate.threshold  = values["motion"]["threshold"]
+        gate.maxSkipped = values["motion"]["maxSkipped"]
 
-# Import Methods
-from frc_apriltags import startNetworkComms
+    def processStream(stream, frameInfo = None):
+        """
+        Runs OpenCV processing on a stream.
 
-# Starts the network communications
-startNetworkComms(2199)
+        :param stream: The stream to process.
+        :param frameInfo: The stream's FrameInfo, used to send the latency.
+        :return: The processed stream.
+        """
+        nonlocal lastResult
 
-# Gets the directory path
-dirPath = Path(__file__).absolute().parent.__str__()
-Logger.setLogPath(dirPath)
+        # Picks up config changes between frames
+        applyPieceConfig()
 
-# Instance creation
+        # Only runs the pipelines if the scene changed
+        if (gate.shouldProcess(stream)):
+            # Finds the pieces
+            cubes  = cube.findCubes(stream)
+            cones  = cone.findCones(stream)
+            pieces = np.concatenate((cubes, cones))
 
-cone     = ConeTracking()
-cube     = CubeTracking()
-detector = Detector()
+            # Tracks the pieces and picks the one to follow
+            ids    = tracker.update(pieces)
+            target = tracker.selectTarget(pieces, ids, stream.shape[1])
 
-# Defines the camera resolutions (width x height)
+            # Stores the results for the frames that get skipped
+            lastResult = (cubes, cones, pieces, ids, target)
+        else:
+            # Reuses the last results
+            cubes, cones, pieces, ids, target = lastResult
 
-driverRes = (320, 240)
-tagCamRes = (1280, 720)
+        # Records the frame before anything is drawn on it
+        if ((recorder is not None) and (frameInfo is not None)):
+            recorder.record(stream, frameInfo, pieces = pieces)
 
-# Creates a USBCamera and calibrates it
-#camera0   = USBCamera(camNum = 0, path = "/dev/v4l/by-path/platform-70090000.xusb-usb-0:2.4:1.0-video-index0", resolution = tagCamRes, calibrate = True, dirPath = dirPath)
-#camMatrix = camera0.getMatrix()
+        # Calculates the center position of the target
+        if (target != -1):
+            sentX = int(getCenters(pieces)[target, 0] - (stream.shape[1] / 2))
+        else:
+            sentX = 0
 
-# Creates cameras for the drivers
-camera2 = Streaming(camNum = 2, path = "/dev/v4l/by-path/platform-70090000.xusb-usb-0:2.1:1.0-video-index0", resolution = driverRes)
-camera1 = Streaming(camNum = 1, path = "/dev/v4l/by-path/platform-70090000.xusb-usb-0:2.2:1.0-video-index0", resolution = driverRes)
+        # Draws the boxes on a copy of the stream so the shared frame stays clean for other readers
+        if (len(pieces) != 0):
+            stream = stream.copy()
+            for piece in pieces:
+                x, y, w, h = int(piece[PIECE_X]), int(piece[PIECE_Y]), int(piece[PIECE_W]), int(piece[PIECE_H])
+                if (piece[PIECE_CLASS] == PIECE_CUBE):
+                    stream = cv.rectangle(stream, (x, y), (x + w, y + h), (255, 0, 0), 2)
+                elif (piece[PIECE_CLASS] == PIECE_CONE):
+                    stream = cv.rectangle(stream, (x, y), (x + w, y + h), (0, 255, 255), 2)
 
-# Prealocate space for streams
-#cam0Stream = camera0.prealocateSpace()
-cam2Stream = camera2.prealocateSpace()
+        # Sends all relevant data
+        width     .setDouble(stream.shape[1])
+        centerX   .setDouble(sentX)
+        numCubes  .setDouble(len(cubes))
+        numCones  .setDouble(len(cones))
+        pieceArray.setDoubleArray(packPieces(pieces))
+        pieceIds  .setDoubleArray(ids.astype(np.float64))
+        targetId  .setDouble(tracker.targetId)
 
-# Get a NetworkTables Instance
-ntinst = NetworkTablesInstance.getDefault()
+        # Sends how old the results are and logs them
+        if (frameInfo is not None):
+            publishTime = time.monotonic()
+            captureTime.setDouble(clock.toRobotTime(frameInfo.captureTime))
+            latency    .setDouble(frameInfo.getLatency(publishTime))
 
-# PieceData Table
-pieceData = ntinst.getTable("PieceData")
-width     = pieceData.getEntry("Width")    # Double
-centerX   = pieceData.getEntry("CenterX")  # Double
-numCones  = pieceData.getEntry("NumCones") # Double
-numCubes  = pieceData.getEntry("NumCubes") # Double
+            if (resultLog is not None):
+                resultLog.append(frameInfo, publishTime, pieces = pieces, target = target)
 
-def processStream(stream):
+        return stream
+
+    # Applies the configured values
+    applyPieceConfig()
+
+    return processStream
+
+def createAprilTagDetection(camera):
     """
-    Runs OpenCV processing on a stream.
+    Creates the AprilTag detection role. Runs inside the camera's processing process.
 
-    :param stream: The stream to process.
-    :return: The processed stream.
+    :param camera: The camera's config. Its camera matrix and distortion must be set before the first frame.
+    :return: A function that detects tags in a frame.
     """
-    # Variables
-    sentX, maxArea = 0, 0
-    xVals, areas, boxList, pieces = [], [], [], []
-    cubeBoxes, cubeAreas = cube.findCubes(stream)
-    coneBoxes, coneAreas = cone.findCones(stream)
-
-    # Adds the x vaules and boxes to their respective arrays
-    if (len(cubeBoxes) != 0 and len(cubeAreas)):
-        for box, area in zip(cubeBoxes, cubeAreas):
-            xVals  .append(box[0] + box[2]/2)
-            areas  .append(area)
-            pieces .append(0)
-            boxList.append(box)
-    if (len(coneBoxes) != 0 and len(coneAreas)):
-        for box, area in zip(coneBoxes, coneAreas):
-            xVals  .append(box[0] + box[2]/2)
-            areas  .append(area)
-            pieces .append(1)
-            boxList.append(box)
-
-    # Calculates the center position
-    if (len(xVals) != 0 and len(areas) != 0):
-        for x, area in zip(xVals, areas):
-            tempX = x - (stream.shape[1] / 2)
-            if (area >= maxArea):
-                sentX = int(tempX)
-    else:
-        sentX = 0
-
-    # Draws the boxes on the stream
-    if (len(boxList) != 0 and len(pieces) != 0):
-        for box, piece in zip(boxList, pieces):
-            x, y, w, h = box[0], box[1], box[2], box[3]
-            if (piece == 0):
-                stream = cv.rectangle(stream, (x, y), (x + w, y + h), (255, 0, 0), 2)
-            elif (piece == 1):
-                stream = cv.rectangle(stream, (x, y), (x + w, y + h), (0, 255, 255), 2)
-
-    # Sends all relevant data
-    width   .setDouble(stream.shape[1])
-    centerX .setDouble(sentX)
-    numCubes.setDouble(len(cubeBoxes))
-    numCones.setDouble(len(coneBoxes))
-    stream = camera2.streamImage(stream)
-
-    return stream
+    # The detector and its imports are only loaded once the role first runs
+    detector = None
+    recorder  = createRecorder(camera, ROLE_APRILTAG)
+    resultLog = createResultLog(camera, ROLE_APRILTAG)
 
-def main():
+    def detectTags(stream, frameInfo):
+        nonlocal detector
+
+        # Creates the detector
+        if (detector is None):
+            from apriltags import Detector
+            detector = Detector()
+
+        results, stream = detector.detectTags(stream, camera.cameraMatrix, frameInfo = frameInfo, distortion = camera.distortion)
+
+        # Records the frame and logs the tags
+        if (recorder is not None):
+            recorder.record(stream, frameInfo, tags = results)
+        if (resultLog is not None):
+            resultLog.append(frameInfo, time.monotonic(), tags = results)
+
+        return stream
+
+    return detectTags
+
+def createRecorder(camera, role: str):
     """
-    The main method for the coproceessor.
+    Creates a recorder for a role if the camera's config turns recording on.
+
+    :param camera: The camera's config.
+    :param role: The role being recorded.
+    :return: A Recorder, or None if the camera is not recorded.
     """
-    while (True):
-        # Gets the tag camera's undistorted stream
-        #cam0Stream = camera0.getUndistortedStream()
+    if (camera.record == False):
+        return None
 
-        # Runs April Tag detection on the undistorted stream
-        #detector.detectTags(cam0Stream, camMatrix)
+    # Import Classes
+    from recorder import Recorder
 
-        # Gets camera2's stream
-        cam2Stream = camera2.getStream()
+    # Writes the queued frames when the processing process exits
+    recorder = Recorder(camera.name + "-" + role)
+    addExitCallback(recorder.close)
 
-        # Processes camera2's stream
-        processStream(cam2Stream)
+    return recorder
+
+def createResultLog(camera, role: str):
+    """
+    Creates a result log for a role if the camera's config turns it on.
+
+    :param camera: The camera's config.
+    :param role: The role being logged.
+    :return: A ResultLog, or None if the camera is not logged.
+    """
+    if (camera.logResults == False):
+        return None
+
+    # Import Classes
+    from resultlog import ResultLog
+
+    # Trims the log when the processing process exits
+    resultLog = ResultLog(camera.name + "-" + role)
+    addExitCallback(resultLog.close)
+
+    return resultLog
+
+def main():
+    """
+    The main method for the coproceessor.
+    """
+    # Starts a capture and a processing process for every camera in config.json
+    manager = CameraManager({
+        ROLE_STREAM:   createDriverStream,
+        ROLE_PIECES:   createPieceTracking,
+        ROLE_APRILTAG: createAprilTagDetection
+    }, startTime = BOOT_TIME)
+    manager.start()
 
-        # Press q to end the program
-        #if ( camera0.getEnd() == True ):
-        #    break
-        cv.waitKey(1)
+    # Runs until stopped, restarting cameras that fail
+    try:
+        manager.supervise()
+    finally:
+        manager.stop()
 
     # Exits the main function
     return
 
 # Runs the main method
 if (__name__ == "__main__"):
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,380 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import time
+import queue
+import multiprocessing as mp
+
+# Import Classes
+from camera      import USBCamera
+from cameramodes import loadModes, selectMode
+from config      import CONFIG_PATH, ROLE_APRILTAG, loadCameraConfigs
+from network     import NetworkManager
+from scheduler   import Scheduler
+from startup     import StartupTimer
+from transport   import FrameRing
+
+# Import Utilities
+from Utilities.Logger import Logger
+
+# The number of failed reads in a row before a camera is reopened
+MAX_FAILED_READS = 3
+
+# The range of the wait between attempts to reopen a camera, in seconds
+MIN_BACKOFF = 0.25
+MAX_BACKOFF = 4.0
+
+# A camera is reported disconnected after this many seconds without a frame
+STALL_TIMEOUT = 2.0
+
+# A capture process that has not finished a read or reopen attempt in this many seconds is stuck in the driver and gets restarted
+HANG_TIMEOUT = 10.0
+
+# Seconds stop() waits for a process to finish before terminating it
+STOP_TIMEOUT = 5.0
+
+# Cleanup for the files the handlers of this process opened. See addExitCallback()
+exitCallbacks = []
+
+def addExitCallback(callback):
+    """
+    Runs a callback when this process's processing worker exits. Worker processes skip atexit, so handlers register their cleanup here instead.
+    @param callback: Takes no arguments
+    """
+    exitCallbacks.append(callback)
+
+def runExitCallbacks():
+    """
+    Runs the exit callbacks in reverse order. A callback that raises is logged and the rest still run.
+    """
+    while (len(exitCallbacks) > 0):
+        callback = exitCallbacks.pop()
+        try:
+            callback()
+        except Exception as e:
+            Logger.logError("Exit callback {} failed: {}".format(callback, e))
+
+def captureWorker(camera, mode, ring: FrameRing, calibration, fps, heartbeat, stopEvent, calibrated):
+    """
+    Reads a camera and writes every frame into shared memory. Runs in its own process.
+    @param camera: The CameraConfig to capture
+    @param mode: The {"format", "width", "height", "fps"} to capture in, from selectMode(). None keeps the driver's default format
+    @param ring: The FrameRing to write into
+    @param calibration: A queue that receives (cameraMatrix, distortion) for AprilTag cameras
+    @param fps: A shared value with the FPS the scheduler wants. 0 runs as fast as the camera can
+    @param heartbeat: A shared value set to time.monotonic() after every read, so the supervisor can tell if the process is stuck
+    @param stopEvent: Stops the worker when set
+    @param calibrated: A shared value set once the calibration was sent, so a restarted worker does not calibrate again
+    """
+    # Opens the camera
+    usbCamera = USBCamera(camera.camNum, camera.path)
+    usbCamera.resize(camera.resolution, mode = mode)
+    currentFps = 0
+
+    # Calibrates cameras that need their intrinsics. Without a calibration the camera still captures for its other roles
+    if ((calibrated.value == False) and (ROLE_APRILTAG in camera.roles)):
+        _, cameraMatrix, distortion, _, _ = usbCamera.calibrateCamera(autoCapture = True)
+        if (cameraMatrix is not None):
+            calibration.put((cameraMatrix, distortion))
+            calibrated.value = True
+        else:
+            Logger.logWarning("{} has no calibration. AprilTag detection is off".format(camera.name))
+
+    # Switches to grayscale frames once calibration is done with the color ones
+    if (camera.grayscale == True):
+        usbCamera.setGrayscale(True)
+
+    # Variables
+    failedReads = 0
+
+    while (stopEvent.is_set() == False):
+        heartbeat.value = time.monotonic()
+
+        # Changes the kept FPS when the schedule changes. The camera keeps streaming in its mode
+        if (fps.value != currentFps):
+            currentFps = fps.value
+            usbCamera.setFps(currentFps)
+
+        # Reads the capture straight into the ring
+        if (usbCamera.readInto(ring) == True):
+            failedReads = 0
+            continue
+
+        # Reopens the camera once it stops sending frames
+        failedReads += 1
+        if (failedReads >= MAX_FAILED_READS):
+            reconnect(usbCamera, camera, heartbeat, stopEvent)
+            failedReads = 0
+
+def reconnect(usbCamera: USBCamera, camera, heartbeat, stopEvent):
+    """
+    Reopens a camera on its by-path device, waiting longer after every failed attempt.
+    @param usbCamera: The USBCamera to reopen
+    @param camera: The CameraConfig of the camera
+    @param heartbeat: Set after every attempt
+    @param stopEvent: Gives up when set
+    """
+    # Variables
+    start   = time.monotonic()
+    backoff = MIN_BACKOFF
+
+    # Updates log
+    Logger.logWarning("{} stopped sending frames. Reopening {}".format(camera.name, camera.path))
+
+    while (stopEvent.is_set() == False):
+        # Tries to reopen the camera
+        if (usbCamera.reopen(camera.resolution) == True):
+            Logger.logInfo("{} reopened after {:.2f}s".format(camera.name, time.monotonic() - start))
+            return
+        heartbeat.value = time.monotonic()
+
+        # Waits longer after every failure
+        stopEvent.wait(backoff)
+        backoff = min(backoff * 2, MAX_BACKOFF)
+
+def processingWorker(camera, ring: FrameRing, calibration, handlers: dict, fps, stopEvent, startTime: float = None):
+    """
+    Runs the camera's scheduled roles on the newest frame. Runs in its own process.
+    @param camera: The CameraConfig to process
+    @param ring: The FrameRing to read from
+    @param calibration: A queue that receives (cameraMatrix, distortion) for AprilTag cameras
+    @param handlers: {role: factory}, where factory(camera) returns a function handle(stream, info) that processes and returns a stream
+    @param fps: A shared value to pass the scheduled FPS to the capture worker
+    @param stopEvent: Stops the worker when set
+    @param startTime: The time.monotonic() the program started, for the startup report
+    """
+    # Times the startup
+    timer = StartupTimer(camera.name, startTime)
+
+    # Starts the process's only NetworkTables client. It connects in the background while the camera opens in the capture process
+    network = NetworkManager.getDefault()
+    network.start()
+
+    # CameraStatus Table
+    cameraStatus  = "CameraStatus/" + camera.name
+    connected     = network.getEntry(cameraStatus, "Connected")     # Boolean
+    recoveryTime  = network.getEntry(cameraStatus, "RecoveryTime")  # Double, seconds the last outage lasted
+    outages       = network.getEntry(cameraStatus, "Outages")       # Double
+    startupTime   = network.getEntry(cameraStatus, "StartupTime")   # Double, seconds from boot to the first processed frame
+    startupStages = network.getEntry(cameraStatus, "StartupStages") # Double[] of [networktables, handlers, first frame, processing]
+    timer.mark("networktables")
+
+    try:
+        # Creates every handler up front so a schedule change takes effect on the next frame. Handlers put off their heavy setup until they first run
+        pipeline  = [(role, handlers[role](camera)) for role in camera.roles]
+        scheduler = Scheduler(camera.roles)
+        timer.mark("handlers")
+
+        # Variables
+        started      = False
+        sequence     = 0
+        lastCapture  = None
+        numOutages   = 0
+        disconnected = False
+
+        while (stopEvent.is_set() == False):
+            # Waits for a new frame. The stream is a view of the shared memory
+            sequence, info, stream = ring.latest(sequence, timeout = STALL_TIMEOUT)
+            if (stream is None):
+                # Reports the camera as disconnected once it has sent its first frame
+                if ((lastCapture is not None) and (disconnected == False)):
+                    disconnected = True
+                    numOutages  += 1
+                    connected.setBoolean(False)
+                    outages  .setDouble(numOutages)
+                    Logger.logWarning("{} has not sent a frame in {:.1f}s".format(camera.name, STALL_TIMEOUT))
+                continue
+
+            # Picks up the calibration once the capture has it. AprilTag detection waits for it while the other roles run
+            if ((ROLE_APRILTAG in camera.roles) and (camera.cameraMatrix is None)):
+                try:
+                    camera.cameraMatrix, camera.distortion = calibration.get_nowait()
+
+                    # Leaves the calibration in the queue for a restarted processing process
+                    calibration.put((camera.cameraMatrix, camera.distortion))
+                except queue.Empty:
+                    pass
+
+            # Reports how long the camera was gone
+            if (disconnected == True):
+                disconnected = False
+                connected   .setBoolean(True)
+                recoveryTime.setDouble(info.captureTime - lastCapture)
+                Logger.logInfo("{} recovered after {:.2f}s".format(camera.name, info.captureTime - lastCapture))
+            elif (lastCapture is None):
+                connected.setBoolean(True)
+            lastCapture = info.captureTime
+
+            # Runs the scheduled roles in order. Skipping the stream role skips its encode
+            if (started == False):
+                timer.mark("first frame")
+            for role, handle in pipeline:
+                if (scheduler.isActive(role) and ((role != ROLE_APRILTAG) or (camera.cameraMatrix is not None))):
+                    stream = handle(stream, info)
+
+            # Reports the startup time after the first frame
+            if (started == False):
+                started = True
+                timer.mark("processing")
+                timer.report()
+                startupTime  .setDouble(timer.getElapsed())
+                startupStages.setDoubleArray(timer.getDurations())
+
+            # Passes the scheduled FPS to the capture
+            fps.value = scheduler.fps
+
+            # Warns if the capture lapped the processing
+            if (ring.isValid(sequence) == False):
+                Logger.logWarning("{} frame {} was overwritten while processing".format(camera.name, sequence))
+    finally:
+        # Closes what the handlers opened, also when one of them raised
+        runExitCallbacks()
+
+# Creates the CameraManager class
+class CameraManager:
+    def __init__(self, handlers: dict, configPath: str = CONFIG_PATH, startTime: float = None) -> None:
+        """
+        Constructor for the CameraManager class.
+        @param handlers: {role: factory}, where factory(camera) returns a function handle(stream, info) that processes and returns a stream
+        @param configPath: The path to the camera configuration file
+        @param startTime: The time.monotonic() the program started, for the startup report. Defaults to now
+        """
+        # Localizes parameters
+        self.handlers  = handlers
+        self.cameras   = loadCameraConfigs(configPath)
+        self.startTime = startTime if (startTime is not None) else time.monotonic()
+
+        # Variables
+        self.rings          = {}
+        self.processes      = []
+        self.captures       = {}
+        self.processings    = {}
+        self.heartbeats     = {}
+        self.captureArgs    = {}
+        self.processingArgs = {}
+        self.stopEvent      = mp.Event()
+
+        # Updates log
+        Logger.logInfo("CameraManager initialized")
+
+    def start(self):
+        """
+        Starts a capture process and a processing process for every camera.
+        """
+        for camera in self.cameras:
+            # Picks the camera's best mode. The modes are probed here, so only this process writes the mode cache
+            modes = loadModes(camera.path) if (camera.path is not None) else []
+            mode  = selectMode(modes, camera.resolution, camera.grayscale)
+
+            # Creates the frame ring and calibration queue. Grayscale cameras store one channel
+            width, height = camera.resolution
+            ring        = FrameRing((height, width) if (camera.grayscale == True) else (height, width, 3), camera.slots)
+            calibration = mp.Queue(1)
+            fps         = mp.Value("i", 0, lock = False)
+            heartbeat   = mp.Value("d", 0.0, lock = False)
+            calibrated  = mp.Value("b", False, lock = False)
+            self.rings[camera.name]          = ring
+            self.heartbeats[camera.name]     = heartbeat
+            self.captureArgs[camera.name]    = (camera, mode, ring, calibration, fps, heartbeat, self.stopEvent, calibrated)
+            self.processingArgs[camera.name] = (camera, ring, calibration, self.handlers, fps, self.stopEvent, self.startTime)
+
+            # Creates the processes
+            self.captures[camera.name]    = self.createCapture(camera)
+            self.processings[camera.name] = self.createProcessing(camera)
+            self.processes.append(self.captures[camera.name])
+            self.processes.append(self.processings[camera.name])
+
+        # Starts the processes
+        for process in self.processes:
+            process.start()
+
+        # Updates log
+        Logger.logInfo("Started {} camera processes".format(len(self.processes)))
+
+    def createCapture(self, camera):
+        """
+        Creates a camera's capture process. It is not a daemon, because calibration extracts corners in a process pool and daemons cannot have children. stop() ends it through the stop event.
+        @param camera: The CameraConfig to capture
+        @return process
+        """
+        return mp.Process(target = captureWorker, name = camera.name + "-capture", args = self.captureArgs[camera.name])
+
+    def createProcessing(self, camera):
+        """
+        Creates a camera's processing process.
+        @param camera: The CameraConfig to process
+        @return process
+        """
+        return mp.Process(target = processingWorker, name = camera.name + "-processing", args = self.processingArgs[camera.name], daemon = True)
+
+    def join(self, timeout: float = None):
+        """
+        Waits for every process to finish.
+        @param timeout: The seconds to wait for each process. None waits forever
+        """
+        for process in self.processes:
+            process.join(timeout)
+
+    def supervise(self, period: float = 0.5):
+        """
+        Restarts capture processes that crashed or are stuck in the camera driver, and processing processes that crashed, until stopped. Each camera has its own processes, so the others keep running at full rate.
+        @param period: The seconds between checks
+        """
+        while (self.stopEvent.wait(period) == False):
+            for camera in self.cameras:
+                # Checks the capture. Heartbeats start once calibration is done
+                process   = self.captures[camera.name]
+                heartbeat = self.heartbeats[camera.name].value
+                crashed   = (process.exitcode is not None)
+                hung      = (heartbeat > 0) and (time.monotonic() - heartbeat > HANG_TIMEOUT)
+                if ((crashed == True) or (hung == True)):
+                    # Replaces the process. It only calibrates if the calibration was never sent
+                    Logger.logWarning("Restarting {}. Crashed: {}, Hung: {}".format(process.name, crashed, hung))
+                    self.heartbeats[camera.name].value = time.monotonic()
+                    self.captures[camera.name] = self.restart(process, self.createCapture(camera))
+
+                # Checks the processing. A handler that raises ends the process
+                process = self.processings[camera.name]
+                if (process.exitcode is not None):
+                    # Replaces the process. It picks the calibration up from the queue again
+                    Logger.logWarning("Restarting {}. Exit code: {}".format(process.name, process.exitcode))
+                    self.processings[camera.name] = self.restart(process, self.createProcessing(camera))
+
+    def restart(self, process, newProcess):
+        """
+        Replaces a process with a new one.
+        @param process: The crashed or stuck process
+        @param newProcess: The process to start in its place
+        @return newProcess
+        """
+        # Stops the old process
+        process.terminate()
+        process.join(1.0)
+
+        # Starts the new process
+        newProcess.start()
+
+        # Tracks the new process
+        self.processes[self.processes.index(process)] = newProcess
+
+        return newProcess
+
+    def stop(self):
+        """
+        Stops every process and frees the frame rings.
+        """
+        # Stops the processes. Ones stuck in calibration or the camera driver are terminated
+        self.stopEvent.set()
+        self.join(STOP_TIMEOUT)
+        for process in self.processes:
+            if (process.exitcode is None):
+                Logger.logWarning("{} did not stop. Terminating it".format(process.name))
+                process.terminate()
+                process.join()
+
+        # Frees the shared memory
+        for ring in self.rings.values():
+            ring.close(unlink = True)
+
+        # Updates log
+        Logger.logInfo("CameraManager stopped")
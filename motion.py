@@ -0,0 +1,55 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import cv2   as cv
+import numpy as np
+
+# Creates the MotionGate class
+class MotionGate:
+    def __init__(self, threshold: float = 3.0, maxSkipped: int = 15, size: tuple = (40, 30)) -> None:
+        """
+        Constructor for the MotionGate class. Decides if a frame changed enough from the last processed frame to be worth processing again.
+        @param threshold: Mean absolute difference in gray levels that counts as motion
+        @param maxSkipped: Frames that can be skipped in a row before processing is forced
+        @param size: The (width, height) thumbnail frames are compared at
+        """
+        # Localizes parameters
+        self.threshold  = threshold
+        self.maxSkipped = maxSkipped
+        self.size       = size
+
+        # Variables
+        self.lastThumbnail = None
+        self.numSkipped    = 0
+
+    def getThumbnail(self, stream):
+        """
+        Shrinks a frame to a small grayscale thumbnail.
+        @param stream
+        @return thumbnail
+        """
+        if (len(stream.shape) == 3):
+            stream = cv.cvtColor(cv.resize(stream, self.size, interpolation = cv.INTER_AREA), cv.COLOR_BGR2GRAY)
+        else:
+            stream = cv.resize(stream, self.size, interpolation = cv.INTER_AREA)
+
+        return stream
+
+    def shouldProcess(self, stream) -> bool:
+        """
+        Checks if a frame should be processed. Frames are compared with the last processed frame, so slow changes still add up.
+        @param stream
+        @return shouldProcess
+        """
+        # Compares the thumbnails
+        thumbnail = self.getThumbnail(stream)
+        if ((self.lastThumbnail is not None) and (self.numSkipped < self.maxSkipped)):
+            if (cv.norm(thumbnail, self.lastThumbnail, cv.NORM_L1) / thumbnail.size < self.threshold):
+                self.numSkipped += 1
+                return False
+
+        # Stores the frame as the last processed one
+        self.lastThumbnail = thumbnail
+        self.numSkipped    = 0
+
+        return True
@@ -0,0 +1,148 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import time
+import atexit
+import ntcore
+import threading
+import multiprocessing as mp
+
+# Import Utilities
+from Utilities.Logger import Logger
+
+# The team number used to find the robot
+TEAM_NUMBER = 2199
+
+# Listener flags for entries that should also report their current value
+LISTEN_IMMEDIATE = ntcore.EventFlags.kImmediate | ntcore.EventFlags.kValueRemote
+LISTEN_CHANGES   = ntcore.EventFlags.kValueRemote
+
+# Creates the NetworkManager class
+class NetworkManager:
+    # The manager of this process
+    default = None
+
+    @staticmethod
+    def getDefault():
+        """
+        Gets the process's NetworkManager, creating it the first time.
+        @return NetworkManager
+        """
+        if (NetworkManager.default is None):
+            NetworkManager.default = NetworkManager()
+
+        return NetworkManager.default
+
+    def __init__(self) -> None:
+        """
+        Constructor for the NetworkManager class. Owns the process's only NetworkTables client and hands out cached entries, so every publisher shares one connection. CameraServer publishes through the same ntcore instance.
+
+        Use NetworkManager.getDefault() instead of creating one.
+        """
+        # Variables
+        self.ntinst         = ntcore.NetworkTableInstance.getDefault()
+        self.entries        = {}
+        self.listeners      = []
+        self.lock           = threading.Lock()
+        self.started        = False
+        self.connected      = False
+        self.hasConnected   = False
+        self.startTime      = None
+        self.disconnectTime = None
+        self.reconnects     = 0
+
+        # Connection telemetry
+        self.connectLatency   = self.getEntry("JetsonStatus", "ConnectLatency")   # Double, seconds from start to the first connection
+        self.reconnectLatency = self.getEntry("JetsonStatus", "ReconnectLatency") # Double, seconds the last disconnect lasted
+        self.reconnectCount   = self.getEntry("JetsonStatus", "Reconnects")       # Double
+
+        # ntcore aborts the interpreter if a Python listener is still registered when it exits
+        atexit.register(self.removeListeners)
+
+    def start(self):
+        """
+        Starts the client. Only the first call does anything, so every module, including the stream, can call it.
+        """
+        with self.lock:
+            if (self.started == True):
+                return
+            self.started   = True
+            self.startTime = time.monotonic()
+
+        # Starts the client and follows the connection. The process name tells the clients apart on the robot
+        self.ntinst.setServerTeam(TEAM_NUMBER)
+        self.ntinst.startClient4("Jetson " + mp.current_process().name)
+        self.listeners.append(self.ntinst.addConnectionListener(True, self.connectionChanged))
+
+        # Updates log
+        Logger.logInfo("NetworkTables client started")
+
+    def getEntry(self, table: str, key: str):
+        """
+        Gets an entry, reusing the handle if it was asked for before.
+        @param table: The table path, such as "CameraStatus/Camera0"
+        @param key
+        @return NetworkTableEntry
+        """
+        path = "/" + table + "/" + key
+
+        entry = self.entries.get(path)
+        if (entry is None):
+            entry = self.entries[path] = self.ntinst.getEntry(path)
+
+        return entry
+
+    def addListener(self, entry, listener, immediate: bool = True):
+        """
+        Calls a listener with (entry, key, value, isNew) on the NetworkTables thread whenever an entry changes.
+        @param entry
+        @param listener
+        @param immediate: Also calls the listener right away if the entry has a value
+        """
+        # Unpacks the ntcore event into the arguments the listeners take
+        def valueChanged(event):
+            listener(entry, entry.getName(), event.data.value.value(), event.is_(ntcore.EventFlags.kImmediate))
+
+        self.listeners.append(self.ntinst.addListener(entry, LISTEN_IMMEDIATE if (immediate == True) else LISTEN_CHANGES, valueChanged))
+
+    def removeListeners(self):
+        """
+        Removes every listener. Runs when the process exits.
+        """
+        for listener in self.listeners:
+            self.ntinst.removeListener(listener)
+        self.listeners.clear()
+
+    def isConnected(self) -> bool:
+        """
+        Checks if the client is connected to the robot.
+        @return isConnected
+        """
+        return self.connected
+
+    def connectionChanged(self, event):
+        """
+        Tracks the connection and reports how long connecting took. Runs on the NetworkTables thread.
+        @param event: Provided by NetworkTables
+        """
+        # Variables
+        now       = time.monotonic()
+        connected = event.is_(ntcore.EventFlags.kConnected)
+        self.connected = connected
+
+        if (connected == False):
+            # Starts timing the outage
+            if (self.hasConnected == True):
+                self.disconnectTime = now
+                Logger.logWarning("NetworkTables disconnected")
+        elif (self.hasConnected == False):
+            # First connection
+            self.hasConnected = True
+            self.connectLatency.setDouble(now - self.startTime)
+            Logger.logInfo("NetworkTables connected in {:.2f}s".format(now - self.startTime))
+        else:
+            # Reconnection
+            self.reconnects += 1
+            self.reconnectLatency.setDouble(now - self.disconnectTime)
+            self.reconnectCount  .setDouble(self.reconnects)
+            Logger.logInfo("NetworkTables reconnected in {:.2f}s".format(now - self.disconnectTime))
@@ -1,7 +1,13 @@
+import os
 import math
 import cv2 as cv
 import numpy as np
 from   enum import Enum
+from   collections import deque
+from   concurrent.futures import ThreadPoolExecutor
+
+# Import Classes
+from results import PIECE_CUBE, PIECE_CONE, PIECE_CLASS, PIECE_FIELDS
 
 def cv_resize(src, d_size, fx, fy, interpolation):
     """
@@ -17,6 +23,33 @@ def cv_resize(src, d_size, fx, fy, interpolation):
     """
     return cv.resize(src, d_size, fx = fx, fy = fy, interpolation = interpolation)
 
+def cv_adaptive_resize(src, min_piece_fraction, min_processed_size):
+    """
+    Shrinks an Image as far as possible while the smallest piece of interest keeps a usable size.
+    Halvings are done with pyramid decimation and the rest with area interpolation.
+    Args:
+        src: A numpy.ndarray.
+        min_piece_fraction: The width of the smallest piece to find as a fraction of the image width.
+        min_processed_size: The width in pixels that piece should still have after resizing.
+    Returns:
+        A resized numpy.ndarray and the x and y scale factors that were applied.
+    """
+    # Picks the scale from the smallest piece
+    scale  = min(1.0, min_processed_size / (min_piece_fraction * src.shape[1]))
+    width  = max(1, round(src.shape[1] * scale))
+    height = max(1, round(src.shape[0] * scale))
+
+    # Halves the image while it is at least twice the target size
+    output = src
+    while ((output.shape[1] // 2 >= width) and (output.shape[0] // 2 >= height)):
+        output = cv.pyrDown(output)
+
+    # Resizes the rest of the way
+    if (output.shape[1] != width or output.shape[0] != height):
+        output = cv.resize(output, (width, height), interpolation = cv.INTER_AREA)
+
+    return output, output.shape[1] / src.shape[1], output.shape[0] / src.shape[0]
+
 def hsv_threshold(input, hue, sat, val):
     """
     Segment an image based on hue, saturation, and value ranges.
@@ -69,11 +102,13 @@ def filter_contours(input_contours, min_area, min_perimeter, min_width, max_widt
         max_vertex_count: Maximum vertex Count.
         min_ratio: Minimum ratio of width to height.
         max_ratio: Maximum ratio of width to height.
+        fx: The scale factor the image was resized by in x.
+        fy: The scale factor the image was resized by in y.
     Returns:
-        Contours as a list of numpy.ndarray.
+        A (N, PIECE_FIELDS) piece array of [x, y, width, height, area, class] in source pixels. The area is the contour area
+        in square source pixels, so it does not change with the processing scale. The class is left at 0.
     """
-    boxes = []
-    output = []
+    pieces = []
 
     if (input_contours is not None):
         for contour in input_contours:
@@ -101,15 +136,76 @@ def filter_contours(input_contours, min_area, min_perimeter, min_width, max_widt
             if (ratio < min_ratio or ratio > max_ratio):
                 continue
 
-            boxes.append([x / fx, y / fy, w / fx, h / fy])
-            output.append(area)
+            pieces.append((x, y, w, h, area, 0))
+
+    # Scales the boxes back to the source size in one operation
+    pieces = np.array(pieces, np.float64).reshape(-1, PIECE_FIELDS)
+    pieces[:, :5] *= (1 / fx, 1 / fy, 1 / fx, 1 / fy, 1 / (fx * fy))
+    pieces[:, :4]  = np.trunc(pieces[:, :4])
+
+    return pieces
+
+def find_pieces(source, pipeline):
+    """
+    Runs a pipeline's steps on an Image without storing anything on the pipeline, so one pipeline can be shared by many threads.
+    Args:
+        source: A BGR numpy.ndarray.
+        pipeline: A CubeTracking or ConeTracking with the settings to use. It is only read from.
+    Returns:
+        A (N, PIECE_FIELDS) piece array of [x, y, width, height, area, class] in source pixels.
+    """
+    resized, fx, fy = pipeline.resize(source)
+    mask     = hsv_threshold(resized, pipeline.hsv_threshold_hue, pipeline.hsv_threshold_saturation, pipeline.hsv_threshold_value)
+    contours = find_contours(mask, pipeline.find_contours_external_only)
+    pieces   = filter_contours(contours, *pipeline.scale_filters(fx, fy), pipeline.filter_contours_solidity, pipeline.filter_contours_max_vertices, pipeline.filter_contours_min_vertices, pipeline.filter_contours_min_ratio, pipeline.filter_contours_max_ratio, fx, fy)
+    pieces[:, PIECE_CLASS] = pipeline.piece_class
 
-    return np.array(boxes, dtype = np.int64).tolist(), output
+    return pieces
+
+def find_frame_pieces(source, pipelines):
+    """
+    Runs several pipelines on one Image.
+    Args:
+        source: A BGR numpy.ndarray.
+        pipelines: The pipelines to run.
+    Returns:
+        The piece arrays of every pipeline concatenated into one.
+    """
+    return np.concatenate([find_pieces(source, pipeline) for pipeline in pipelines])
+
+def find_pieces_batch(frames, pipelines = None, max_workers = None):
+    """
+    Finds pieces in a stack of Images in parallel. OpenCV releases the GIL, so the frames are spread across a thread pool.
+    Only a few frames are read ahead, so a generator over a long video is never loaded all at once.
+    Args:
+        frames: A (N, H, W, 3) numpy.ndarray or any iterable of BGR numpy.ndarrays, such as a generator reading a video.
+        pipelines: The pipelines to run on every frame. They are only read from. Defaults to a new CubeTracking and ConeTracking.
+        max_workers: The number of threads. Defaults to the number of CPUs.
+    Returns:
+        An iterator with one (N, PIECE_FIELDS) piece array per frame, in the order of the frames.
+    """
+    pipelines   = pipelines if (pipelines is not None) else (CubeTracking(), ConeTracking())
+    max_workers = max_workers if (max_workers is not None) else os.cpu_count()
+
+    with ThreadPoolExecutor(max_workers = max_workers) as pool:
+        pending = deque()
+
+        for frame in frames:
+            pending.append(pool.submit(find_frame_pieces, frame, pipelines))
+
+            # Waits for the oldest frame once enough are in flight
+            if (len(pending) >= 2 * max_workers):
+                yield pending.popleft().result()
+
+        while (len(pending) > 0):
+            yield pending.popleft().result()
 
 class CubeTracking:
     """
     An OpenCV pipeline generated by GRIP.
     """
+    piece_class = PIECE_CUBE
+
     def __init__(self):
         """
         Initializes all values to presets or None if need to be set
@@ -118,6 +214,9 @@ class CubeTracking:
         self.cv_resize_fx = 0.6
         self.cv_resize_fy = 0.6
         self.cv_resize_interpolation = cv.INTER_LINEAR
+        self.cv_resize_adaptive = False
+        self.cv_resize_min_piece_fraction = 0.05
+        self.cv_resize_min_processed_size = 8.0
         self.cv_resize_output = None
 
         self.hsv_threshold_input = self.cv_resize_output
@@ -144,33 +243,43 @@ class CubeTracking:
         self.filter_contours_max_ratio = 1000.0
         self.filter_contours_output = None
 
-    def findCubes(self, source0):
+    def resize(self, source):
         """
-        Runs the pipeline and sets all outputs to new values.
+        Resizes a source at the fixed GRIP scale, or at the scale picked from the smallest piece when cv_resize_adaptive is set.
+        Returns:
+            The resized image and the x and y scale factors that were applied.
         """
-        # Step CV_resize0:
-        self.cv_resize_src = source0
-        (self.cv_resize_output) = cv_resize(self.cv_resize_src, self.cv_resize_dsize, self.cv_resize_fx, self.cv_resize_fy, self.cv_resize_interpolation)
+        if (self.cv_resize_adaptive):
+            return cv_adaptive_resize(source, self.cv_resize_min_piece_fraction, self.cv_resize_min_processed_size)
 
-        # Step HSV_Threshold0:
-        self.hsv_threshold_input = self.cv_resize_output
-        (self.hsv_threshold_output) = hsv_threshold(self.hsv_threshold_input, self.hsv_threshold_hue, self.hsv_threshold_saturation, self.hsv_threshold_value)
+        return cv_resize(source, self.cv_resize_dsize, self.cv_resize_fx, self.cv_resize_fy, self.cv_resize_interpolation), self.cv_resize_fx, self.cv_resize_fy
 
-        # Step Find_Contours0:
-        self.find_contours_input = self.hsv_threshold_output
-        (self.find_contours_output) = find_contours(self.find_contours_input, self.find_contours_external_only)
+    def scale_filters(self, fx, fy):
+        """
+        Scales the size filters, which were tuned at the GRIP scale, to the scale that was actually used.
+        Returns:
+            min_area, min_perimeter, min_width, max_width, min_height, max_height.
+        """
+        sx, sy = fx / self.cv_resize_fx, fy / self.cv_resize_fy
 
-        # Step Filter_Contours0:
-        self.filter_contours_contours = self.find_contours_output
-        (self.filter_contours_output) = filter_contours(self.filter_contours_contours, self.filter_contours_min_area, self.filter_contours_min_perimeter, self.filter_contours_min_width, self.filter_contours_max_width, self.filter_contours_min_height, self.filter_contours_max_height, self.filter_contours_solidity, self.filter_contours_max_vertices, self.filter_contours_min_vertices, self.filter_contours_min_ratio, self.filter_contours_max_ratio, self.cv_resize_fx, self.cv_resize_fy)
+        return (self.filter_contours_min_area * sx * sy, self.filter_contours_min_perimeter * min(sx, sy),
+                self.filter_contours_min_width * sx, self.filter_contours_max_width * sx,
+                self.filter_contours_min_height * sy, self.filter_contours_max_height * sy)
 
-        # Returns the info to make a bounding box
-        return self.filter_contours_output
+    def findCubes(self, source0):
+        """
+        Runs the pipeline. The pieces are labeled with piece_class.
+        Returns:
+            A (N, PIECE_FIELDS) piece array, the same as find_pieces().
+        """
+        return find_pieces(source0, self)
 
 class ConeTracking:
     """
     An OpenCV pipeline generated by GRIP.
     """
+    piece_class = PIECE_CONE
+
     def __init__(self):
         """
         Initializes all values to presets or None if need to be set
@@ -179,6 +288,9 @@ class ConeTracking:
         self.cv_resize_fx = 0.6
         self.cv_resize_fy = 0.6
         self.cv_resize_interpolation = cv.INTER_LINEAR
+        self.cv_resize_adaptive = False
+        self.cv_resize_min_piece_fraction = 0.05
+        self.cv_resize_min_processed_size = 8.0
         self.cv_resize_output = None
 
         self.hsv_threshold_input = self.cv_resize_output
@@ -205,25 +317,33 @@ class ConeTracking:
         self.filter_contours_max_ratio = 1000.0
         self.filter_contours_output = None
 
-    def findCones(self, source0):
+    def resize(self, source):
         """
-        Runs the pipeline and sets all outputs to new values.
+        Resizes a source at the fixed GRIP scale, or at the scale picked from the smallest piece when cv_resize_adaptive is set.
+        Returns:
+            The resized image and the x and y scale factors that were applied.
         """
-        # Step CV_resize0:
-        self.cv_resize_src = source0
-        (self.cv_resize_output) = cv_resize(self.cv_resize_src, self.cv_resize_dsize, self.cv_resize_fx, self.cv_resize_fy, self.cv_resize_interpolation)
+        if (self.cv_resize_adaptive):
+            return cv_adaptive_resize(source, self.cv_resize_min_piece_fraction, self.cv_resize_min_processed_size)
 
-        # Step HSV_Threshold0:
-        self.hsv_threshold_input = self.cv_resize_output
-        (self.hsv_threshold_output) = hsv_threshold(self.hsv_threshold_input, self.hsv_threshold_hue, self.hsv_threshold_saturation, self.hsv_threshold_value)
+        return cv_resize(source, self.cv_resize_dsize, self.cv_resize_fx, self.cv_resize_fy, self.cv_resize_interpolation), self.cv_resize_fx, self.cv_resize_fy
 
-        # Step Find_Contours0:
-        self.find_contours_input = self.hsv_threshold_output
-        (self.find_contours_output) = find_contours(self.find_contours_input, self.find_contours_external_only)
+    def scale_filters(self, fx, fy):
+        """
+        Scales the size filters, which were tuned at the GRIP scale, to the scale that was actually used.
+        Returns:
+            min_area, min_perimeter, min_width, max_width, min_height, max_height.
+        """
+        sx, sy = fx / self.cv_resize_fx, fy / self.cv_resize_fy
 
-        # Step Filter_Contours0:
-        self.filter_contours_contours = self.find_contours_output
-        (self.filter_contours_output) = filter_contours(self.filter_contours_contours, self.filter_contours_min_area, self.filter_contours_min_perimeter, self.filter_contours_min_width, self.filter_contours_max_width, self.filter_contours_min_height, self.filter_contours_max_height, self.filter_contours_solidity, self.filter_contours_max_vertices, self.filter_contours_min_vertices, self.filter_contours_min_ratio, self.filter_contours_max_ratio, self.cv_resize_fx, self.cv_resize_fy)
+        return (self.filter_contours_min_area * sx * sy, self.filter_contours_min_perimeter * min(sx, sy),
+                self.filter_contours_min_width * sx, self.filter_contours_max_width * sx,
+                self.filter_contours_min_height * sy, self.filter_contours_max_height * sy)
 
-        # Returns the info to make a bounding box
-        return self.filter_contours_output
+    def findCones(self, source0):
+        """
+        Runs the pipeline. The pieces are labeled with piece_class.
+        Returns:
+            A (N, PIECE_FIELDS) piece array, the same as find_pieces().
+        """
+        return find_pieces(source0, self)
@@ -0,0 +1,225 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import os
+import time
+import queue
+import threading
+import cv2   as cv
+import numpy as np
+
+# Import Classes
+from results import PIECE_FIELDS, TAG_FIELDS, createPieceArray, packPieces, packTagResults
+
+# Import Utilities
+from Utilities.Logger import Logger
+
+# Where recordings are stored. Every recording gets its own directory
+RECORDING_PATH = "/home/robolions/Documents/2023-Jetson-Code-Test/recordings/"
+
+# File names inside a recording
+INDEX_FILE   = "index.bin"
+RESULTS_FILE = "results.bin"
+CHUNK_FILE   = "frames-{:04d}.mjpg"
+
+# One index record per frame. The results are [tagId, x, y, z, roll, pitch, yaw] per tag followed by [x, y, width, height, area, class] per piece
+INDEX_DTYPE = np.dtype([
+    ("sequence",      np.uint64),
+    ("captureTime",   np.float64),
+    ("chunk",         np.uint32),
+    ("frameOffset",   np.uint64),
+    ("frameSize",     np.uint32),
+    ("resultsOffset", np.uint64),
+    ("numTags",       np.uint16),
+    ("numPieces",     np.uint16)
+])
+
+# Creates the Recorder class
+class Recorder:
+    def __init__(self, name: str, path: str = RECORDING_PATH, quality: int = 80, maxQueued: int = 4, chunkSize: int = 64 * 1024 * 1024) -> None:
+        """
+        Constructor for the Recorder class. Writes frames as JPEGs into append-only chunk files, with an index of their timestamps and results.
+
+        Frames are encoded and written on a background thread. record() never waits; frames are dropped while the queue is full.
+        @param name: The name of the recording. The start time is added to it
+        @param path: The directory recordings are stored in
+        @param quality: The JPEG quality from 0 to 100
+        @param maxQueued: The number of frames that can wait to be written
+        @param chunkSize: A new chunk file is started after this many bytes
+        """
+        # Localizes parameters
+        self.quality   = quality
+        self.chunkSize = chunkSize
+
+        # Creates the recording directory
+        self.path = os.path.join(path, "{}-{}".format(name, time.strftime("%Y%m%d-%H%M%S")))
+        os.makedirs(self.path, exist_ok = True)
+
+        # Variables
+        self.queue   = queue.Queue(maxQueued)
+        self.dropped = 0
+        self.written = 0
+
+        # Opens the files
+        self.chunk       = -1
+        self.chunkFile   = None
+        self.indexFile   = open(os.path.join(self.path, INDEX_FILE),   "ab")
+        self.resultsFile = open(os.path.join(self.path, RESULTS_FILE), "ab")
+        self.nextChunk()
+
+        # Writes in the background
+        self.thread = threading.Thread(target = self.writeFrames, name = "Recorder", daemon = True)
+        self.thread.start()
+
+        # Updates log
+        Logger.logInfo("Recording to {}".format(self.path))
+
+    def record(self, stream, frameInfo, tags = (), pieces = None):
+        """
+        Queues a frame and its results. Drops the frame if the writer is behind.
+        @param stream: The frame. It is copied, so a FrameRing view can be passed in
+        @param frameInfo: The frame's FrameInfo
+        @param tags: A list of TagResults
+        @param pieces: A (N, PIECE_FIELDS) piece array
+        @return queued: False if the frame was dropped
+        """
+        # Drops the frame before paying for the copy. Only this thread adds frames, so the queue cannot fill up before put_nowait()
+        if (self.queue.full() == True):
+            self.dropped += 1
+            return False
+
+        # Packs the results
+        pieces  = pieces if (pieces is not None) else createPieceArray()
+        results = np.concatenate((packTagResults(tags), packPieces(pieces)))
+
+        self.queue.put_nowait((stream.copy(), frameInfo.sequence, frameInfo.captureTime, results, len(tags), len(pieces)))
+        return True
+
+    def nextChunk(self):
+        """
+        Closes the current chunk file and starts the next one.
+        """
+        if (self.chunkFile is not None):
+            self.chunkFile.close()
+
+        self.chunk    += 1
+        self.chunkFile = open(os.path.join(self.path, CHUNK_FILE.format(self.chunk)), "ab")
+
+    def writeFrames(self):
+        """
+        Encodes and writes queued frames. Runs on a background thread until close() is called.
+        """
+        # Variables
+        record = np.zeros(1, INDEX_DTYPE)
+
+        while (True):
+            # Waits for a frame
+            item = self.queue.get()
+            if (item is None):
+                break
+            stream, sequence, captureTime, results, numTags, numPieces = item
+
+            # Encodes the frame
+            sucess, data = cv.imencode(".jpg", stream, (cv.IMWRITE_JPEG_QUALITY, self.quality))
+            if (sucess == False):
+                continue
+
+            # Starts a new chunk once the current one is full
+            if (self.chunkFile.tell() + data.size > self.chunkSize) and (self.chunkFile.tell() > 0):
+                self.nextChunk()
+
+            # Fills the index record
+            record[0] = (sequence, captureTime, self.chunk, self.chunkFile.tell(), data.size, self.resultsFile.tell(), numTags, numPieces)
+
+            # Appends the frame and results before the index, so every index record points at complete data
+            self.chunkFile  .write(data.tobytes())
+            self.resultsFile.write(results.tobytes())
+            self.chunkFile  .flush()
+            self.resultsFile.flush()
+            self.indexFile  .write(record.tobytes())
+            self.indexFile  .flush()
+            self.written += 1
+
+    def close(self):
+        """
+        Writes the queued frames and closes the files.
+        """
+        # Stops the writer after the queued frames
+        self.queue.put(None)
+        self.thread.join()
+
+        # Closes the files
+        self.chunkFile  .close()
+        self.resultsFile.close()
+        self.indexFile  .close()
+
+        # Updates log
+        Logger.logInfo("Recording closed. Frames written: {}, dropped: {}".format(self.written, self.dropped))
+
+# Creates the RecordingReader class
+class RecordingReader:
+    def __init__(self, path: str) -> None:
+        """
+        Constructor for the RecordingReader class. Reads a recording made by the Recorder, loading only the index up front.
+        @param path: The recording's directory
+        """
+        # Localizes parameters
+        self.path = path
+
+        # Loads the index. A record that was only partly written when recording stopped is ignored
+        data  = np.fromfile(os.path.join(path, INDEX_FILE), np.uint8)
+        count = data.size // INDEX_DTYPE.itemsize
+        self.index = data[:count * INDEX_DTYPE.itemsize].view(INDEX_DTYPE)
+
+        # Maps the results
+        self.results = np.memmap(os.path.join(path, RESULTS_FILE), np.float64, "r") if (os.path.getsize(os.path.join(path, RESULTS_FILE)) > 0) else np.zeros(0)
+
+    def __len__(self) -> int:
+        """
+        Gets the number of frames in the recording.
+        """
+        return len(self.index)
+
+    def getTimestamps(self):
+        """
+        Gets the capture time of every frame.
+        @return timestamps: In time.monotonic() seconds
+        """
+        return self.index["captureTime"]
+
+    def seek(self, timestamp: float) -> int:
+        """
+        Finds the first frame captured at or after a time.
+        @param timestamp: In time.monotonic() seconds
+        @return frameNumber: len(self) if every frame is older
+        """
+        return int(np.searchsorted(self.index["captureTime"], timestamp))
+
+    def getResults(self, frameNumber: int):
+        """
+        Gets a frame's results without decoding it.
+        @param frameNumber
+        @return tags: A (numTags, TAG_FIELDS) array of [tagId, x, y, z, roll, pitch, yaw]
+        @return pieces: A (numPieces, PIECE_FIELDS) piece array
+        """
+        record = self.index[frameNumber]
+        start  = int(record["resultsOffset"]) // 8
+        middle = start  + int(record["numTags"])   * TAG_FIELDS
+        end    = middle + int(record["numPieces"]) * PIECE_FIELDS
+
+        return self.results[start:middle].reshape(-1, TAG_FIELDS), self.results[middle:end].reshape(-1, PIECE_FIELDS)
+
+    def read(self, frameNumber: int):
+        """
+        Decodes a frame.
+        @param frameNumber
+        @return stream
+        @return tags, pieces: The same as getResults()
+        """
+        # Reads only this frame's bytes from its chunk
+        record = self.index[frameNumber]
+        with open(os.path.join(self.path, CHUNK_FILE.format(int(record["chunk"]))), "rb") as file:
+            file.seek(int(record["frameOffset"]))
+            data = np.frombuffer(file.read(int(record["frameSize"])), np.uint8)
+
+        return (cv.imdecode(data, cv.IMREAD_COLOR),) + self.getResults(frameNumber)
@@ -0,0 +1,174 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import os
+import time
+import numpy as np
+
+# Import Classes
+from results  import PIECE_CLASS, PIECE_CONE, PIECE_CUBE
+from tracking import getCenters
+
+# Import Utilities
+from Utilities.Logger import Logger
+
+# Where result logs are stored
+RESULT_LOG_PATH = "/home/robolions/Documents/2023-Jetson-Code-Test/logs/"
+
+# The most tags and pieces stored per frame. Extra ones are counted but not stored
+MAX_TAGS   = 8
+MAX_PIECES = 16
+
+# Identifies the file format
+MAGIC   = b"JETSLOG1"
+VERSION = 1
+
+# The file header. count is the number of complete records
+HEADER_DTYPE = np.dtype([
+    ("magic",      "S8"),
+    ("version",    np.uint32),
+    ("recordSize", np.uint32),
+    ("count",      np.uint64),
+    ("padding",    np.uint8, 40)
+])
+
+# One record per frame. Tag poses are in the camera frame as [x, y, z, roll, pitch, yaw] in meters and radians. Piece centers are in stream pixels
+RECORD_DTYPE = np.dtype([
+    ("frameId",     np.uint64),
+    ("captureTime", np.float64),
+    ("publishTime", np.float64),
+    ("numTags",     np.uint16),
+    ("numPieces",   np.uint16),
+    ("numCubes",    np.uint16),
+    ("numCones",    np.uint16),
+    ("tagIds",      np.int16,   MAX_TAGS),
+    ("tagPoses",    np.float32, (MAX_TAGS, 6)),
+    ("tagErrors",   np.float32, MAX_TAGS),
+    ("pieceCenters", np.float32, (MAX_PIECES, 2)),
+    ("pieceClasses", np.int8,    MAX_PIECES),
+    ("targetIndex",  np.int16)
+])
+
+def readResultLog(path: str):
+    """
+    Maps a result log for reading. Nothing is copied, so a whole match loads in milliseconds.
+    @param path: The log file
+    @return records: A read-only structured array view of every complete record
+    """
+    # Checks the header
+    header = np.fromfile(path, HEADER_DTYPE, count = 1)[0]
+    if ((header["magic"] != MAGIC) or (header["recordSize"] != RECORD_DTYPE.itemsize)):
+        raise ValueError("{} is not a version {} result log".format(path, VERSION))
+
+    # Maps the complete records
+    count = int(header["count"])
+    if (count == 0):
+        return np.zeros(0, RECORD_DTYPE)
+
+    return np.memmap(path, RECORD_DTYPE, "r", offset = HEADER_DTYPE.itemsize, shape = (count,))
+
+# Creates the ResultLog class
+class ResultLog:
+    def __init__(self, name: str, path: str = RESULT_LOG_PATH, growRecords: int = 36000) -> None:
+        """
+        Constructor for the ResultLog class. Appends one fixed-size binary record per frame to a memory-mapped file.
+
+        Each log has a single writer. A record is filled before the header count is raised, so readers never see a partial record and no lock is needed.
+        @param name: The name of the log. The start time is added to it
+        @param path: The directory logs are stored in
+        @param growRecords: The number of records the file grows by when it is full. 36000 is 10 minutes at 60 FPS
+        """
+        # Localizes parameters
+        self.growRecords = growRecords
+
+        # Creates the file with an empty header
+        os.makedirs(path, exist_ok = True)
+        self.path = os.path.join(path, "{}-{}.bin".format(name, time.strftime("%Y%m%d-%H%M%S")))
+
+        header = np.zeros(1, HEADER_DTYPE)
+        header[0] = (MAGIC, VERSION, RECORD_DTYPE.itemsize, 0, 0)
+        header.tofile(self.path)
+
+        # Variables
+        self.count    = 0
+        self.capacity = 0
+
+        # Maps the file
+        self.grow()
+
+        # Updates log
+        Logger.logInfo("Logging results to {}".format(self.path))
+
+    def grow(self):
+        """
+        Makes room for more records and maps the file again.
+        """
+        # Extends the file
+        self.capacity += self.growRecords
+        with open(self.path, "r+b") as file:
+            file.truncate(HEADER_DTYPE.itemsize + self.capacity * RECORD_DTYPE.itemsize)
+
+        # Maps the header and records
+        self.header  = np.memmap(self.path, HEADER_DTYPE, "r+", shape = (1,))
+        self.records = np.memmap(self.path, RECORD_DTYPE, "r+", offset = HEADER_DTYPE.itemsize, shape = (self.capacity,))
+
+    def append(self, frameInfo, publishTime: float, tags = (), pieces = None, target: int = -1):
+        """
+        Adds a record for a frame.
+        @param frameInfo: The frame's FrameInfo
+        @param publishTime: The time.monotonic() the results were published
+        @param tags: A list of TagResults
+        @param pieces: A (N, PIECE_FIELDS) piece array
+        @param target: The index of the targeted piece, or -1
+        """
+        # Makes room
+        if (self.count == self.capacity):
+            self.grow()
+
+        # Fills the record in place
+        record = self.records[self.count]
+        record["frameId"]     = frameInfo.sequence
+        record["captureTime"] = frameInfo.captureTime
+        record["publishTime"] = publishTime
+        record["targetIndex"] = target
+
+        # Stores the tags
+        record["numTags"] = len(tags)
+        record["tagIds"]  = -1
+        for i, tag in enumerate(tags[:MAX_TAGS]):
+            rotation = tag.pose.rotation()
+            record["tagIds"][i]    = tag.id
+            record["tagPoses"][i]  = (tag.pose.X(), tag.pose.Y(), tag.pose.Z(), rotation.X(), rotation.Y(), rotation.Z())
+            record["tagErrors"][i] = tag.error
+
+        # Stores the pieces
+        if (pieces is not None):
+            stored = pieces[:MAX_PIECES]
+            record["numPieces"] = len(pieces)
+            record["numCubes"]  = np.count_nonzero(pieces[:, PIECE_CLASS] == PIECE_CUBE)
+            record["numCones"]  = np.count_nonzero(pieces[:, PIECE_CLASS] == PIECE_CONE)
+            record["pieceCenters"][:len(stored)] = getCenters(stored)
+            record["pieceClasses"][:len(stored)] = stored[:, PIECE_CLASS]
+            record["pieceClasses"][len(stored):] = -1
+        else:
+            record["pieceClasses"] = -1
+
+        # Publishes the record to readers
+        self.count += 1
+        self.header["count"][0] = self.count
+
+    def close(self):
+        """
+        Flushes the log and trims the unused space.
+        """
+        # Flushes the maps
+        self.records.flush()
+        self.header .flush()
+        del self.records, self.header
+
+        # Trims the file
+        with open(self.path, "r+b") as file:
+            file.truncate(HEADER_DTYPE.itemsize + self.count * RECORD_DTYPE.itemsize)
+
+        # Updates log
+        Logger.logInfo("Result log closed with {} records".format(self.count))
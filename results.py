@@ -0,0 +1,76 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import numpy as np
+
+# Piece classes
+PIECE_CUBE = 0
+PIECE_CONE = 1
+
+# Columns of a piece array. Each row is [x, y, width, height, area, class] in stream pixels. The area is in square stream pixels, whatever scale the pipelines processed at
+PIECE_X, PIECE_Y, PIECE_W, PIECE_H, PIECE_AREA, PIECE_CLASS = range(6)
+PIECE_FIELDS = 6
+
+# Length of one tag result in the NetworkTables layout [tagId, x, y, z, roll, pitch, yaw]
+TAG_FIELDS = 7
+
+def createPieceArray(numPieces: int = 0):
+    """
+    Creates an empty piece array.
+    @param numPieces
+    @return pieces: A (numPieces, PIECE_FIELDS) float64 array
+    """
+    return np.zeros((numPieces, PIECE_FIELDS), np.float64)
+
+def packPieces(pieces):
+    """
+    Flattens a piece array into the NetworkTables double array layout without copying.
+    @param pieces: A (N, PIECE_FIELDS) piece array
+    @return data: [x, y, width, height, area, class] repeated N times
+    """
+    return pieces.reshape(-1)
+
+def packTagResults(results):
+    """
+    Packs tag results into the NetworkTables double array layout.
+    @param results: A list of TagResults
+    @return data: [tagId, x, y, z, roll, pitch, yaw] repeated for every result
+    """
+    # Fills one preallocated array
+    data = np.empty(len(results) * TAG_FIELDS, np.float64)
+    for i, result in enumerate(results):
+        result.fill(data[i * TAG_FIELDS:(i + 1) * TAG_FIELDS])
+
+    return data
+
+# Creates the TagResult class
+class TagResult:
+    __slots__ = ("id", "corners", "center", "pose", "error", "margin")
+
+    def __init__(self, id: int, corners, center, pose, error: float, margin: float) -> None:
+        """
+        Constructor for the TagResult class.
+        @param id: The tag id
+        @param corners: The (4, 2) corners of the tag in pixels
+        @param center: The (2,) center of the tag in pixels
+        @param pose: The Pose3d of the tag
+        @param error: The pose error
+        @param margin: The decision margin
+        """
+        # Localizes parameters
+        self.id      = id
+        self.corners = corners
+        self.center  = center
+        self.pose    = pose
+        self.error   = error
+        self.margin  = margin
+
+    def fill(self, out):
+        """
+        Writes the result into the NetworkTables layout [tagId, x, y, z, roll, pitch, yaw].
+
+        All translation data is in meters. All rotation data is in radians.
+        @param out: An array of at least TAG_FIELDS doubles
+        """
+        rotation = self.pose.rotation()
+        out[:TAG_FIELDS] = (self.id, self.pose.X(), self.pose.Y(), self.pose.Z(), rotation.X(), rotation.Y(), rotation.Z())
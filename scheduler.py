@@ -0,0 +1,117 @@
+# Created by Alex Pereira
+
+# Import Libraries
+from network import NetworkManager
+
+# Import Constants
+from config import ROLE_STREAM, ROLE_PIECES, ROLE_APRILTAG
+
+# Import Utilities
+from Utilities.Logger import Logger
+
+# Robot modes
+MODE_DISABLED = "disabled"
+MODE_AUTO     = "auto"
+MODE_TELEOP   = "teleop"
+MODE_TEST     = "test"
+
+# Bits of FMSInfo/FMSControlData
+CONTROL_ENABLED = 0x01
+CONTROL_AUTO    = 0x02
+CONTROL_TEST    = 0x04
+CONTROL_ESTOP   = 0x08
+
+# The roles that run in each mode. In auto the whole budget goes to the tag detector
+MODE_ROLES = {
+    MODE_DISABLED: frozenset((ROLE_STREAM, ROLE_APRILTAG)),
+    MODE_AUTO:     frozenset((ROLE_APRILTAG,)),
+    MODE_TELEOP:   frozenset((ROLE_STREAM, ROLE_PIECES, ROLE_APRILTAG)),
+    MODE_TEST:     frozenset((ROLE_STREAM, ROLE_PIECES, ROLE_APRILTAG))
+}
+
+# The capture FPS in each mode. 0 lets the camera run as fast as it can
+MODE_FPS = {
+    MODE_DISABLED: 10,
+    MODE_AUTO:     0,
+    MODE_TELEOP:   0,
+    MODE_TEST:     0
+}
+
+# The capture FPS when none of a camera's roles are running
+IDLE_FPS = 5
+
+def getMode(controlData: int) -> str:
+    """
+    Gets the robot mode from the FMSControlData bits.
+    @param controlData
+    @return mode
+    """
+    if (((controlData & CONTROL_ENABLED) == 0) or ((controlData & CONTROL_ESTOP) != 0)):
+        return MODE_DISABLED
+    elif ((controlData & CONTROL_AUTO) != 0):
+        return MODE_AUTO
+    elif ((controlData & CONTROL_TEST) != 0):
+        return MODE_TEST
+    else:
+        return MODE_TELEOP
+
+# Creates the Scheduler class
+class Scheduler:
+    def __init__(self, roles) -> None:
+        """
+        Constructor for the Scheduler class. Decides which of a camera's roles run and how fast it captures, from the robot mode and the requested pipelines.
+
+        Everything is updated from NetworkTables listeners, so checking a role each frame costs a set lookup.
+        @param roles: The roles of the camera
+        """
+        # Localizes parameters
+        self.roles = frozenset(roles)
+
+        # Get the NetworkManager
+        network = NetworkManager.getDefault()
+
+        # Entries that decide the schedule
+        self.controlData = network.getEntry("FMSInfo",       "FMSControlData")  # Double
+        self.requested   = network.getEntry("JetsonControl", "Pipelines")       # String[], empty to use the mode's roles
+
+        # Variables
+        self.mode        = MODE_DISABLED
+        self.activeRoles = self.roles & MODE_ROLES[self.mode]
+        self.fps         = MODE_FPS[self.mode]
+
+        # Updates the schedule whenever an entry changes
+        network.addListener(self.controlData, self.update)
+        network.addListener(self.requested,   self.update)
+
+        # Updates log
+        Logger.logInfo("Scheduler initialized")
+
+    def update(self, *args):
+        """
+        Recalculates the schedule. Runs on the NetworkTables thread.
+        """
+        # Gets the mode and the requested pipelines
+        mode      = getMode(int(self.controlData.getDouble(0)))
+        requested = frozenset(self.requested.getStringArray([]))
+
+        # Picks the roles. Requested pipelines override the mode's roles
+        if (len(requested) > 0):
+            activeRoles = self.roles & requested
+        else:
+            activeRoles = self.roles & MODE_ROLES[mode]
+
+        # Swaps in the new schedule
+        self.mode        = mode
+        self.activeRoles = activeRoles
+        self.fps         = MODE_FPS[mode] if (len(activeRoles) > 0) else IDLE_FPS
+
+        # Updates log
+        Logger.logInfo("Schedule changed. Mode: {}, Roles: {}, FPS: {}".format(self.mode, sorted(self.activeRoles), self.fps))
+
+    def isActive(self, role: str) -> bool:
+        """
+        Checks if a role should run on this frame.
+        @param role
+        @return isActive
+        """
+        return role in self.activeRoles
@@ -0,0 +1,64 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import time
+
+# Import Utilities
+from Utilities.Logger import Logger
+
+# The first frame should be published within this many seconds of boot
+STARTUP_GOAL = 2.0
+
+# Creates the StartupTimer class
+class StartupTimer:
+    def __init__(self, name: str, startTime: float = None) -> None:
+        """
+        Constructor for the StartupTimer class. Breaks the time from boot to the first published frame into stages.
+        @param name: The name used in the report
+        @param startTime: The time.monotonic() the program started. Defaults to now
+        """
+        # Localizes parameters
+        self.name      = name
+        self.startTime = startTime if (startTime is not None) else time.monotonic()
+
+        # Variables
+        self.lastTime = self.startTime
+        self.stages   = []
+
+    def mark(self, stage: str, now: float = None):
+        """
+        Ends a stage.
+        @param stage: The name of the stage
+        @param now: The time.monotonic() the stage ended. Defaults to now
+        """
+        now = now if (now is not None) else time.monotonic()
+        self.stages.append((stage, now - self.lastTime))
+        self.lastTime = now
+
+    def getElapsed(self) -> float:
+        """
+        Gets the time from the start to the last stage.
+        @return elapsed: In seconds
+        """
+        return self.lastTime - self.startTime
+
+    def getDurations(self) -> list:
+        """
+        Gets how long each stage took.
+        @return durations: In seconds, in the order the stages were marked
+        """
+        return [duration for _, duration in self.stages]
+
+    def report(self):
+        """
+        Logs the breakdown, and warns if it missed the startup goal.
+        """
+        # Formats the stages
+        breakdown = ", ".join("{} {:.3f}s".format(stage, duration) for stage, duration in self.stages)
+        message   = "{} started in {:.3f}s ({})".format(self.name, self.getElapsed(), breakdown)
+
+        # Updates log
+        if (self.getElapsed() > STARTUP_GOAL):
+            Logger.logWarning(message)
+        else:
+            Logger.logInfo(message)
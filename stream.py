@@ -1,34 +1,48 @@
 # Created by Alex Pereira
 
 # Import Libraries
-import ntcore
 import numpy  as np
 from   cscore import CameraServer as CS
 
-# Get a default network table
-nt = ntcore.NetworkTableInstance.getDefault()
-nt.setServerTeam(2199)
-nt.startClient3(__file__)
+# Import Classes
+from network import NetworkManager
 
 # Creates the Streaming Class
 class Streaming:
-    def __init__(self, camNum: int, path: str = None) -> None:
+    def __init__(self, camNum: int, path: str = None, resolution: tuple = (640, 480), capture: bool = True) -> None:
         """
         Constructor for the Streaming class.
         @param Camera Number
         @param path: It can be found on Linux by running "find /dev/v4l"
+        @param resolution: The stream resolution (width, height)
+        @param capture: If the CameraServer should open the camera itself. Set to False when frames come from another process
         """
-        # Creates a CameraServer
+        # Creates a CameraServer. It publishes the stream addresses through the process's NetworkTables client
+        NetworkManager.getDefault().start()
         CS.enableLogging()
 
         # Defines the resolution
-        streamRes = (640, 480)
+        streamRes = resolution
 
         # Captures from a specified USB Camera on the system
-        if (path is not None):
-            # If path is known, use the path
-            camera = CS.startAutomaticCapture(name = "Camera" + str(camNum), path = path)
-        else:
-            # Path is unknown, use the camera number
-            camera = CS.startAutomaticCapture(dev = camNum)
-        camera.setResolution(streamRes[0], streamRes[1])
\ No newline at end of file
+        if (capture == True):
+            if (path is not None):
+                # If path is known, use the path
+                camera = CS.startAutomaticCapture(name = "Camera" + str(camNum), path = path)
+            else:
+                # Path is unknown, use the camera number
+                camera = CS.startAutomaticCapture(dev = camNum)
+            camera.setResolution(streamRes[0], streamRes[1])
+
+        # Creates an output for processed frames
+        self.output = CS.putVideo("Processed" + str(camNum), streamRes[0], streamRes[1])
+
+    def streamImage(self, stream):
+        """
+        Sends a frame to the driver stream.
+        @param stream
+        @return stream
+        """
+        self.output.putFrame(stream)
+
+        return stream
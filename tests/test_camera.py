@@ -0,0 +1,124 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import sys
+import cv2   as cv
+import numpy as np
+from   pathlib import Path
+
+# Makes the repository importable when run from anywhere
+sys.path.append(str(Path(__file__).absolute().parent.parent))
+
+# Import Classes
+import camera
+from camera import USBCamera
+
+class FakeCapture:
+    """
+    Stands in for a cv.VideoCapture that hands over one raw frame.
+    """
+    def __init__(self, raw) -> None:
+        self.raw = raw
+
+    def grab(self):
+        return True
+
+    def retrieve(self):
+        return True, self.raw
+
+class TimedCapture(FakeCapture):
+    """
+    A FakeCapture whose frames arrive at given times. Each grab moves the clock to the next arrival.
+    """
+    def __init__(self, raw, arrivals) -> None:
+        super().__init__(raw)
+        self.arrivals = iter(arrivals)
+        self.now      = 0.0
+
+    def grab(self):
+        self.now = next(self.arrivals)
+        return True
+
+class FakeRing:
+    """
+    Stands in for a FrameRing and counts the frames committed to it.
+    """
+    def __init__(self, shape) -> None:
+        self.slot    = np.zeros(shape, np.uint8)
+        self.commits = 0
+
+    def acquire(self):
+        return self.slot
+
+    def commit(self, captureTime: float, readTime: float):
+        self.commits += 1
+
+def createCamera(raw) -> USBCamera:
+    """
+    Creates a grayscale USBCamera around a fake capture, without opening a device.
+    @param raw: The raw frame the capture returns
+    @return usbCamera
+    """
+    usbCamera = USBCamera.__new__(USBCamera)
+    usbCamera.cap       = FakeCapture(raw)
+    usbCamera.grayscale = True
+    usbCamera.frameInterval = 0.0
+    usbCamera.nextFrame     = 0.0
+
+    return usbCamera
+
+def createFrame(width: int, height: int):
+    """
+    Draws a grayscale gradient.
+    @param width
+    @param height
+    @return frame
+    """
+    x, y = np.meshgrid(np.linspace(0, 255, width), np.linspace(0, 255, height))
+
+    return ((x + y) / 2).astype(np.uint8)
+
+def test_grey_frame_smaller_than_slot():
+    # A GREY mode picked below the configured resolution
+    raw  = createFrame(640, 360)
+    slot = np.zeros((720, 1280), np.uint8)
+
+    assert createCamera(raw).retrieveGray(slot) == True
+    assert np.abs(cv.resize(slot, (640, 360), interpolation = cv.INTER_AREA).astype(int) - raw).max() <= 2
+
+def test_grey_frame_matching_slot():
+    raw  = createFrame(1280, 720)
+    slot = np.zeros((720, 1280), np.uint8)
+
+    assert createCamera(raw).retrieveGray(slot) == True
+    assert np.array_equal(slot, raw)
+
+def test_mjpg_frame_smaller_than_slot():
+    # MJPG arrives as one row of compressed bytes
+    frame   = createFrame(640, 360)
+    _, jpeg = cv.imencode(".jpg", frame)
+    slot    = np.zeros((720, 1280), np.uint8)
+
+    assert createCamera(jpeg.reshape(1, -1)).retrieveGray(slot) == True
+    assert np.abs(cv.resize(slot, (640, 360), interpolation = cv.INTER_AREA).astype(int) - frame).max() <= 8
+
+def test_yuyv_frame():
+    frame = createFrame(1280, 720)
+    raw   = np.dstack((frame, np.full(frame.shape, 128, np.uint8)))
+    slot  = np.zeros((720, 1280), np.uint8)
+
+    assert createCamera(raw).retrieveGray(slot) == True
+    assert np.array_equal(slot, frame)
+
+def test_fps_limit_drops_frames(monkeypatch):
+    # A 30 FPS camera with a little jitter, limited to 15 FPS
+    usbCamera = createCamera(createFrame(64, 48))
+    usbCamera.cap = TimedCapture(usbCamera.cap.raw, 100 + np.arange(60) / 30 + np.tile([0.002, -0.002], 30))
+    ring      = FakeRing((48, 64))
+    monkeypatch.setattr(camera.time, "monotonic", lambda: usbCamera.cap.now)
+
+    usbCamera.setFps(15)
+    for _ in range(60):
+        assert usbCamera.readInto(ring) == True
+
+    assert ring.commits == 30
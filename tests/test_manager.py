@@ -0,0 +1,113 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import sys
+import json
+import time
+import cv2   as cv
+import numpy as np
+import pytest
+import multiprocessing as mp
+from   pathlib import Path
+
+# Makes the repository importable when run from anywhere
+sys.path.append(str(Path(__file__).absolute().parent.parent))
+
+# Import Classes
+import manager
+from calibration import CHESSBOARD, Calibrate
+
+# Test settings
+RESOLUTION    = (640, 480)
+CAMERA_MATRIX = np.array([[500, 0, 320], [0, 500, 240], [0, 0, 1]], np.float64)
+NUM_IMAGES    = 15
+
+def createBoardImages(path: Path):
+    """
+    Renders chessboard views at random poses, numbered the way Calibrate stores them.
+    @param path: The directory to write into
+    """
+    # Draws the board with a one square white margin. Squares are 40 pixels, which maps to 27.5 mm
+    squares = (CHESSBOARD[0] + 1, CHESSBOARD[1] + 1)
+    board   = np.kron((np.indices((squares[1], squares[0])).sum(axis = 0) % 2) * 255, np.ones((40, 40))).astype(np.uint8)
+    board   = cv.copyMakeBorder(board, 40, 40, 40, 40, cv.BORDER_CONSTANT, value = 255)
+    toBoard = np.array([[27.5 / 40, 0, -100], [0, 27.5 / 40, -80], [0, 0, 1]])
+
+    rng = np.random.default_rng(2199)
+    for i in range(NUM_IMAGES):
+        # The homography from the board plane to the frame is K [r1 r2 t]
+        rMatrix, _ = cv.Rodrigues(np.array([0.3, 0.3, 0.1]) * rng.standard_normal(3))
+        tVec       = np.array([rng.uniform(-60, 0), rng.uniform(-40, 0), rng.uniform(450, 600)])
+        homography = CAMERA_MATRIX @ np.column_stack((rMatrix[:, 0], rMatrix[:, 1], tVec)) @ toBoard
+        frame = cv.warpPerspective(board, homography / homography[2, 2], RESOLUTION, borderValue = 128)
+        cv.imwrite(str(path / "{}.png".format(i + 1)), frame)
+
+class FakeCapture:
+    """
+    Stands in for the cv.VideoCapture Calibrate reads the resolution from.
+    """
+    def get(self, prop):
+        return {cv.CAP_PROP_FRAME_WIDTH: RESOLUTION[0], cv.CAP_PROP_FRAME_HEIGHT: RESOLUTION[1]}.get(prop, 0)
+
+class FakeUSBCamera:
+    """
+    Stands in for USBCamera. Calibration runs the real Calibrate on the rendered images, and reads wait instead of grabbing frames.
+    """
+    imagePath = None
+
+    def __init__(self, camNum: int, path: str = None) -> None:
+        self.camNum = camNum
+
+    def resize(self, cameraRes: tuple, fps: int = 0, mode: dict = None):
+        pass
+
+    def setFps(self, fps: int):
+        pass
+
+    def setGrayscale(self, grayscale: bool):
+        pass
+
+    def calibrateCamera(self, autoCapture: bool = False, source = None):
+        calibrate = Calibrate(FakeCapture(), self.camNum, NUM_IMAGES, autoCapture)
+        calibrate.PATH = FakeUSBCamera.imagePath + "/"
+        return calibrate.calibrateCamera(source = source)
+
+    def readInto(self, ring) -> bool:
+        time.sleep(0.01)
+        return True
+
+@pytest.mark.skipif(mp.get_start_method() != "fork", reason = "the fake camera is patched in before the processes fork")
+def test_capture_process_calibrates(tmp_path, monkeypatch):
+    # An AprilTag camera with rendered calibration images and no corner or calibration cache
+    createBoardImages(tmp_path)
+    configPath = tmp_path / "config.json"
+    configPath.write_text(json.dumps({"cameras": [{"name": "TestCamera", "camNum": 0, "path": None, "roles": ["apriltag"], "resolution": list(RESOLUTION), "slots": 2}]}))
+
+    # Runs the real captureWorker in the process CameraManager creates for it
+    FakeUSBCamera.imagePath = str(tmp_path)
+    monkeypatch.setattr(manager, "USBCamera", FakeUSBCamera)
+    cameraManager = manager.CameraManager({}, configPath = str(configPath))
+    camera        = cameraManager.cameras[0]
+    try:
+        width, height = RESOLUTION
+        calibration   = mp.Queue(1)
+        calibrated    = mp.Value("b", False, lock = False)
+        cameraManager.rings[camera.name] = manager.FrameRing((height, width, 3), camera.slots)
+        cameraManager.captureArgs[camera.name] = (camera, None, cameraManager.rings[camera.name], calibration, mp.Value("i", 0, lock = False), mp.Value("d", 0.0, lock = False), cameraManager.stopEvent, calibrated)
+        process = cameraManager.createCapture(camera)
+        cameraManager.processes.append(process)
+        process.start()
+
+        # The corner extraction pool runs inside the capture process, which must stay up while it calibrates
+        deadline = time.monotonic() + 60
+        while (calibration.empty()):
+            assert process.is_alive(), "The capture process exited with {} before sending a calibration".format(process.exitcode)
+            assert time.monotonic() < deadline, "The capture process did not send a calibration"
+            time.sleep(0.1)
+
+        cameraMatrix, _ = calibration.get(timeout = 1)
+        assert process.is_alive()
+        assert calibrated.value == True
+        assert np.allclose(np.diag(cameraMatrix)[:2], 500, rtol = 0.02)
+    finally:
+        cameraManager.stop()
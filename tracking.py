@@ -0,0 +1,141 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import numpy as np
+
+# Import Classes
+from results import PIECE_X, PIECE_Y, PIECE_W, PIECE_H, PIECE_AREA, PIECE_CLASS, PIECE_FIELDS
+
+def getCenters(pieces):
+    """
+    Calculates the center of every piece.
+    @param pieces: A (N, PIECE_FIELDS) piece array
+    @return centers: A (N, 2) array of (x, y) in pixels
+    """
+    return pieces[:, [PIECE_X, PIECE_Y]] + pieces[:, [PIECE_W, PIECE_H]] / 2
+
+def calculateIoU(boxesA, boxesB):
+    """
+    Calculates the intersection over union of every pair of boxes.
+    @param boxesA: A (N, PIECE_FIELDS) piece array
+    @param boxesB: A (M, PIECE_FIELDS) piece array
+    @return iou: A (N, M) array
+    """
+    # Gets the corners of the boxes
+    a0, a1 = boxesA[:, None, [PIECE_X, PIECE_Y]], boxesA[:, None, [PIECE_X, PIECE_Y]] + boxesA[:, None, [PIECE_W, PIECE_H]]
+    b0, b1 = boxesB[None, :, [PIECE_X, PIECE_Y]], boxesB[None, :, [PIECE_X, PIECE_Y]] + boxesB[None, :, [PIECE_W, PIECE_H]]
+
+    # Calculates the overlap
+    overlap      = np.clip(np.minimum(a1, b1) - np.maximum(a0, b0), 0, None)
+    intersection = overlap[..., 0] * overlap[..., 1]
+    union        = (boxesA[:, None, PIECE_W] * boxesA[:, None, PIECE_H]) + (boxesB[None, :, PIECE_W] * boxesB[None, :, PIECE_H]) - intersection
+
+    return intersection / np.maximum(union, 1e-9)
+
+# Creates the PieceTracker class
+class PieceTracker:
+    def __init__(self, areaWeight: float = 1.0, centerWeight: float = 0.5, classWeights: tuple = (0.0, 0.0), minIoU: float = 0.3, maxMissed: int = 5, switchMargin: float = 0.2) -> None:
+        """
+        Constructor for the PieceTracker class. Gives pieces stable ids across frames and picks the piece the robot should follow.
+        @param areaWeight: Score weight of a piece's area relative to the largest piece. The area is normalized, so the weight does not depend on the area units
+        @param centerWeight: Score weight of how close a piece is to the center of the stream
+        @param classWeights: Score added for each piece class (cube, cone)
+        @param minIoU: The smallest overlap that counts as the same piece
+        @param maxMissed: Frames a piece can go undetected before its id is dropped
+        @param switchMargin: How much higher another piece has to score before the target changes
+        """
+        # Localizes parameters
+        self.areaWeight   = areaWeight
+        self.centerWeight = centerWeight
+        self.classWeights = np.asarray(classWeights, np.float64)
+        self.minIoU       = minIoU
+        self.maxMissed    = maxMissed
+        self.switchMargin = switchMargin
+
+        # Variables
+        self.tracks   = np.zeros((0, PIECE_FIELDS))
+        self.trackIds = np.zeros(0, np.int64)
+        self.missed   = np.zeros(0, np.int64)
+        self.nextId   = 1
+        self.targetId = -1
+
+    def score(self, pieces, frameWidth: int):
+        """
+        Scores every piece. Larger pieces, pieces close to the center, and preferred classes score higher.
+        @param pieces: A (N, PIECE_FIELDS) piece array
+        @param frameWidth: The width of the stream in pixels
+        @return scores: A (N,) array
+        """
+        # Variables
+        halfWidth = frameWidth / 2
+        areas     = pieces[:, PIECE_AREA]
+
+        # Combines the terms
+        areaTerm   = areas / max(areas.max(initial = 0), 1e-9)
+        centerTerm = 1 - np.abs(getCenters(pieces)[:, 0] - halfWidth) / halfWidth
+        classTerm  = self.classWeights[pieces[:, PIECE_CLASS].astype(np.int64)]
+
+        return self.areaWeight * areaTerm + self.centerWeight * centerTerm + classTerm
+
+    def update(self, pieces):
+        """
+        Matches the pieces to the tracked pieces from earlier frames.
+        @param pieces: A (N, PIECE_FIELDS) piece array
+        @return ids: A (N,) array with the stable id of every piece
+        """
+        # Variables
+        ids     = np.full(len(pieces), -1, np.int64)
+        matched = np.zeros(len(self.tracks), bool)
+
+        # Greedily pairs the most overlapping tracks and pieces first
+        if ((len(pieces) > 0) and (len(self.tracks) > 0)):
+            iou = calculateIoU(self.tracks, pieces)
+            for flat in np.argsort(iou, axis = None)[::-1]:
+                track, piece = divmod(int(flat), len(pieces))
+                if (iou[track, piece] < self.minIoU):
+                    break
+                if ((matched[track] == False) and (ids[piece] == -1)):
+                    matched[track] = True
+                    ids[piece]     = self.trackIds[track]
+
+        # Gives new pieces new ids
+        new = (ids == -1)
+        ids[new] = np.arange(self.nextId, self.nextId + np.count_nonzero(new))
+        self.nextId += int(np.count_nonzero(new))
+
+        # Keeps unmatched tracks for a few frames in case the piece was only missed
+        self.missed = self.missed + 1
+        keep = (matched == False) & (self.missed <= self.maxMissed)
+
+        # Stores the tracks for the next frame
+        self.tracks   = np.concatenate((self.tracks[keep], pieces))
+        self.trackIds = np.concatenate((self.trackIds[keep], ids))
+        self.missed   = np.concatenate((self.missed[keep], np.zeros(len(pieces), np.int64)))
+
+        return ids
+
+    def selectTarget(self, pieces, ids, frameWidth: int) -> int:
+        """
+        Picks the piece to follow. The current target is kept unless another piece clearly scores higher.
+        @param pieces: A (N, PIECE_FIELDS) piece array
+        @param ids: The stable ids from update()
+        @param frameWidth: The width of the stream in pixels
+        @return index: The row of the target piece, or -1 if there are no pieces
+        """
+        # Clears the target when nothing is seen
+        if (len(pieces) == 0):
+            self.targetId = -1
+            return -1
+
+        # Finds the best scoring piece
+        scores = self.score(pieces, frameWidth)
+        best   = int(np.argmax(scores))
+
+        # Sticks with the current target if it is still close to the best
+        current = np.flatnonzero(ids == self.targetId)
+        if ((len(current) > 0) and (scores[current[0]] + self.switchMargin >= scores[best])):
+            best = int(current[0])
+
+        self.targetId = int(ids[best])
+
+        return best
@@ -0,0 +1,168 @@
+# Created by Alex Pereira
+
+# Import Libraries
+import time
+import numpy           as np
+import multiprocessing as mp
+from   multiprocessing import shared_memory
+
+# The metadata stored for every slot. A sequence of 0 means the slot is being written
+META_DTYPE = np.dtype([("sequence", np.uint64), ("captureTime", np.float64), ("decodeTime", np.float64)])
+
+# Creates the FrameInfo class
+class FrameInfo:
+    __slots__ = ("sequence", "captureTime", "decodeTime", "processTime")
+
+    def __init__(self, sequence: int, captureTime: float, decodeTime: float, processTime: float) -> None:
+        """
+        Constructor for the FrameInfo class. Carries a frame's time.monotonic() timestamps through the pipeline.
+        @param sequence: The frame's sequence number
+        @param captureTime: When the camera delivered the frame
+        @param decodeTime: When the frame was decoded into the ring
+        @param processTime: When a reader picked the frame up
+        """
+        # Localizes parameters
+        self.sequence    = sequence
+        self.captureTime = captureTime
+        self.decodeTime  = decodeTime
+        self.processTime = processTime
+
+    def getLatency(self, publishTime: float) -> float:
+        """
+        Gets the time from capture to publishing.
+        @param publishTime: The time.monotonic() the results were published
+        @return latency: In seconds
+        """
+        return publishTime - self.captureTime
+
+    def getStages(self, publishTime: float) -> tuple:
+        """
+        Splits the latency into its stages.
+        @param publishTime: The time.monotonic() the results were published
+        @return (decode, wait, process): In seconds
+        """
+        return (self.decodeTime - self.captureTime, self.processTime - self.decodeTime, publishTime - self.processTime)
+
+# Creates the FrameRing class
+class FrameRing:
+    def __init__(self, shape: tuple, slots: int = 4, dtype = np.uint8) -> None:
+        """
+        Constructor for the FrameRing class. A ring buffer of fixed-shape frames in shared memory with one writer and any number of readers.
+
+        Readers get views straight into the shared memory, so a frame is never copied or pickled. A view stays valid until the writer has written slots - 1 more frames, which can be checked with isValid().
+        @param shape: The shape of a frame (height, width, channels)
+        @param slots: The number of frames in the ring
+        @param dtype: The frame's data type
+        """
+        # Localizes parameters
+        self.shape = tuple(shape)
+        self.slots = slots
+        self.dtype = np.dtype(dtype)
+
+        # Creates the shared memory block. The slot metadata comes first, then the frames
+        self.metaSize  = self.slots * META_DTYPE.itemsize
+        self.frameSize = int(np.prod(self.shape)) * self.dtype.itemsize
+        self.memory    = shared_memory.SharedMemory(create = True, size = self.metaSize + self.slots * self.frameSize)
+
+        # The sequence number of the newest frame. Readers wait on the condition for it to change
+        self.head      = mp.Value("Q", 0, lock = False)
+        self.condition = mp.Condition()
+
+        # Maps the arrays
+        self.mapArrays()
+
+    def mapArrays(self):
+        """
+        Maps the slot metadata and frames onto the shared memory.
+        """
+        self.meta   = np.ndarray((self.slots,), META_DTYPE, buffer = self.memory.buf)
+        self.frames = np.ndarray((self.slots,) + self.shape, self.dtype, buffer = self.memory.buf, offset = self.metaSize)
+
+    def __getstate__(self):
+        """
+        Drops the mapped arrays when the ring is sent to a spawned process. They are mapped again on the other side.
+        """
+        state = self.__dict__.copy()
+        del state["meta"], state["frames"]
+        return state
+
+    def __setstate__(self, state):
+        """
+        Maps the arrays again after the ring is received by a spawned process.
+        """
+        self.__dict__.update(state)
+        self.mapArrays()
+
+    def acquire(self):
+        """
+        Gets the slot the next frame will be written into. Only the writer should call this.
+        @return frame: A view of the slot
+        """
+        # Marks the slot as being written
+        slot = (self.head.value + 1) % self.slots
+        self.meta["sequence"][slot] = 0
+
+        return self.frames[slot]
+
+    def commit(self, captureTime: float, decodeTime: float = None):
+        """
+        Publishes the frame written into the slot from acquire() and wakes up the readers.
+        @param captureTime: The time.monotonic() the frame was captured
+        @param decodeTime: The time.monotonic() the frame was decoded. Defaults to now
+        """
+        # Stores the slot metadata
+        sequence = self.head.value + 1
+        self.meta[sequence % self.slots] = (sequence, captureTime, decodeTime if (decodeTime is not None) else time.monotonic())
+
+        # Moves the head forward
+        with self.condition:
+            self.head.value = sequence
+            self.condition.notify_all()
+
+    def write(self, frame, captureTime: float):
+        """
+        Copies a frame into the ring.
+        @param frame: A frame with the same shape as the ring
+        @param captureTime: The time.monotonic() the frame was captured
+        """
+        self.acquire()[:] = frame
+        self.commit(captureTime)
+
+    def latest(self, lastSequence: int, timeout: float = None):
+        """
+        Waits for a frame newer than lastSequence and returns a view of the newest one.
+        @param lastSequence: The sequence number of the last frame read
+        @param timeout: The maximum time to wait in seconds
+        @return sequence, info, frame: info is a FrameInfo. Both are None if the timeout passed
+        """
+        # Waits for the head to move
+        with self.condition:
+            if (self.condition.wait_for(lambda: self.head.value > lastSequence, timeout) == False):
+                return lastSequence, None, None
+            sequence = self.head.value
+
+        # Gets the slot
+        slot = sequence % self.slots
+        info = FrameInfo(sequence, float(self.meta["captureTime"][slot]), float(self.meta["decodeTime"][slot]), time.monotonic())
+
+        return sequence, info, self.frames[slot]
+
+    def isValid(self, sequence: int) -> bool:
+        """
+        Checks if the frame with the given sequence number has not been overwritten yet.
+        @param sequence
+        @return isValid
+        """
+        return int(self.meta["sequence"][sequence % self.slots]) == sequence
+
+    def close(self, unlink: bool = False):
+        """
+        Closes the shared memory.
+        @param unlink: Frees the memory. Only the creator should do this
+        """
+        # Releases the views before closing the buffer
+        del self.meta, self.frames
+
+        self.memory.close()
+        if (unlink == True):
+            self.memory.unlink()